@@ -0,0 +1,181 @@
+"""
+Times transform_fact_sales_order on a synthetic sales_order table, against the earlier implementation that split the timestamp strings and parsed each part with pandas. Timestamps are generated either as the ISO 8601 strings of json ingestion or as the datetime values of parquet ingestion, and both implementations are checked to give the same dataframe, apart from the sales_record_id keys.
+
+Run from the project root:
+    PYTHONPATH=$(pwd) python benchmarks/benchmark_fact_sales_order.py
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src.transform.transform_utils import transform_fact_sales_order
+
+FACT_SALES_ORDER_COLUMNS = [
+    "sales_record_id",
+    "sales_order_id",
+    "created_date",
+    "created_time",
+    "last_updated_date",
+    "last_updated_time",
+    "sales_staff_id",
+    "counterparty_id",
+    "units_sold",
+    "unit_price",
+    "currency_id",
+    "design_id",
+    "agreed_payment_date",
+    "agreed_delivery_date",
+    "agreed_delivery_location_id",
+]
+
+
+def make_sales_orders(row_count, timestamps_as_strings=True, seed=0):
+    """
+    This function generates a sales_order table with random values in the columns used by the transformation.
+
+    # Arguments:
+        row_count: an integer representing the number of rows to generate.
+        timestamps_as_strings: a boolean, when True created_at and last_updated hold ISO 8601 strings as ingested from json, otherwise datetime values as ingested from parquet.
+        seed: an integer seeding the random values.
+
+    # Returns:
+        A pandas DataFrame with the columns of the sales_order table.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2022-11-03T14:20:52.186000", "us")
+    created_at = start + rng.integers(0, 10**14, row_count).astype("timedelta64[us]")
+    # Some timestamps fall on a whole second, which isoformat writes without
+    # microseconds.
+    created_at[::7] = created_at[::7].astype("datetime64[s]")
+    last_updated = created_at + rng.integers(0, 10**10, row_count).astype(
+        "timedelta64[us]"
+    )
+    agreed_date = created_at.astype("datetime64[D]") + rng.integers(1, 30, row_count)
+
+    df = pd.DataFrame(
+        {
+            "sales_order_id": np.arange(1, row_count + 1),
+            "created_at": pd.Series(created_at),
+            "last_updated": pd.Series(last_updated),
+            "design_id": rng.integers(1, 500, row_count),
+            "staff_id": rng.integers(1, 20, row_count),
+            "counterparty_id": rng.integers(1, 20, row_count),
+            "units_sold": rng.integers(1000, 100000, row_count),
+            "unit_price": rng.integers(100, 400, row_count) / 100,
+            "currency_id": rng.integers(1, 4, row_count),
+            "agreed_delivery_date": agreed_date.astype(str),
+            "agreed_payment_date": agreed_date.astype(str),
+            "agreed_delivery_location_id": rng.integers(1, 30, row_count),
+        }
+    )
+
+    if timestamps_as_strings:
+        for column in ["created_at", "last_updated"]:
+            df[column] = (
+                df[column]
+                .dt.strftime("%Y-%m-%dT%H:%M:%S.%f")
+                .str.removesuffix(".000000")
+            )
+
+    return df
+
+
+def reference_fact_sales_order(sales_order_data):
+    """
+    This function is the implementation of transform_fact_sales_order before timestamps were parsed in a single vectorised pass, kept to compare against.
+
+    # Arguments:
+        sales_order_data: a dataframe representing the contents of the sales_order table.
+
+    # Returns:
+        A dataframe in the format of fact_sales_order.
+    """
+    df = pd.DataFrame(sales_order_data)
+
+    for column in ["created_at", "last_updated"]:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = (
+                df[column]
+                .dt.strftime("%Y-%m-%dT%H:%M:%S.%f")
+                .str.removesuffix(".000000")
+            )
+
+    df[["created_date", "created_time"]] = df["created_at"].str.split("T", expand=True)
+    df[["last_updated_date", "last_updated_time"]] = df["last_updated"].str.split(
+        "T", expand=True
+    )
+
+    df["created_date"] = pd.to_datetime(df["created_date"], format="%Y-%m-%d").dt.date
+    df["last_updated_date"] = pd.to_datetime(
+        df["last_updated_date"], format="%Y-%m-%d"
+    ).dt.date
+    df["agreed_payment_date"] = pd.to_datetime(
+        df["agreed_payment_date"], format="%Y-%m-%d"
+    ).dt.date
+    df["agreed_delivery_date"] = pd.to_datetime(
+        df["agreed_delivery_date"], format="%Y-%m-%d"
+    ).dt.date
+
+    del df["created_at"]
+    del df["last_updated"]
+
+    df.insert(0, "sales_record_id", df.index)
+
+    df = df.rename(columns={"staff_id": "sales_staff_id"})
+
+    return df[FACT_SALES_ORDER_COLUMNS]
+
+
+def run_benchmark(row_count, repeat, number):
+    """
+    This function times both implementations on synthetic tables with string and datetime timestamps, checking that they give the same dataframe apart from the sales_record_id keys.
+
+    # Arguments:
+        row_count: an integer representing the number of rows in the synthetic table.
+        repeat: an integer representing how many times each timing is repeated; the best is reported.
+        number: an integer representing how many times the table is transformed in each timing.
+
+    # Returns:
+        A dictionary mapping each timestamp type and implementation to the best time in seconds for transforming the table once.
+    """
+    implementations = {
+        "reference": reference_fact_sales_order,
+        "vectorised": transform_fact_sales_order,
+    }
+
+    results = {}
+    for timestamps_as_strings, label in [(True, "strings"), (False, "datetimes")]:
+        df = make_sales_orders(row_count, timestamps_as_strings)
+        # The reference numbered rows by their position, so only the other
+        # columns are compared.
+        pd.testing.assert_frame_equal(
+            reference_fact_sales_order(df).drop(columns="sales_record_id"),
+            transform_fact_sales_order(df).drop(columns="sales_record_id"),
+        )
+
+        print(f"sales_order: {row_count} rows, timestamps as {label}")
+        for name, implementation in implementations.items():
+            timings = timeit.repeat(
+                lambda: implementation(df), repeat=repeat, number=number
+            )
+            results[(label, name)] = min(timings) / number
+
+        baseline = results[(label, "reference")]
+        for name in implementations:
+            seconds = results[(label, name)]
+            print(f"  {name:<10} {seconds * 1000:8.1f} ms  {baseline / seconds:5.1f}x")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--number", type=int, default=1)
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.repeat, args.number)
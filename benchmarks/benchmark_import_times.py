@@ -0,0 +1,125 @@
+"""
+Measures how long each lambda handler module takes to import on a cold start, and which packages that time is spent on. Every import runs in a fresh interpreter with python -X importtime, so nothing is already cached in sys.modules.
+
+Run from the project root:
+    PYTHONPATH=$(pwd) python benchmarks/benchmark_import_times.py
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+HANDLER_MODULES = [
+    "src.ingestion.ingest_lambda",
+    "src.transform.transform_lambda",
+    "src.load.load_lambda",
+]
+
+
+def parse_import_times(output):
+    """
+    This function parses the report printed by python -X importtime.
+
+    # Arguments:
+        output: a string holding the standard error of the interpreter.
+
+    # Returns:
+        A list of tuples of the module name, its nesting depth and its cumulative import time in microseconds, in the order they were reported.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), depth, int(cumulative)))
+
+    return imports
+
+
+def measure_import(module, repeat):
+    """
+    This function imports a module in a fresh interpreter several times and keeps the fastest run.
+
+    # Arguments:
+        module: a string representing the dotted name of the module to import.
+        repeat: an integer representing how many fresh interpreters to import the module in.
+
+    # Returns:
+        A tuple of the total import time in microseconds and a dictionary mapping each top-level package imported along the way to its cumulative import time in microseconds, which includes the packages it imports in turn.
+
+    # Raises:
+        RuntimeError: The module could not be imported.
+    """
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=os.environ,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+        imports = parse_import_times(result.stderr)
+        root = module.split(".")[0]
+        total = sum(
+            cumulative
+            for name, depth, cumulative in imports
+            if depth == 0 and name.split(".")[0] == root
+        )
+        if best is None or total < best[0]:
+            best = (total, imports)
+
+    # Children are reported before their parents, so walking the report
+    # backwards meets each parent first. A package is charged the cumulative
+    # time of every import that enters it from a different package.
+    packages = defaultdict(int)
+    parents = []
+    for name, depth, cumulative in reversed(best[1]):
+        del parents[depth:]
+        package = name.split(".")[0]
+        if depth > 0 and parents[-1] != package:
+            packages[package] += cumulative
+        parents.append(package)
+
+    return best[0], packages
+
+
+def run_benchmark(modules, repeat, top):
+    """
+    This function reports the cold import time of each module, together with the packages that take the longest to import.
+
+    # Arguments:
+        modules: a list of strings representing the dotted names of the modules to import.
+        repeat: an integer representing how many fresh interpreters each module is imported in; the fastest is reported.
+        top: an integer representing how many of the slowest packages to list for each module.
+
+    # Returns:
+        A dictionary mapping each module name to its total import time in seconds.
+    """
+    results = {}
+    for module in modules:
+        total, packages = measure_import(module, repeat)
+        results[module] = total / 1e6
+
+        print(f"{module}: {total / 1000:8.1f} ms")
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        for package, cumulative in slowest[:top]:
+            print(f"  {package:<24} {cumulative / 1000:8.1f} ms")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("modules", nargs="*", default=HANDLER_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    run_benchmark(args.modules, args.repeat, args.top)
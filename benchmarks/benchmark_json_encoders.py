@@ -0,0 +1,63 @@
+"""
+Compares the json encoders in src/utils/json_encoder.py on the rows of the sales_order table in the mock totesys database. The seed data only has a handful of rows, so they are repeated to make up a realistically sized table.
+
+Run from the project root with a .env file pointing at the mock database:
+    PYTHONPATH=$(pwd) python benchmarks/benchmark_json_encoders.py
+"""
+
+import argparse
+import timeit
+
+from src.ingestion.ingest_utils import extract_data
+from src.utils.json_encoder import JSON_ENCODERS
+
+
+def run_benchmark(table_name, row_count, repeat, number):
+    """
+    This function extracts a table once and times every available json encoder on its rows, checking that they all produce the same output.
+
+    # Arguments:
+        table_name: a string representing the name of the table to extract.
+        row_count: an integer representing the number of rows to encode, made up by repeating the extracted rows.
+        repeat: an integer representing how many times each timing is repeated; the best is reported.
+        number: an integer representing how many times the rows are encoded in each timing.
+
+    # Returns:
+        A dictionary mapping each encoder name to the best time in seconds for encoding the rows once.
+
+    # Raises:
+        RuntimeError: The encoders do not produce identical output.
+    """
+    seed_rows = extract_data(table_name)
+    rows = (seed_rows * (row_count // len(seed_rows) + 1))[:row_count]
+
+    outputs = {name: encoder(rows) for name, encoder in JSON_ENCODERS.items()}
+    if len(set(outputs.values())) != 1:
+        raise RuntimeError("JSON encoders produced different output")
+    size = len(next(iter(outputs.values())))
+
+    print(f"{table_name}: {len(rows)} rows, {size / 1e6:.2f} MB of json")
+
+    results = {}
+    for name, encoder in JSON_ENCODERS.items():
+        timings = timeit.repeat(lambda: encoder(rows), repeat=repeat, number=number)
+        results[name] = min(timings) / number
+
+    baseline = results["stdlib"]
+    for name, seconds in results.items():
+        print(
+            f"  {name:<8} {seconds * 1000:8.2f} ms  {size / seconds / 1e6:8.1f} MB/s  {baseline / seconds:5.1f}x"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--table", default="sales_order")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.table, args.rows, args.repeat, args.number)
@@ -0,0 +1,7 @@
+-- Adds the index used by load_fact_sales_order_into_warehouse to skip sales
+-- order versions that are already in the warehouse. Safe to run more than once.
+-- CONCURRENTLY avoids blocking loads while the index is built, so this file
+-- must not be run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS fact_sales_order_version_idx
+  ON fact_sales_order (sales_order_id, last_updated_date, last_updated_time);
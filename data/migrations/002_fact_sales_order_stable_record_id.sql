@@ -0,0 +1,8 @@
+-- fact_sales_order.sales_record_id is now derived by the transform stage from
+-- the version of each sales order, so every run gives a version the same key.
+-- The warehouse no longer assigns it, and rows already loaded keep their ids.
+-- Safe to run more than once.
+
+ALTER TABLE fact_sales_order ALTER COLUMN sales_record_id DROP DEFAULT;
+ALTER TABLE fact_sales_order ALTER COLUMN sales_record_id TYPE BIGINT;
+DROP SEQUENCE IF EXISTS fact_sales_order_sales_record_id_seq;
@@ -61,7 +61,7 @@ CREATE TABLE dim_counterparty (
 );
 
 CREATE TABLE fact_sales_order (
-  sales_record_id SERIAL PRIMARY KEY NOT NULL,
+  sales_record_id BIGINT PRIMARY KEY NOT NULL,
   sales_order_id INT NOT NULL,
   created_date DATE REFERENCES dim_date(date_id) NOT NULL,
   created_time TIME NOT NULL DEFAULT CURRENT_TIME,
@@ -76,4 +76,7 @@ CREATE TABLE fact_sales_order (
   agreed_payment_date DATE REFERENCES dim_date(date_id) NOT NULL,  -- Format: yyyy-mm-dd
   agreed_delivery_date DATE REFERENCES dim_date(date_id) NOT NULL,  -- Format: yyyy-mm-dd
   agreed_delivery_location_id INT REFERENCES dim_location(location_id) NOT NULL
-);
\ No newline at end of file
+);
+
+CREATE INDEX fact_sales_order_version_idx
+  ON fact_sales_order (sales_order_id, last_updated_date, last_updated_time);
@@ -6,74 +6,140 @@ import json
 import os
 import logging
 
-import boto3
-import requests
+from src.ingestion.ingest_utils import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CATALOG_TTL,
+    DEFAULT_FORMAT,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PART_SIZE,
+    get_table_catalog,
+    ingest_all,
+    order_tables,
+)
+from src.utils.aws_clients import get_client
+from src.utils.credentials import DEFAULT_SECRET_TTL, use_db_credentials
+
+
+def split_setting(value):
+    """
+    This function splits a comma separated environment variable into a list.
+
+    # Arguments:
+        value: a string such as "sales_order, staff", or None.
 
-from src.ingestion.ingest_utils import ingest
+    # Returns:
+        A list of the non-empty, stripped items, or None if there are none.
+    """
+    items = [item.strip() for item in (value or "").split(",") if item.strip()]
+    return items or None
 
 
 def lambda_handler(event, context):
     """
     This function will get database credentials from AWS Secrets Manager and store the data in the ingestion s3 bucket in json format for all tables in the database.
 
+    # Arguments:
+        event: a dictionary, which may contain {"full_refresh": true} to ingest and upload whole tables, and contains {"state_machine": true} when the handler runs as a step of the state machine.
+        context: the lambda context object.
+
     # Returns:
-        A message with status code 200 on successful extraction of the data from the database into the s3 bucket.
+        A message with status code 200 on successful extraction of the data from the database into the s3 bucket, together with a manifest of the uploaded objects.
         A message with status code 500 on an unsuccessful attempt.
     """
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     try:
+        # As a step of an execution, the manifest is returned to the execution
+        # instead, which passes it on to the transform stage.
+        in_state_machine = bool((event or {}).get("state_machine", False))
+        step_function = os.environ["STEP_MACHINE_ARN"]
+        client = get_client("stepfunctions", region_name="eu-west-2")
+
+        # Objects uploaded now would not be in a manifest of their own, and a
+        # later run would find them unchanged and leave them out as well, so
+        # nothing is ingested until the running execution has finished.
+        if not in_state_machine:
+            sf_running = client.list_executions(
+                stateMachineArn=step_function, statusFilter="RUNNING"
+            )
+            if sf_running.get("executions", []):
+                logger.info("Pipeline execution still running, ingestion deferred.")
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps({"message": "Ingestion deferred"}),
+                    "manifest": {},
+                }
+
         secret_name = "arn:aws:secretsmanager:eu-west-2:389125938424:secret:Totesys_DB_Credentials-4f8nsr"
 
-        secrets_extension_endpoint = (
-            f"http://localhost:2773/secretsmanager/get?secretId={secret_name}"
+        use_db_credentials(
+            secret_name,
+            ttl=int(os.environ.get("SECRET_CACHE_TTL", DEFAULT_SECRET_TTL)),
         )
-        headers = {
-            "X-Aws-Parameters-Secrets-Token": os.environ.get("AWS_SESSION_TOKEN")
-        }
 
+        catalog = get_table_catalog(
+            include=split_setting(os.environ.get("INGESTION_INCLUDE_TABLES")),
+            exclude=split_setting(os.environ.get("INGESTION_EXCLUDE_TABLES")),
+            ttl=int(os.environ.get("INGESTION_CATALOG_TTL", DEFAULT_CATALOG_TTL)),
+        )
+        table_names = order_tables(
+            catalog, split_setting(os.environ.get("INGESTION_PRIORITY_TABLES"))
+        )
+        if not table_names:
+            raise RuntimeError("No tables found to ingest")
+
+        incremental = os.environ.get("INCREMENTAL_INGESTION", "false").lower() == "true"
+        full_refresh = bool((event or {}).get("full_refresh", False))
+        batch_size = int(os.environ.get("INGESTION_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        max_workers = int(os.environ.get("INGESTION_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        file_format = os.environ.get("INGESTION_FORMAT", DEFAULT_FORMAT).lower()
+        compression = os.environ.get("INGESTION_COMPRESSION", "").lower() or None
+        part_size_mb = int(os.environ.get("INGESTION_PART_SIZE_MB", 0))
+        part_size = part_size_mb * 1024 * 1024 or DEFAULT_PART_SIZE
+
+        logger.info(f"Ingesting {len(table_names)} tables: {table_names}")
+        results, errors = ingest_all(
+            table_names,
+            os.environ["INGESTION_BUCKET_NAME"],
+            max_workers=max_workers,
+            incremental=incremental,
+            full_refresh=full_refresh,
+            batch_size=batch_size,
+            file_format=file_format,
+            compression=compression,
+            part_size=part_size,
+        )
+        for table, result in results.items():
+            logger.info(f"Ingested {table} table: {result}")
+        for table, error in errors.items():
+            logger.error(f"Ingesting {table} table failed: {error}")
 
-        response = requests.get(secrets_extension_endpoint, headers=headers)
-        logger.info(f"Response status code: {response.status_code}")
-
-        secret = json.loads(response.text)["SecretString"]
-        secret = json.loads(secret)
-
-        os.environ["DBUSER"] = secret["user"]
-        os.environ["DBNAME"] = secret["database"]
-        os.environ["DBPASSWORD"] = secret["password"]
-        os.environ["PORT"] = secret["port"]
-        os.environ["HOST"] = secret["host"]
-
-        table_names = [
-            "sales_order",
-            "design",
-            "address",
-            "counterparty",
-            "staff",
-            "currency",
-            "department",
-        ]
-        # Only 7 out of 11 tables included to match mock database
-        # To extract ALL tables include missing table names
-        for table in table_names:
-            logger.info(f"Ingesting {table} table.")
-            ingest(table, os.environ["INGESTION_BUCKET_NAME"])
+        if not results:
+            raise RuntimeError(f"Ingestion failed for all tables: {errors}")
 
-        step_function = os.environ["STEP_MACHINE_ARN"]
-        client = boto3.client("stepfunctions", region_name="eu-west-2")
-        sf_running = client.list_executions(
-            stateMachineArn=os.environ["STEP_MACHINE_ARN"], statusFilter="RUNNING"
-        )
-        sf_running_check = sf_running.get("executions", [])
-        if not sf_running_check:
-            client.start_execution(stateMachineArn=step_function)
+        manifest = {table: result for table, result in results.items() if result["key"]}
 
-        return {
+        if manifest and not in_state_machine:
+            execution_input = {"manifest": manifest}
+            if full_refresh:
+                execution_input["full_refresh"] = True
+            client.start_execution(
+                stateMachineArn=step_function,
+                input=json.dumps(execution_input),
+            )
+
+        if errors:
+            raise RuntimeError(f"Ingestion failed for tables: {', '.join(errors)}")
+
+        response = {
             "statusCode": 200,
             "body": json.dumps({"message": "Data successfully extracted"}),
+            "manifest": manifest,
         }
+        if full_refresh:
+            response["full_refresh"] = True
+        return response
 
     except Exception as e:
         logger.error(f"Error: {str(e)}")
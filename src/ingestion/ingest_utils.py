@@ -3,22 +3,167 @@ Contains the utility functions for the ingestion lambda_handler.
 """
 
 import datetime
+import functools
+import importlib.util
+import itertools
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
+from fnmatch import fnmatch
 
-import boto3
 from pg8000.native import identifier
 
-from src.utils.db_connection import close_conn, create_conn
-from src.utils.default_serialiser import default_serialiser
+from src.utils.aws_clients import get_client
+from src.utils.compression import get_compression
+from src.utils.connection_pool import pooled_conn
+from src.utils.fingerprint import fingerprint_chunks, new_digest
+from src.utils.json_encoder import get_json_encoder
+from src.utils.latest_object import read_latest_pointer, write_latest_pointer
+from src.utils.streaming_upload import DEFAULT_PART_SIZE, upload_stream
 
+# pyarrow is only imported once the parquet format is used, so that json
+# ingestion does not pay for importing it on a cold start.
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
 
-def extract_data(table_name):
+WATERMARK_PREFIX = "_watermarks"
+
+# The tables that are ingested incrementally when incremental ingestion is on.
+# The transform stage joins the other tables to each other as a whole, so they
+# are always ingested as complete snapshots.
+INCREMENTAL_TABLES = ["sales_order"]
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_FORMAT = "json"
+DEFAULT_CATALOG_TTL = 900
+
+# Discovered tables, kept between warm invocations of the lambda. Maps the
+# schema, include and exclude patterns to the expiry time and the tables.
+TABLE_CATALOG_CACHE = {}
+
+
+def discover_tables(schema="public", include=None, exclude=None):
+    """
+    This function lists the tables in the database from information_schema, together with their size on disk.
+
+    # Arguments:
+        schema: a string representing the schema whose tables are listed.
+        include: an optional list of shell-style patterns, such as "sales_*"; when given, only tables matching one of them are listed.
+        exclude: an optional list of shell-style patterns; tables matching any of them are not listed.
+
+    # Returns:
+        A list of dictionaries, each with the "table_name" and its total "size" in bytes, in alphabetical order.
+
+    # Raises:
+        RuntimeError: An error occurred during discovery.
+    """
+
+    query = """
+        SELECT t.table_name, pg_total_relation_size(c.oid) AS size
+        FROM information_schema.tables t
+        JOIN pg_catalog.pg_namespace n ON n.nspname = t.table_schema
+        JOIN pg_catalog.pg_class c
+            ON c.relnamespace = n.oid AND c.relname = t.table_name
+        WHERE t.table_schema = :schema AND t.table_type = 'BASE TABLE'
+        ORDER BY t.table_name
+    """
+
+    with pooled_conn() as conn:
+        try:
+            rows = conn.run(query, schema=schema)
+        except Exception as e:
+            raise RuntimeError(f"Table discovery failed: {e}")
+
+    tables = []
+    for table_name, size in rows:
+        if include and not any(fnmatch(table_name, pattern) for pattern in include):
+            continue
+        if exclude and any(fnmatch(table_name, pattern) for pattern in exclude):
+            continue
+        tables.append({"table_name": table_name, "size": size})
+
+    return tables
+
+
+def get_table_catalog(
+    schema="public", include=None, exclude=None, ttl=DEFAULT_CATALOG_TTL
+):
+    """
+    This function returns the tables found by discover_tables, reusing the result of an earlier call with the same arguments for ttl seconds, so warm invocations of the lambda do not repeat the discovery.
+
+    # Arguments:
+        schema: a string representing the schema whose tables are listed.
+        include: an optional list of shell-style patterns of tables to include.
+        exclude: an optional list of shell-style patterns of tables to exclude.
+        ttl: a number representing how many seconds a discovered catalog is reused for.
+
+    # Returns:
+        A list of dictionaries as returned by discover_tables.
+
+    # Raises:
+        RuntimeError: An error occurred during discovery.
     """
-    This function connects to the database whose credentials are stored as environment variables and selects all the information in the given table.
+
+    cache_key = (schema, tuple(include or ()), tuple(exclude or ()))
+    cached = TABLE_CATALOG_CACHE.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    tables = discover_tables(schema, include, exclude)
+    TABLE_CATALOG_CACHE[cache_key] = (time.monotonic() + ttl, tables)
+    return tables
+
+
+def order_tables(tables, priority=None):
+    """
+    This function orders tables for ingestion. Tables named in priority come first, in the order given, followed by the rest from largest to smallest, so the longest ingestions start first and the total time is as short as possible.
+
+    # Arguments:
+        tables: a list of dictionaries as returned by discover_tables.
+        priority: an optional list of table names to ingest before all others.
+
+    # Returns:
+        A list of table names in the order they should be ingested.
+    """
+
+    priority = list(priority or [])
+
+    def sort_key(table):
+        if table["table_name"] in priority:
+            return (0, priority.index(table["table_name"]), 0)
+        return (1, 0, -table["size"])
+
+    return [table["table_name"] for table in sorted(tables, key=sort_key)]
+
+
+def build_select_query(table_name, since=None):
+    """
+    This function builds the query used to select the rows of a table, optionally restricted to rows updated after a watermark.
+
+    # Arguments:
+        table_name: a string representing the name of the table in the database.
+        since: an optional datetime; when given, only rows whose last_updated value is later than it are selected.
+
+    # Returns:
+        A tuple of the query string and a dictionary of its parameters.
+    """
+
+    query = f"SELECT * FROM {identifier(table_name)}"
+    params = {}
+    if since is not None:
+        query += " WHERE last_updated > :since"
+        params["since"] = since
+
+    return query, params
+
+
+def extract_data(table_name, since=None):
+    """
+    This function connects to the database whose credentials are stored as environment variables and selects all the information in the given table. If a watermark is given, only rows updated after it are selected.
 
     # Arguments:
         table_name: a string representing the name of the table in the database that we want to extract.
+        since: an optional datetime; when given, only rows whose last_updated value is later than it are returned.
 
     # Returns:
         A list of dictionaries where each dictionary represents a single row in the given table and the keys are the column names in the given table.
@@ -27,61 +172,273 @@ def extract_data(table_name):
         RuntimeError: An error occurred during data extraction.
     """
 
-    query = f"SELECT * FROM {identifier(table_name)}"
+    query, params = build_select_query(table_name, since)
 
-    conn = create_conn()
-
-    if conn:
+    with pooled_conn() as conn:
         try:
-            data = conn.run(query)
+            data = conn.run(query, **params)
             columns = [column["name"] for column in conn.columns]
             result = [dict(zip(columns, row)) for row in data]
             return result
         except Exception as e:
             raise RuntimeError(f"Database query failed: {e}")
-        finally:
-            close_conn(conn)
 
 
-def convert_to_json(data):
+def fetch_in_batches(table_name, batch_size=DEFAULT_BATCH_SIZE, since=None):
+    """
+    This function selects the information in the given table through a server-side cursor and yields it in fixed-size batches of rows as returned by pg8000, together with the description of their columns.
+
+    # Arguments:
+        table_name: a string representing the name of the table in the database that we want to extract.
+        batch_size: an integer representing the maximum number of rows in each batch.
+        since: an optional datetime; when given, only rows whose last_updated value is later than it are returned.
+
+    # Yields:
+        Tuples of the column descriptions, as found in pg8000's Connection.columns, and a list of at most batch_size rows. The first batch is always yielded, even if it is empty, so that the columns are known for an empty table.
+
+    # Raises:
+        RuntimeError: An error occurred during data extraction.
+    """
+
+    query, params = build_select_query(table_name, since)
+    cursor = identifier(f"{table_name}_cursor")
+
+    with pooled_conn() as conn:
+        try:
+            conn.run("START TRANSACTION")
+            conn.run(f"DECLARE {cursor} NO SCROLL CURSOR FOR {query}", **params)
+            first_batch = True
+            while True:
+                data = conn.run(f"FETCH FORWARD {int(batch_size)} FROM {cursor}")
+                if data or first_batch:
+                    yield conn.columns, data
+                if not data:
+                    break
+                first_batch = False
+            conn.run(f"CLOSE {cursor}")
+            conn.run("COMMIT")
+        except Exception as e:
+            raise RuntimeError(f"Database query failed: {e}")
+
+
+def extract_data_in_batches(table_name, batch_size=DEFAULT_BATCH_SIZE, since=None):
     """
-    This function converts a list of dictionaries that the extract_data function returns into a json object. It is functionally identical to the json.dumps method, with a specified function for the default argument.
+    This function selects the information in the given table through a server-side cursor and yields it in fixed-size batches, so only one batch of rows is held in memory at a time.
+
+    # Arguments:
+        table_name: a string representing the name of the table in the database that we want to extract.
+        batch_size: an integer representing the maximum number of rows in each batch.
+        since: an optional datetime; when given, only rows whose last_updated value is later than it are returned.
+
+    # Yields:
+        Lists of at most batch_size dictionaries, where each dictionary represents a single row in the given table and the keys are the column names in the given table.
+
+    # Raises:
+        RuntimeError: An error occurred during data extraction.
+    """
+
+    for columns, data in fetch_in_batches(table_name, batch_size, since):
+        if data:
+            names = [column["name"] for column in columns]
+            yield [dict(zip(names, row)) for row in data]
+
+
+def extract_record_batches(table_name, batch_size=DEFAULT_BATCH_SIZE, since=None):
+    """
+    This function selects the information in the given table through a server-side cursor and yields it as typed Arrow record batches, built straight from the rows and the column types Postgres reports, without converting rows to dictionaries or text.
+
+    # Arguments:
+        table_name: a string representing the name of the table in the database that we want to extract.
+        batch_size: an integer representing the maximum number of rows in each batch.
+        since: an optional datetime; when given, only rows whose last_updated value is later than it are returned.
+
+    # Yields:
+        pyarrow RecordBatch objects of at most batch_size rows, all with the same schema. At least one batch is yielded, even for an empty table.
+
+    # Raises:
+        RuntimeError: An error occurred during data extraction.
+    """
+
+    from src.utils import pg_arrow
+
+    schema = None
+    for columns, data in fetch_in_batches(table_name, batch_size, since):
+        if schema is None:
+            schema = pg_arrow.arrow_schema(columns)
+        yield pg_arrow.rows_to_record_batch(data, schema)
+
+
+def convert_to_json(data, encoder=None):
+    """
+    This function converts a list of dictionaries that the extract_data function returns into a json object. Datetime, date, time and Decimal values are supported. Floats written with an exponent differ between the encoders, as described in src/utils/json_encoder.py.
 
     # Arguments:
         data: a list of dictionaries.
+        encoder: an optional function returned by get_json_encoder. Defaults to the fastest encoder installed.
 
     # Returns:
-        A json object.
+        A json object, as UTF-8 encoded bytes.
     """
 
-    return json.dumps(data, default=default_serialiser)
+    return (encoder or get_json_encoder())(data)
 
 
-def upload_to_s3(data, bucket_name, table_name):
+def convert_batches_to_json(batches, encoder=None):
     """
-    This function takes a json object and uploads it to a given bucket with a key that includes table name and datestamp.
+    This function converts batches of rows into the pieces of a single json array, one piece per batch. Joined together, the pieces are identical to the output of convert_to_json for all the rows.
 
     # Arguments:
-        data: a json object containing the data for a table in the database.
-        bucket_name: a string representing the name of the s3 bucket to upload to.
-        table_name: a string representing the table whose data we are uploading.
+        batches: an iterable of lists of dictionaries, such as the one returned by extract_data_in_batches.
+        encoder: an optional function returned by get_json_encoder. Defaults to the fastest encoder installed.
 
-    # Returns:
-        A message confirming successful upload and showing the full location.
+    # Yields:
+        Bytes objects that together make up one json array.
     """
 
-    s3 = boto3.client("s3")
+    encoder = encoder or get_json_encoder()
+
+    yield b"["
+    separator = b""
+    for batch in batches:
+        if batch:
+            yield separator + convert_to_json(batch, encoder)[1:-1]
+            separator = b","
+    yield b"]"
+
+
+def convert_batches_to_ndjson(batches, encoder=None):
+    """
+    This function converts batches of rows into newline-delimited json, where each row is a json object on its own line. Each batch is converted as soon as it arrives, and the output can be read back one line at a time.
+
+    # Arguments:
+        batches: an iterable of lists of dictionaries, such as the one returned by extract_data_in_batches.
+        encoder: an optional function returned by get_json_encoder. Defaults to the fastest encoder installed.
+
+    # Yields:
+        Bytes objects, one per batch, each holding one line per row.
+    """
+
+    encoder = encoder or get_json_encoder()
+
+    for batch in batches:
+        if batch:
+            yield b"".join(encoder(row) + b"\n" for row in batch)
+
+
+def convert_record_batches_to_parquet(batches, compression=None):
+    """
+    This function converts Arrow record batches into a single Parquet file, with one row group per batch.
+
+    # Arguments:
+        batches: an iterable of pyarrow RecordBatch objects, such as the one returned by extract_record_batches, holding at least one batch.
+        compression: an optional string representing the compression codec used inside the Parquet file. Defaults to snappy.
+
+    # Yields:
+        A bytes object holding the Parquet file.
+    """
+
+    from src.utils import pg_arrow
+
+    batches = iter(batches)
+    first_batch = next(batches)
+    yield pg_arrow.write_parquet(
+        itertools.chain([first_batch], batches),
+        first_batch.schema,
+        compression=compression or "snappy",
+    )
+
+
+# The converter, file extension and content type for each ingestion format.
+INGESTION_FORMATS = {
+    "json": (convert_batches_to_json, "json", "application/json"),
+    "ndjson": (convert_batches_to_ndjson, "ndjson", "application/x-ndjson"),
+}
+if PARQUET_AVAILABLE:
+    INGESTION_FORMATS["parquet"] = (
+        convert_record_batches_to_parquet,
+        "parquet",
+        "application/vnd.apache.parquet",
+    )
+
+
+def make_object_key(table_name, extension="json"):
+    """
+    This function builds the key under which a table's data is uploaded, made up of the table name and the current datestamp.
+
+    # Arguments:
+        table_name: a string representing the table whose data is being uploaded.
+        extension: a string representing the file extension of the object.
+
+    # Returns:
+        A string representing the object key.
+    """
 
     now = datetime.datetime.now(timezone.utc)
     date_path = now.strftime("%Y/%m/%d")
     timestamp = now.strftime("%Y%m%dT%H%M%SZ")
 
-    key = f"{table_name}/{date_path}/{table_name}-{timestamp}.json"
+    return f"{table_name}/{date_path}/{table_name}-{timestamp}.{extension}"
+
+
+def upload_to_s3(
+    data,
+    bucket_name,
+    table_name,
+    key=None,
+    details=None,
+    content_type="application/json",
+    content_encoding=None,
+    part_size=DEFAULT_PART_SIZE,
+    should_complete=None,
+):
+    """
+    This function takes a json object, or a stream of its pieces, and uploads it to a given bucket with a key that includes table name and datestamp. Streams are uploaded as they are produced, in concurrent multipart upload parts once they outgrow a single part, so the whole object is never held in memory. The key is then recorded as the latest object for the table.
+
+    # Arguments:
+        data: a json object containing the data for a table in the database, as bytes or a string, or an iterable of bytes objects which together make it up.
+        bucket_name: a string representing the name of the s3 bucket to upload to.
+        table_name: a string representing the table whose data we are uploading.
+        key: an optional string representing the key to upload to. Defaults to one built by make_object_key.
+        details: an optional dictionary of further information to record with the latest object, such as its fingerprint, or a function returning one, which is called once the data has been uploaded.
+        content_type: a string representing the media type of the data.
+        content_encoding: an optional string representing the compression of the data, such as "gzip".
+        part_size: an integer representing the size in bytes of each part of a multipart upload.
+        should_complete: an optional function called once the whole stream has been read. When it returns False nothing is uploaded. The stream is then spooled to a temporary file before anything is sent, rather than uploaded as it is produced.
+
+    # Returns:
+        A message confirming successful upload and showing the full location, or None if should_complete abandoned the upload.
+    """
+
+    s3 = get_client("s3")
+
+    if key is None:
+        key = make_object_key(table_name)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, bytes):
+        data = [data]
 
     try:
-        s3.put_object(
-            Bucket=bucket_name, Key=key, Body=data, ContentType="application/json"
+        extra_args = {"ContentType": content_type}
+        if content_encoding is not None:
+            extra_args["ContentEncoding"] = content_encoding
+        completed = upload_stream(
+            s3,
+            data,
+            bucket_name,
+            key,
+            part_size=part_size,
+            should_complete=should_complete,
+            **extra_args,
         )
+        if not completed:
+            message = f"No changes to {table_name}, skipped upload"
+            print(message)
+            return None
+
+        if callable(details):
+            details = details()
+        write_latest_pointer(s3, bucket_name, table_name, key, details)
 
         message = f"Uploaded to s3://{bucket_name}/{key}"
         print(message)
@@ -91,29 +448,306 @@ def upload_to_s3(data, bucket_name, table_name):
         raise RuntimeError(f"Database query failed: {e}")
 
 
-def ingest(table_name, bucket_name):
+def get_previous_fingerprint(table_name, bucket_name):
+    """
+    This function reads the fingerprint of the most recent object uploaded for a table from the given s3 bucket.
+
+    # Arguments:
+        table_name: a string representing the table whose fingerprint we want.
+        bucket_name: a string representing the name of the s3 bucket holding the table's objects.
+
+    # Returns:
+        A string representing the fingerprint, or None if no fingerprinted object has been uploaded for the table yet.
+
+    # Raises:
+        RuntimeError: An error occurred while reading the fingerprint.
+    """
+
+    s3 = get_client("s3")
+
+    try:
+        pointer = read_latest_pointer(s3, bucket_name, table_name)
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of fingerprint failed: {e}")
+
+    return (pointer or {}).get("fingerprint")
+
+
+def get_watermark(table_name, bucket_name):
+    """
+    This function reads the watermark for a table from the given s3 bucket. The watermark is the most recent last_updated value seen by a previous incremental ingestion.
+
+    # Arguments:
+        table_name: a string representing the table whose watermark we want.
+        bucket_name: a string representing the name of the s3 bucket holding the watermark.
+
+    # Returns:
+        A datetime object, or None if no watermark has been stored for the table yet.
+
+    # Raises:
+        RuntimeError: An error occurred while reading the watermark.
+    """
+
+    s3 = get_client("s3")
+
+    try:
+        response = s3.get_object(
+            Bucket=bucket_name, Key=f"{WATERMARK_PREFIX}/{table_name}.json"
+        )
+    except s3.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of watermark failed: {e}")
+
+    state = json.loads(response["Body"].read().decode("utf-8"))
+    return datetime.datetime.fromisoformat(state["last_updated"])
+
+
+def save_watermark(table_name, bucket_name, watermark):
+    """
+    This function stores the watermark for a table in the given s3 bucket, so that the next incremental ingestion only selects rows updated after it.
+
+    # Arguments:
+        table_name: a string representing the table the watermark belongs to.
+        bucket_name: a string representing the name of the s3 bucket to store the watermark in.
+        watermark: a datetime object representing the most recent last_updated value ingested.
+
+    # Returns:
+        None.
+
+    # Raises:
+        RuntimeError: An error occurred while storing the watermark.
+    """
+
+    s3 = get_client("s3")
+
+    state = {"table_name": table_name, "last_updated": watermark.isoformat()}
+
+    try:
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=f"{WATERMARK_PREFIX}/{table_name}.json",
+            Body=json.dumps(state),
+            ContentType="application/json",
+        )
+    except Exception as e:
+        raise RuntimeError(f"Storing of watermark failed: {e}")
+
+
+def track_batches(batches, stats):
     """
-    This function calls extract_data, and converts the data to json through the convert_to_json function. It then uploads the data into the given s3 bucket.
+    This function passes batches of rows through unchanged while recording how many rows were seen and the most recent last_updated value among them.
+
+    # Arguments:
+        batches: an iterable of lists of dictionaries, such as the one returned by extract_data_in_batches.
+        stats: a dictionary with "rows" and "last_updated" keys, which is updated in place.
+
+    # Yields:
+        The batches, unchanged.
+    """
+
+    for batch in batches:
+        stats["rows"] += len(batch)
+        for row in batch:
+            last_updated = row.get("last_updated")
+            if last_updated is not None and (
+                stats["last_updated"] is None or last_updated > stats["last_updated"]
+            ):
+                stats["last_updated"] = last_updated
+        yield batch
+
+
+def track_record_batches(batches, stats):
+    """
+    This function passes Arrow record batches through unchanged while recording how many rows were seen and the most recent last_updated value among them.
+
+    # Arguments:
+        batches: an iterable of pyarrow RecordBatch objects, such as the one returned by extract_record_batches.
+        stats: a dictionary with "rows" and "last_updated" keys, which is updated in place.
+
+    # Yields:
+        The batches, unchanged.
+    """
+
+    import pyarrow.compute as pc
+
+    for batch in batches:
+        stats["rows"] += batch.num_rows
+        if batch.num_rows and "last_updated" in batch.schema.names:
+            last_updated = pc.max(batch.column("last_updated")).as_py()
+            if last_updated is not None and (
+                stats["last_updated"] is None or last_updated > stats["last_updated"]
+            ):
+                stats["last_updated"] = last_updated
+        yield batch
+
+
+def ingest(
+    table_name,
+    bucket_name,
+    incremental=False,
+    full_refresh=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    file_format=DEFAULT_FORMAT,
+    compression=None,
+    part_size=DEFAULT_PART_SIZE,
+):
+    """
+    This function extracts the data in batches through extract_data_in_batches, and converts each batch to json as it arrives through the convert_batches_to_json function, or to newline-delimited json through the convert_batches_to_ndjson function. In parquet format the batches are instead extracted as typed Arrow record batches through extract_record_batches and written to Parquet. It then uploads the data into the given s3 bucket, holding only a few batches and upload parts in memory at once.
+
+    In incremental mode only rows updated since the table's stored watermark are extracted, nothing is uploaded when there are no such rows, and the watermark is moved forward after a successful upload.
+
+    The json can be compressed before it is uploaded, in which case the key ends with the suffix of the compression, such as .json.gz. The json is fingerprinted before compression and the fingerprint stored with the upload. Outside incremental mode, when it matches the fingerprint of the table's previous upload the data has not changed, so nothing is uploaded, unless full_refresh is set. The converted data is then spooled to a temporary file until the fingerprint is known, so the largest table that can be ingested is bounded by the space in /tmp. Incremental deltas and full refreshes are streamed to s3 as they are converted instead.
 
     # Arguments:
         table_name: a string representing the name of the table the data is from.
         bucket_name: a string representing the name of the s3 bucket that is being uploaded to.
+        incremental: a boolean; when True, the table's watermark is used and updated.
+        full_refresh: a boolean; when True in incremental mode, the stored watermark is ignored and the whole table is extracted, after which the watermark is reset.
+        batch_size: an integer representing the number of rows fetched from the database at a time.
+        file_format: a string representing the format to upload the data in, either "json" for a single json array, "ndjson" for one json object per line or "parquet", which needs pyarrow.
+        compression: an optional string representing the compression to apply before uploading, either "gzip" or "zstd". In parquet format it is the codec used inside the Parquet file instead.
+        part_size: an integer representing the size in bytes of each part when the data is uploaded in parts.
 
     # Return:
-        A string indicating successful extraction of the data.
+        A dictionary describing the upload, suitable for a pipeline manifest: the object "key" (None when nothing was uploaded), the number of "rows", the "fingerprint" of the data and, in incremental mode, the new "watermark" as an ISO 8601 string. A table without last_updated values keeps its previous watermark.
 
     # Raises:
         RuntimeError: An error occurred during data extraction.
     """
 
     try:
-        extracted_data = extract_data(table_name)
-
-        converted_data = convert_to_json(extracted_data)
-
-        upload_to_s3(converted_data, bucket_name, table_name)
+        converter, extension, content_type = INGESTION_FORMATS[file_format]
+
+        watermark = None
+        if incremental and not full_refresh:
+            watermark = get_watermark(table_name, bucket_name)
+
+        stats = {"rows": 0, "last_updated": None}
+        if file_format == "parquet":
+            batches = track_record_batches(
+                extract_record_batches(
+                    table_name, batch_size=batch_size, since=watermark
+                ),
+                stats,
+            )
+            # Parquet compresses its pages itself rather than being wrapped.
+            converter = functools.partial(converter, compression=compression)
+            compression = None
+        else:
+            batches = track_batches(
+                extract_data_in_batches(
+                    table_name, batch_size=batch_size, since=watermark
+                ),
+                stats,
+            )
+
+        # The first batch shows whether there are any rows, without reading on.
+        batches = iter(batches)
+        first_batch = next(batches, None)
+        if incremental and not stats["rows"]:
+            return {"key": None, "rows": 0, "fingerprint": None, "watermark": None}
+        if first_batch is not None:
+            batches = itertools.chain([first_batch], batches)
+
+        digest = new_digest()
+        chunks = fingerprint_chunks(converter(batches), digest)
+
+        content_encoding = None
+        if compression is not None:
+            compress, _, suffix, content_encoding = get_compression(compression)
+            chunks = compress(chunks)
+            extension += suffix
+
+        # A snapshot is compared with the previous one, which is only possible
+        # once the whole table has been read, so it is spooled until then.
+        # Deltas and full refreshes are always kept, and are streamed straight
+        # to s3 while the rows are still being read.
+        should_complete = None
+        if not incremental and not full_refresh:
+            previous_fingerprint = get_previous_fingerprint(table_name, bucket_name)
+
+            def should_complete():
+                return digest.hexdigest() != previous_fingerprint
+
+        key = make_object_key(table_name, extension)
+        uploaded = upload_to_s3(
+            chunks,
+            bucket_name,
+            table_name,
+            key,
+            details=lambda: {"fingerprint": digest.hexdigest()},
+            content_type=content_type,
+            content_encoding=content_encoding,
+            part_size=part_size,
+            should_complete=should_complete,
+        )
 
-        return "Ingestion successful"
+        if uploaded is None:
+            return {
+                "key": None,
+                "rows": stats["rows"],
+                "fingerprint": digest.hexdigest(),
+                "watermark": None,
+            }
+
+        new_watermark = None
+        if incremental and stats["last_updated"] is not None:
+            save_watermark(table_name, bucket_name, stats["last_updated"])
+            new_watermark = stats["last_updated"].isoformat()
+        elif incremental and watermark is not None:
+            new_watermark = watermark.isoformat()
+
+        return {
+            "key": key,
+            "rows": stats["rows"],
+            "fingerprint": digest.hexdigest(),
+            "watermark": new_watermark,
+        }
 
     except Exception as e:
         raise RuntimeError(f"Ingestion failed: {e}")
+
+
+def ingest_all(
+    table_names,
+    bucket_name,
+    max_workers=DEFAULT_MAX_WORKERS,
+    incremental=False,
+    **kwargs,
+):
+    """
+    This function ingests several tables concurrently, each in its own worker thread, so the total time approaches that of the slowest table rather than the sum. A failure in one table does not stop the others.
+
+    # Arguments:
+        table_names: a list of strings representing the tables to ingest.
+        bucket_name: a string representing the name of the s3 bucket that is being uploaded to.
+        max_workers: an integer representing the maximum number of tables ingested at the same time.
+        incremental: a boolean; when True, the tables in INCREMENTAL_TABLES are ingested incrementally and the others as whole snapshots.
+        kwargs: any further keyword arguments, which are passed on to ingest for every table.
+
+    # Returns:
+        A tuple of two dictionaries keyed by table name: the first holds the result of ingest for each table that succeeded, the second the error for each table that failed.
+    """
+
+    results = {}
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            table_name: executor.submit(
+                ingest,
+                table_name,
+                bucket_name,
+                incremental=incremental and table_name in INCREMENTAL_TABLES,
+                **kwargs,
+            )
+            for table_name in table_names
+        }
+        for table_name, future in futures.items():
+            try:
+                results[table_name] = future.result()
+            except Exception as e:
+                errors[table_name] = e
+
+    return results, errors
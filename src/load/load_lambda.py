@@ -5,24 +5,28 @@ Contains the main function used by the Load Lambda AWS resource.
 import json
 import os
 import logging
-import requests
 
 from src.load.load_utils import (
-    access_files_from_processed_bucket,
-    load_dim_counterparty_into_warehouse,
-    load_dim_currency_into_warehouse,
-    load_dim_dates_into_warehouse,
-    load_dim_design_into_warehouse,
-    load_dim_location_into_warehouse,
-    load_dim_staff_into_warehouse,
-    load_fact_sales_order_into_warehouse,
+    WAREHOUSE_LOADERS,
+    load_all_into_warehouse,
+    read_table_to_load,
+    save_loaded_fingerprint,
 )
+from src.utils.aws_clients import get_client
+from src.utils.checkpoints import save_checkpoint
+from src.utils.concurrency import DEFAULT_MAX_WORKERS, map_concurrently
+from src.utils.credentials import DEFAULT_SECRET_TTL, use_db_credentials
+from src.utils.date_dimension import record_loaded_dates
 
 
 def lambda_handler(event, context):
     """
     This function will get warehouse credentials from AWS Secrets Manager, import the most recent transformed data from s3 and load it into the warehouse.
 
+    # Arguments:
+        event: a dictionary, which may contain the manifest of the transform stage, as {"manifest": {table_name: {"key": ...}}}, the checkpoints of an incremental transformation, as {"checkpoints": {table_name: key}}, which are stored once every table has loaded, and {"full_refresh": true} to load every table.
+        context: the lambda context object.
+
     # Returns:
         A message with status code 200 on successful loading into the warehouse.
         A message with status code 500 on unsuccessful loading of the data.
@@ -35,45 +39,73 @@ def lambda_handler(event, context):
             "arn:aws:secretsmanager:eu-west-2:389125938424:secret:datawarehouse-zhlI93"
         )
 
-        secrets_extension_endpoint = (
-            f"http://localhost:2773/secretsmanager/get?secretId={secret_name}"
+        use_db_credentials(
+            secret_name,
+            ttl=int(os.environ.get("SECRET_CACHE_TTL", DEFAULT_SECRET_TTL)),
         )
-        headers = {
-            "X-Aws-Parameters-Secrets-Token": os.environ.get("AWS_SESSION_TOKEN")
-        }
 
-        response = requests.get(secrets_extension_endpoint, headers=headers)
-        logger.info(f"Response status code: {response.status_code}")
-
-        secret = json.loads(response.text)["SecretString"]
-        secret = json.loads(secret)
-
-        os.environ["DBUSER"] = secret["user"]
-        os.environ["DBNAME"] = secret["database"]
-        os.environ["DBPASSWORD"] = secret["password"]
-        os.environ["PORT"] = secret["port"]
-        os.environ["HOST"] = secret["host"]
-
-        # Only 7 out of 11 tables included to match mock database
-        # To extract ALL tables include missing table names
-        table_names = {
-            "dim_design": load_dim_design_into_warehouse,
-            "dim_currency": load_dim_currency_into_warehouse,
-            "dim_location": load_dim_location_into_warehouse,
-            "dim_date": load_dim_dates_into_warehouse,
-            "dim_staff": load_dim_staff_into_warehouse,
-            "dim_counterparty": load_dim_counterparty_into_warehouse,
-            "fact_sales_order": load_fact_sales_order_into_warehouse,
-        }
+        manifest = (event or {}).get("manifest")
+        if manifest is None:
+            manifest = {table_name: {} for table_name in WAREHOUSE_LOADERS}
+
+        full_refresh = bool((event or {}).get("full_refresh", False))
+        bucket_name = os.environ["TRANSFORM_BUCKET_NAME"]
+
+        selected = [
+            table_name for table_name in WAREHOUSE_LOADERS if table_name in manifest
+        ]
+        reads = map_concurrently(
+            lambda table_name: read_table_to_load(
+                table_name, bucket_name, manifest[table_name], full_refresh
+            ),
+            selected,
+            max_workers=int(os.environ.get("LOAD_MAX_READERS", DEFAULT_MAX_WORKERS)),
+        )
 
-        for table_name in table_names:
-            df = access_files_from_processed_bucket(
-                table_name, os.environ["TRANSFORM_BUCKET_NAME"]
-            )
+        dataframes = {}
+        fingerprints = {}
+        for table_name, (fingerprint, dataframe) in reads.items():
+            if dataframe is None:
+                logger.info(f"No changes to table {table_name}, skipped loading.")
+                continue
+            fingerprints[table_name] = fingerprint
+            dataframes[table_name] = dataframe
             logger.info(f"Extracted data from processed bucket for table {table_name}.")
-            table_names[table_name](df)
-            logger.info(f"Loaded {table_name} to the warehouse.")
-        
+
+        report = {}
+        if dataframes:
+            savepoints = os.environ.get("LOAD_SAVEPOINTS", "false").lower() == "true"
+            report = load_all_into_warehouse(dataframes, savepoints=savepoints)
+
+        errors = {}
+        for table_name, table_report in report.items():
+            if "error" in table_report:
+                errors[table_name] = table_report["error"]
+                logger.error(f"Loading {table_name} failed: {table_report['error']}")
+            else:
+                logger.info(
+                    f"Loaded {table_name} to the warehouse: {table_report['rows']} rows in {table_report['seconds']}s."
+                )
+                if fingerprints[table_name] is not None:
+                    save_loaded_fingerprint(
+                        table_name, bucket_name, fingerprints[table_name]
+                    )
+                if table_name == "dim_date":
+                    record_loaded_dates(
+                        get_client("s3"),
+                        bucket_name,
+                        dataframes[table_name]["date_id"],
+                    )
+
+        if errors:
+            raise RuntimeError(f"Loading failed for tables: {', '.join(errors)}")
+
+        # Only now are the rows read since the previous checkpoints in the
+        # warehouse, so the next incremental transformation can start after them.
+        for source, key in (event or {}).get("checkpoints", {}).items():
+            save_checkpoint(source, bucket_name, key)
+            logger.info(f"Moved the checkpoint of {source} to {key}.")
+
         return {
             "statusCode": 200,
             "body": json.dumps({"message": "Data successfully loaded"}),
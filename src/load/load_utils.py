@@ -2,298 +2,480 @@
 Contains the utility functions for the load lambda_handler.
 """
 
-import awswrangler as wr
-import boto3
+import io
+import json
+import time
 
-from src.utils.db_connection import close_conn, create_conn
+from pg8000.native import identifier
 
+from src.utils.aws_clients import get_client
+from src.utils.connection_pool import pooled_conn
+from src.utils.latest_object import find_latest_key, read_latest_pointer
+from src.utils.pg_arrow import read_parquet
 
-def access_files_from_processed_bucket(table_name, bucket_name):
+LOADED_PREFIX = "_loaded"
+
+
+def access_files_from_processed_bucket(table_name, bucket_name, key=None):
     """
     This function connects to the s3 bucket with transformed data and returns all the information in the given table as a dataframe.
 
     # Arguments:
         table_name: a string representing the name of the table in the database that we want to extract.
         bucket_name: a string representing the name of the s3 bucket with transformed data to connect to.
+        key: an optional string representing the key of the object to read, such as one named in a pipeline manifest. Defaults to the most recent object for the table.
 
     # Returns:
-        A dataframe containing the most recent data for the given table in the bucket.
+        A dataframe containing the most recent data for the given table in the bucket, or the data in the given object.
 
     # Raises:
         RuntimeError: An error occurred during data retrieval.
     """
     try:
-        client = boto3.client("s3")
-        listing_response = client.list_objects_v2(Bucket=bucket_name, Prefix=table_name)
-        object_key = listing_response["Contents"][-1]["Key"]
-        path = f"s3://{bucket_name}/{object_key}"
-        response = wr.s3.read_parquet([path])
-        return response
+        client = get_client("s3")
+        object_key = key or find_latest_key(client, bucket_name, table_name)
+        response = client.get_object(Bucket=bucket_name, Key=object_key)
+        return read_parquet(response["Body"].read(), nullable=True)
 
     except Exception as e:
         raise RuntimeError(f"Retrieval of data from processed bucket failed: {e}")
 
 
-def load_dim_dates_into_warehouse(df):
+def find_object_to_load(table_name, bucket_name, entry=None):
     """
-    Loads data from a dataframe into the warehouse's dim_dates table.
+    This function works out which transformed object to load for a table, together with the fingerprint recorded for it by the transform stage.
 
     # Arguments:
-        df: a dataframe representing the contents of the dim_dates table.
+        table_name: a string representing the name of the warehouse table.
+        bucket_name: a string representing the name of the s3 bucket with transformed data.
+        entry: an optional dictionary describing the object, such as the table's entry in a pipeline manifest. Defaults to the most recent object for the table.
 
     # Returns:
-        None.
+        A tuple of the key of the object and its fingerprint, which is None where no fingerprint has been recorded.
+
+    # Raises:
+        RuntimeError: An error occurred while finding the object.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_date
-            VALUES
-            """
+    if entry and entry.get("key"):
+        return entry["key"], entry.get("fingerprint")
 
-            for _, row in df.iterrows():
-                query += f"('{row['date_id']}', {row['year']}, {row['month']}, {row['day']}, {row['day_of_week']}, '{row['day_name']}', '{row['month_name']}', {row['quarter']}), "
-            query = query[:-2]
-            query += "ON CONFLICT (date_id) DO NOTHING;"
+    try:
+        client = get_client("s3")
+        pointer = read_latest_pointer(client, bucket_name, table_name)
+        if pointer is not None:
+            return pointer["key"], pointer.get("fingerprint")
+        return find_latest_key(client, bucket_name, table_name), None
 
-            conn.run(query)
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of object to load failed: {e}")
 
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
 
-        finally:
-            close_conn(conn)
+def get_loaded_fingerprint(table_name, bucket_name):
+    """
+    This function reads the fingerprint of the data last loaded into a warehouse table, which is stored in the s3 bucket with transformed data.
+
+    # Arguments:
+        table_name: a string representing the name of the warehouse table.
+        bucket_name: a string representing the name of the s3 bucket holding the fingerprint.
+
+    # Returns:
+        A string representing the fingerprint, or None if none has been stored for the table yet.
+
+    # Raises:
+        RuntimeError: An error occurred while reading the fingerprint.
+    """
+    client = get_client("s3")
+
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{LOADED_PREFIX}/{table_name}.json"
+        )
+    except client.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of loaded fingerprint failed: {e}")
+
+    return json.loads(response["Body"].read().decode("utf-8"))["fingerprint"]
 
 
-def load_dim_staff_into_warehouse(df):
+def save_loaded_fingerprint(table_name, bucket_name, fingerprint):
     """
-    Loads data from a dataframe into the warehouse's dim_staff table.
+    This function stores the fingerprint of the data just loaded into a warehouse table, so that the same data is not loaded again.
 
     # Arguments:
-        df: a dataframe representing the contents of the dim_staff table.
+        table_name: a string representing the name of the warehouse table.
+        bucket_name: a string representing the name of the s3 bucket to store the fingerprint in.
+        fingerprint: a string representing the fingerprint of the loaded data.
 
     # Returns:
         None.
+
+    # Raises:
+        RuntimeError: An error occurred while storing the fingerprint.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_staff
-            VALUES
-            """
+    client = get_client("s3")
 
-            for _, row in df.iterrows():
-                query += f"({row['staff_id']}, $${row['first_name']}$$, $${row['last_name']}$$, '{row['department_name']}', '{row['location']}', $${row['email_address']}$$), "
-            query = query[:-2]
-            query += " ON CONFLICT (staff_id) DO NOTHING;"
+    state = {"table_name": table_name, "fingerprint": fingerprint}
 
-            conn.run(query)
+    try:
+        client.put_object(
+            Bucket=bucket_name,
+            Key=f"{LOADED_PREFIX}/{table_name}.json",
+            Body=json.dumps(state),
+            ContentType="application/json",
+        )
+    except Exception as e:
+        raise RuntimeError(f"Storing of loaded fingerprint failed: {e}")
 
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
 
-        finally:
-            close_conn(conn)
+def read_table_to_load(table_name, bucket_name, entry=None, full_refresh=False):
+    """
+    This function reads the transformed data to load into a warehouse table, unless it has the same fingerprint as the data last loaded into it.
+
+    # Arguments:
+        table_name: a string representing the name of the warehouse table.
+        bucket_name: a string representing the name of the s3 bucket with transformed data.
+        entry: an optional dictionary describing the object, such as the table's entry in a pipeline manifest. Defaults to the most recent object for the table.
+        full_refresh: a boolean, when True the data is read even if it has already been loaded.
+
+    # Returns:
+        A tuple of the fingerprint of the data, which is None where no fingerprint has been recorded, and a dataframe of the data, which is None where it has already been loaded.
+
+    # Raises:
+        RuntimeError: An error occurred while reading the data or its fingerprints.
+    """
+    key, fingerprint = find_object_to_load(table_name, bucket_name, entry)
+    if (
+        not full_refresh
+        and fingerprint is not None
+        and fingerprint == get_loaded_fingerprint(table_name, bucket_name)
+    ):
+        return fingerprint, None
 
+    return fingerprint, access_files_from_processed_bucket(table_name, bucket_name, key)
 
-def load_dim_location_into_warehouse(df):
+
+def copy_dataframe_to_staging(conn, df, table_name, columns, staging_columns="*"):
     """
-    Loads data from a dataframe into the warehouse's dim_location table.
+    Creates a temporary staging table shaped like a warehouse table and streams the given dataframe columns into it with COPY ... FROM STDIN.
 
     # Arguments:
-        df: a dataframe representing the contents of the dim_location table.
+        conn: a pg8000 Connection object.
+        df: a dataframe holding the data to stage.
+        table_name: a string representing the warehouse table the staging table is modelled on.
+        columns: a list of the dataframe's column names, in the same order as the staging table's columns.
+        staging_columns: a string listing the warehouse table columns that the staging table should have. Defaults to all of them.
 
     # Returns:
-        None.
+        A string representing the name of the staging table.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_location
-            VALUES
-            """
+    staging_table = identifier(f"staging_{table_name}")
 
-            for _, row in df.iterrows():
-                query += f"({row['location_id']}, $${row['address_line_1']}$$, $${row['address_line_2']}$$, $${row['district']}$$, $${row['city']}$$, $${row['postal_code']}$$, $${row['country']}$$, $${row['phone']}$$), "
-            query = query[:-2]
-            query += " ON CONFLICT (location_id) DO NOTHING;"
+    # Missing values are written as \N, so that empty strings are not read
+    # back as NULL, as an unquoted empty csv field would be.
+    buffer = io.StringIO()
+    df[columns].to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
 
-            conn.run(query)
-
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
+    conn.run(f"DROP TABLE IF EXISTS {staging_table}")
+    conn.run(
+        f"CREATE TEMP TABLE {staging_table} AS SELECT {staging_columns} FROM {identifier(table_name)} WITH NO DATA"
+    )
+    conn.run(
+        f"COPY {staging_table} FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        stream=buffer,
+    )
 
-        finally:
-            close_conn(conn)
+    return staging_table
 
 
-def load_dim_currency_into_warehouse(df):
+def bulk_load_dataframe(df, table_name, columns, conflict_columns, conn=None):
     """
-    Loads data from a dataframe into the warehouse's dim_currency table.
+    Loads data from a dataframe into a warehouse table by copying it into a staging table and merging it in, skipping rows whose key already exists.
 
     # Arguments:
-        df: a dataframe representing the contents of the dim_currency table.
+        df: a dataframe representing the contents of the warehouse table.
+        table_name: a string representing the name of the warehouse table.
+        columns: a list of the dataframe's column names, in the same order as the warehouse table's columns.
+        conflict_columns: a string listing the columns of the warehouse table's primary key.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
     # Returns:
-        None.
+        An integer representing the number of rows added to the table.
+
+    # Raises:
+        RuntimeError: An error occurred while loading the data.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_currency
-            VALUES
-            """
+    if conn is None:
+        with pooled_conn() as conn:
+            return bulk_load_dataframe(df, table_name, columns, conflict_columns, conn)
 
-            for _, row in df.iterrows():
-                query += f"({row['currency_id']}, $${row['currency_code']}$$, $${row['currency_name']}$$), "
-            query = query[:-2]
-            query += " ON CONFLICT (currency_id) DO NOTHING;"
+    try:
+        staging_table = copy_dataframe_to_staging(conn, df, table_name, columns)
+        conn.run(
+            f"INSERT INTO {identifier(table_name)} SELECT * FROM {staging_table} ON CONFLICT ({conflict_columns}) DO NOTHING"
+        )
+        row_count = conn.row_count
+        conn.run(f"DROP TABLE {staging_table}")
+        return row_count
 
-            conn.run(query)
+    except Exception as e:
+        raise RuntimeError(f"Database query failed: {e}")
 
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
 
-        finally:
-            close_conn(conn)
+def load_dim_dates_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's dim_dates table.
 
+    # Arguments:
+        df: a dataframe representing the contents of the dim_dates table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
-def load_dim_design_into_warehouse(df):
+    # Returns:
+        An integer representing the number of rows added to the table.
     """
-    Loads data from a dataframe into the warehouse's dim_design table.
+    columns = [
+        "date_id",
+        "year",
+        "month",
+        "day",
+        "day_of_week",
+        "day_name",
+        "month_name",
+        "quarter",
+    ]
+    return bulk_load_dataframe(df, "dim_date", columns, "date_id", conn)
+
+
+def load_dim_staff_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's dim_staff table.
 
     # Arguments:
-        df: a dataframe representing the contents of the dim_design table.
+        df: a dataframe representing the contents of the dim_staff table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
     # Returns:
-        None.
+        An integer representing the number of rows added to the table.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_design
-            VALUES
-            """
+    columns = [
+        "staff_id",
+        "first_name",
+        "last_name",
+        "department_name",
+        "location",
+        "email_address",
+    ]
+    return bulk_load_dataframe(df, "dim_staff", columns, "staff_id", conn)
+
+
+def load_dim_location_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's dim_location table.
 
-            for _, row in df.iterrows():
-                query += f"({row['design_id']}, $${row['design_name']}$$, $${row['file_location']}$$, $${row['file_name']}$$), "
-            query = query[:-2]
-            query += " ON CONFLICT (design_id) DO NOTHING;"
+    # Arguments:
+        df: a dataframe representing the contents of the dim_location table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
-            conn.run(query)
+    # Returns:
+        An integer representing the number of rows added to the table.
+    """
+    columns = [
+        "location_id",
+        "address_line_1",
+        "address_line_2",
+        "district",
+        "city",
+        "postal_code",
+        "country",
+        "phone",
+    ]
+    return bulk_load_dataframe(df, "dim_location", columns, "location_id", conn)
+
+
+def load_dim_currency_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's dim_currency table.
 
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
+    # Arguments:
+        df: a dataframe representing the contents of the dim_currency table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
-        finally:
-            close_conn(conn)
+    # Returns:
+        An integer representing the number of rows added to the table.
+    """
+    columns = ["currency_id", "currency_code", "currency_name"]
+    return bulk_load_dataframe(df, "dim_currency", columns, "currency_id", conn)
 
 
-def load_dim_counterparty_into_warehouse(df):
+def load_dim_design_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's dim_design table.
+
+    # Arguments:
+        df: a dataframe representing the contents of the dim_design table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
+
+    # Returns:
+        An integer representing the number of rows added to the table.
+    """
+    columns = ["design_id", "design_name", "file_location", "file_name"]
+    return bulk_load_dataframe(df, "dim_design", columns, "design_id", conn)
+
+
+def load_dim_counterparty_into_warehouse(df, conn=None):
     """
     Loads data from a dataframe into the warehouse's dim_counterparty table.
 
     # Arguments:
         df: a dataframe representing the contents of the dim_counterparty table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
 
     # Returns:
-        None.
+        An integer representing the number of rows added to the table.
     """
-    conn = create_conn()
-    if conn:
-        try:
-            query = """
-            INSERT INTO dim_counterparty
-            VALUES
-            """
+    columns = [
+        "counterparty_id",
+        "counterparty_legal_name",
+        "counterparty_legal_address_line_1",
+        "counterparty_legal_address_line_2",
+        "counterparty_legal_district",
+        "counterparty_legal_city",
+        "counterparty_legal_postal_code",
+        "counterparty_legal_country",
+        "counterparty_legal_phone",
+    ]
+    return bulk_load_dataframe(df, "dim_counterparty", columns, "counterparty_id", conn)
+
+
+def load_fact_sales_order_into_warehouse(df, conn=None):
+    """
+    Loads data from a dataframe into the warehouse's fact_sales_order table. Updates to a sales order are stored as new rows, without overwriting previous data.
 
-            for _, row in df.iterrows():
-                query += f"({row['counterparty_id']}, $${row['counterparty_legal_name']}$$, $${row['counterparty_legal_address_line_1']}$$, $${row['counterparty_legal_address_line_2']}$$, $${row['counterparty_legal_district']}$$, $${row['counterparty_legal_city']}$$, $${row['counterparty_legal_postal_code']}$$, $${row['counterparty_legal_country']}$$, $${row['counterparty_legal_phone']}$$), "
-            query = query[:-2]
-            query += " ON CONFLICT (counterparty_id) DO NOTHING;"
+    Each row is loaded with the sales_record_id given to it by the transform stage. A row is skipped when the warehouse already holds the same version of the sales order, identified by its sales_record_id, or by its sales_order_id and last updated date and time for rows loaded before the ids were derived. That lookup is served by the fact_sales_order_version_idx index.
 
-            conn.run(query)
+    # Arguments:
+        df: a dataframe representing the contents of the fact_sales_order table.
+        conn: an optional pg8000 Connection object to load through. When omitted, a pooled connection is used and the load is committed straight away.
+
+    # Returns:
+        An integer representing the number of rows added to the table.
+    """
+    columns = [
+        "sales_record_id",
+        "sales_order_id",
+        "created_date",
+        "created_time",
+        "last_updated_date",
+        "last_updated_time",
+        "sales_staff_id",
+        "counterparty_id",
+        "units_sold",
+        "unit_price",
+        "currency_id",
+        "design_id",
+        "agreed_payment_date",
+        "agreed_delivery_date",
+        "agreed_delivery_location_id",
+    ]
+    column_list = ", ".join(columns)
+
+    if conn is None:
+        with pooled_conn() as conn:
+            return load_fact_sales_order_into_warehouse(df, conn)
+
+    try:
+        staging_table = copy_dataframe_to_staging(
+            conn, df, "fact_sales_order", columns, column_list
+        )
+
+        query = f"""
+        INSERT INTO fact_sales_order
+        ({column_list})
+
+        SELECT
+        {column_list}
+        FROM {staging_table} AS staged
+
+        WHERE NOT EXISTS
+        (SELECT 1
+        FROM fact_sales_order AS loaded
+        WHERE loaded.sales_order_id = staged.sales_order_id
+        AND loaded.last_updated_date = staged.last_updated_date
+        AND loaded.last_updated_time = staged.last_updated_time)
+
+        ON CONFLICT (sales_record_id) DO NOTHING
+        ;
+        """
+        conn.run(query)
+        row_count = conn.row_count
+        conn.run(f"DROP TABLE {staging_table}")
+        return row_count
+
+    except Exception as e:
+        raise RuntimeError(f"Database query failed: {e}")
 
-        except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
 
-        finally:
-            close_conn(conn)
+WAREHOUSE_LOADERS = {
+    "dim_design": load_dim_design_into_warehouse,
+    "dim_currency": load_dim_currency_into_warehouse,
+    "dim_location": load_dim_location_into_warehouse,
+    "dim_date": load_dim_dates_into_warehouse,
+    "dim_staff": load_dim_staff_into_warehouse,
+    "dim_counterparty": load_dim_counterparty_into_warehouse,
+    "fact_sales_order": load_fact_sales_order_into_warehouse,
+}
 
 
-def load_fact_sales_order_into_warehouse(df):
+def load_all_into_warehouse(dataframes, savepoints=False):
     """
-    Loads data from a dataframe into the warehouse's fact_sales_order table. Updates to a sales order are stored as new rows, without overwriting previous data.
+    Loads several warehouse tables on a single connection inside a single transaction, which is committed once at the end, so a failure part-way never leaves the warehouse half-loaded.
 
     # Arguments:
-        df: a dataframe representing the contents of the fact_sales_order table.
+        dataframes: a dictionary whose keys are warehouse table names from WAREHOUSE_LOADERS and whose values are dataframes to load. Tables are loaded in the dictionary's order, so dimension tables should come before fact_sales_order.
+        savepoints: a boolean; when True, each table is loaded under its own savepoint and a table that fails is rolled back on its own while the others are still committed.
 
     # Returns:
-        None.
+        A dictionary whose keys are table names and whose values are dictionaries with the number of "rows" added and the "seconds" taken. With savepoints, a table that failed also has an "error" message.
+
+    # Raises:
+        RuntimeError: An error occurred and the whole transaction was rolled back.
     """
-    conn = create_conn()
-    if conn:
+    report = {}
+
+    with pooled_conn() as conn:
+        conn.run("START TRANSACTION")
         try:
-            temp_create_query = """
-            CREATE TEMP TABLE temp_sales_order (
-                sales_record_id SERIAL PRIMARY KEY NOT NULL,
-                sales_order_id INT NOT NULL,
-                created_date DATE NOT NULL,
-                created_time TIME NOT NULL DEFAULT CURRENT_TIME,
-                last_updated_date DATE NOT NULL,
-                last_updated_time TIME NOT NULL DEFAULT CURRENT_TIME,
-                sales_staff_id INT NOT NULL,
-                counterparty_id INT NOT NULL,
-                units_sold INT NOT NULL,
-                unit_price NUMERIC(10, 2) NOT NULL,
-                currency_id INT NOT NULL,
-                design_id INT NOT NULL,
-                agreed_payment_date DATE NOT NULL,
-                agreed_delivery_date DATE NOT NULL,
-                agreed_delivery_location_id INT NOT NULL
-                );
-            """
-
-            temp_insert_query = """
-            INSERT INTO temp_sales_order
-            (sales_order_id, created_date, created_time, last_updated_date, last_updated_time, sales_staff_id, counterparty_id, units_sold, unit_price, currency_id, design_id, agreed_payment_date, agreed_delivery_date, agreed_delivery_location_id)
-            VALUES
-            """
-
-            for _, row in df.iterrows():
-                temp_insert_query += f"({row['sales_order_id']}, '{row['created_date']}', $${row['created_time']}$$, '{row['last_updated_date']}', $${row['last_updated_time']}$$, {row['sales_staff_id']}, {row['counterparty_id']}, {row['units_sold']}, {row['unit_price']}, {row['currency_id']}, {row['design_id']}, '{row['agreed_payment_date']}', '{row['agreed_delivery_date']}', {row['agreed_delivery_location_id']}), "
-
-            temp_insert_query = temp_insert_query[:-2]
-            temp_insert_query += ";"
-
-            query = """
-            INSERT INTO fact_sales_order
-            (sales_order_id, created_date, created_time, last_updated_date, last_updated_time, sales_staff_id, counterparty_id, units_sold, unit_price, currency_id, design_id, agreed_payment_date, agreed_delivery_date, agreed_delivery_location_id)
-
-            SELECT
-            sales_order_id, created_date, created_time, last_updated_date, last_updated_time, sales_staff_id, counterparty_id, units_sold, unit_price, currency_id, design_id, agreed_payment_date, agreed_delivery_date, agreed_delivery_location_id
-            FROM temp_sales_order
-
-            WHERE
-            (sales_order_id, created_date, created_time, last_updated_date, last_updated_time, sales_staff_id, counterparty_id, units_sold, unit_price, currency_id, design_id, agreed_payment_date, agreed_delivery_date, agreed_delivery_location_id)
-
-            NOT IN
-            (SELECT
-            sales_order_id, created_date, created_time, last_updated_date, last_updated_time, sales_staff_id, counterparty_id, units_sold, unit_price, currency_id, design_id, agreed_payment_date, agreed_delivery_date, agreed_delivery_location_id
-            FROM fact_sales_order)
-            ;
-            """
-            conn.run(temp_create_query)
-            conn.run(temp_insert_query)
-            conn.run(query)
+            for table_name, df in dataframes.items():
+                savepoint = identifier(f"load_{table_name}")
+                start = time.perf_counter()
+                if savepoints:
+                    conn.run(f"SAVEPOINT {savepoint}")
+
+                try:
+                    rows = WAREHOUSE_LOADERS[table_name](df, conn)
+                except RuntimeError as e:
+                    if not savepoints:
+                        raise
+                    conn.run(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    report[table_name] = {
+                        "rows": 0,
+                        "seconds": round(time.perf_counter() - start, 3),
+                        "error": str(e),
+                    }
+                    continue
+
+                if savepoints:
+                    conn.run(f"RELEASE SAVEPOINT {savepoint}")
+                report[table_name] = {
+                    "rows": rows,
+                    "seconds": round(time.perf_counter() - start, 3),
+                }
+
+            conn.run("COMMIT")
 
         except Exception as e:
-            raise RuntimeError(f"Database query failed: {e}")
+            conn.run("ROLLBACK")
+            raise RuntimeError(f"Warehouse load rolled back: {e}")
 
-        finally:
-            close_conn(conn)
+    return report
@@ -7,7 +7,16 @@ import logging
 import os
 
 from src.transform.transform_utils import (
+    INCREMENTAL_SOURCE_TABLES,
+    TRANSFORM_DEPENDENCIES,
+    TRANSFORMED_DEPENDENCIES,
+    fingerprint_dataframe,
     get_all_table_data_from_ingest_bucket,
+    get_ingested_fingerprints,
+    get_new_table_data_from_ingest_bucket,
+    get_transformed_pointers,
+    record_unchanged_output,
+    select_transforms,
     transform_dim_counterparty,
     transform_dim_currency,
     transform_dim_date,
@@ -17,58 +26,263 @@ from src.transform.transform_utils import (
     transform_fact_sales_order,
     upload_to_s3,
 )
+from src.utils.aws_clients import get_client
+from src.utils.checkpoints import get_checkpoint
+from src.utils.concurrency import DEFAULT_MAX_WORKERS, run_graph
+from src.utils.date_dimension import read_loaded_dates
+from src.utils.fingerprint import combine_fingerprints
+from src.utils.latest_object import find_latest_key
 
 
 def lambda_handler(event, context):
     """
     This function will run the transform function on all tables in the ingestion bucket and upload them as parquet to the processed bucket.
 
+    # Arguments:
+        event: a dictionary, which may contain the manifest of the ingestion stage, as {"manifest": {table_name: {"key": ...}}}, and {"full_refresh": true} to transform and upload every table.
+        context: the lambda context object.
+
     # Returns:
-        A message with status code 200 on successful input into the processed bucket.
+        A message with status code 200 on successful input into the processed bucket, together with a manifest of the parquet objects for the load stage, and the checkpoints of an incremental transformation for the load stage to store.
         A message with status code 500 on an unsuccessful attempt.
-
     """
 
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     try:
-        
-        ingested_data = get_all_table_data_from_ingest_bucket()
-        logger.info("Extracted data from ingestion bucket.")
+        ingest_manifest = (event or {}).get("manifest")
+        if ingest_manifest is None:
+            table_names = list(TRANSFORM_DEPENDENCIES)
+            keys = {}
+        else:
+            table_names = select_transforms(ingest_manifest)
+            keys = {table: entry["key"] for table, entry in ingest_manifest.items()}
 
-        fact_sales_order = transform_fact_sales_order(ingested_data["sales_order"])
-        dim_design = transform_dim_design(ingested_data["design"])
-        dim_currency = transform_dim_currency(ingested_data["currency"])
-        dim_location = transform_dim_location(ingested_data["address"])
-        dim_date = transform_dim_date(fact_sales_order)
-        dim_staff = transform_dim_staff(
-            ingested_data["staff"], ingested_data["department"]
+        full_refresh = bool((event or {}).get("full_refresh", False))
+        bucket_name = os.environ["TRANSFORM_BUCKET_NAME"]
+
+        incremental = os.environ.get("INCREMENTAL_TRANSFORM", "false").lower() == "true"
+        # Without incremental ingestion each object is a whole snapshot, and
+        # combining the objects since the checkpoint would repeat rows. With it,
+        # each object is a delta, and only the checkpoint keeps a delta whose
+        # load failed from being passed over.
+        if incremental != (
+            os.environ.get("INCREMENTAL_INGESTION", "false").lower() == "true"
+        ):
+            raise RuntimeError(
+                "INCREMENTAL_TRANSFORM and INCREMENTAL_INGESTION must both be true or both be false"
+            )
+
+        ingested_fingerprints = get_ingested_fingerprints(
+            {
+                source
+                for table in table_names
+                for source in TRANSFORM_DEPENDENCIES[table]
+            },
+            ingest_manifest,
         )
-        dim_counterparty = transform_dim_counterparty(
-            ingested_data["counterparty"], ingested_data["address"]
+        input_fingerprints = {
+            table_name: combine_fingerprints(
+                {
+                    source: ingested_fingerprints[source]
+                    for source in TRANSFORM_DEPENDENCIES[table_name]
+                }
+            )
+            for table_name in table_names
+        }
+        previous = get_transformed_pointers(table_names, bucket_name)
+        selected = list(table_names)
+        if not full_refresh:
+            table_names = [
+                table_name
+                for table_name in table_names
+                if input_fingerprints[table_name] is None
+                or input_fingerprints[table_name]
+                != previous[table_name].get("input_fingerprint")
+            ]
+        for table_name in list(table_names):
+            for dependency in TRANSFORMED_DEPENDENCIES.get(table_name, []):
+                if dependency not in table_names:
+                    table_names.insert(0, dependency)
+        logger.info(f"Transforming tables: {table_names}")
+
+        source_tables = []
+        for table_name in table_names:
+            for source in TRANSFORM_DEPENDENCIES[table_name]:
+                if source not in source_tables:
+                    source_tables.append(source)
+
+        max_readers = int(os.environ.get("TRANSFORM_MAX_READERS", DEFAULT_MAX_WORKERS))
+        incremental_sources = []
+        checkpoints = {}
+        if incremental:
+            ingestion_bucket = os.environ["INGESTION_BUCKET_NAME"]
+            incremental_sources = [
+                source
+                for source in INCREMENTAL_SOURCE_TABLES
+                if source in source_tables
+            ]
+        if full_refresh:
+            # The whole table is transformed from its latest object, and later
+            # runs continue from it.
+            for source in incremental_sources:
+                keys[source] = keys.get(source) or find_latest_key(
+                    get_client("s3"), ingestion_bucket, source
+                )
+                checkpoints[source] = keys[source]
+            incremental_sources = []
+
+        ingested_data = get_all_table_data_from_ingest_bucket(
+            [source for source in source_tables if source not in incremental_sources],
+            keys,
+            max_workers=max_readers,
         )
-        logger.info("Transformation of ingested data complete.")
+        for source in incremental_sources:
+            ingested_data[source], checkpoints[source] = (
+                get_new_table_data_from_ingest_bucket(
+                    source,
+                    ingestion_bucket,
+                    get_checkpoint(source, bucket_name),
+                    max_workers=max_readers,
+                )
+            )
+            if checkpoints[source] is None:
+                table_names = [
+                    table_name
+                    for table_name in table_names
+                    if source not in TRANSFORM_DEPENDENCIES[table_name]
+                ]
+                logger.info(f"No new objects for table {source}.")
+        logger.info("Extracted data from ingestion bucket.")
 
-        table_names = {
-            "fact_sales_order": fact_sales_order,
-            "dim_design": dim_design,
-            "dim_currency": dim_currency,
-            "dim_location": dim_location,
-            "dim_date": dim_date,
-            "dim_staff": dim_staff,
-            "dim_counterparty": dim_counterparty,
+        calendar = None
+        if os.environ.get("DIM_DATE_CALENDAR_START"):
+            calendar = (
+                os.environ["DIM_DATE_CALENDAR_START"],
+                os.environ["DIM_DATE_CALENDAR_END"],
+            )
+
+        transforms = {
+            "fact_sales_order": lambda done: transform_fact_sales_order(
+                ingested_data["sales_order"]
+            ),
+            "dim_design": lambda done: transform_dim_design(ingested_data["design"]),
+            "dim_currency": lambda done: transform_dim_currency(
+                ingested_data["currency"],
+                unknown=os.environ.get("UNKNOWN_CURRENCY_POLICY", "raise"),
+            ),
+            "dim_location": lambda done: transform_dim_location(
+                ingested_data["address"]
+            ),
+            "dim_date": lambda done: transform_dim_date(
+                done["fact_sales_order"],
+                loaded_dates=(
+                    None
+                    if full_refresh
+                    else read_loaded_dates(get_client("s3"), bucket_name)
+                ),
+                calendar=calendar,
+            ),
+            "dim_staff": lambda done: transform_dim_staff(
+                ingested_data["staff"], ingested_data["department"]
+            ),
+            "dim_counterparty": lambda done: transform_dim_counterparty(
+                ingested_data["counterparty"], ingested_data["address"]
+            ),
         }
 
-        for k, v in table_names.items():
-            upload_to_s3(v, os.environ["TRANSFORM_BUCKET_NAME"], k)
+        def previous_entry(k):
+            # A table that is not uploaded again is still offered to the load
+            # stage, which skips its last object if that has been loaded.
+            if not previous.get(k, {}).get("key"):
+                return None
+            return {
+                "key": previous[k]["key"],
+                "fingerprint": previous[k].get("fingerprint"),
+            }
+
+        def publish(k, v):
+            if k == "dim_date" and v.empty:
+                if previous[k].get("key"):
+                    details = {
+                        "fingerprint": previous[k].get("fingerprint"),
+                        "input_fingerprint": input_fingerprints[k],
+                    }
+                    record_unchanged_output(k, bucket_name, previous[k], details)
+                logger.info("No new dates for dim_date, skipped upload.")
+                return previous_entry(k)
+
+            details = {
+                "fingerprint": fingerprint_dataframe(v),
+                "input_fingerprint": input_fingerprints[k],
+            }
+            if not full_refresh and details["fingerprint"] == previous[k].get(
+                "fingerprint"
+            ):
+                record_unchanged_output(k, bucket_name, previous[k], details)
+                logger.info(f"No changes to table {k}, skipped upload.")
+                return previous_entry(k)
+
+            path = upload_to_s3(v, bucket_name, k, details)
             logger.info(f"Uploaded transformed data to S3 for table {k}.")
-            
+            return {
+                "key": path.removeprefix(f"s3://{bucket_name}/"),
+                "rows": len(v),
+                "fingerprint": details["fingerprint"],
+            }
 
-        return {
+        # Each table is published as soon as it is transformed, while the
+        # other tables are still being transformed or uploaded.
+        tasks = {}
+        dependencies = {}
+        for table_name in table_names:
+            tasks[table_name] = transforms[table_name]
+            dependencies[table_name] = [
+                dependency
+                for dependency in TRANSFORMED_DEPENDENCIES.get(table_name, [])
+                if dependency in table_names
+            ]
+            tasks[f"publish {table_name}"] = lambda done, k=table_name: publish(
+                k, done[k]
+            )
+            dependencies[f"publish {table_name}"] = [table_name]
+
+        results = run_graph(
+            tasks,
+            dependencies,
+            max_workers=int(
+                os.environ.get("TRANSFORM_MAX_WORKERS", DEFAULT_MAX_WORKERS)
+            ),
+        )
+        logger.info("Transformation of ingested data complete.")
+
+        manifest = {}
+        for table_name in TRANSFORM_DEPENDENCIES:
+            if table_name in table_names:
+                entry = results[f"publish {table_name}"]
+            elif table_name in selected:
+                entry = previous_entry(table_name)
+            else:
+                continue
+            if entry is not None:
+                manifest[table_name] = entry
+
+        response = {
             "statusCode": 200,
             "body": json.dumps({"message": "Data successfully transformed"}),
+            "manifest": manifest,
+        }
+        # The load stage moves the checkpoints forward once the rows are in the
+        # warehouse, so a failed load is transformed again by the next run.
+        checkpoints = {
+            source: key for source, key in checkpoints.items() if key is not None
         }
+        if checkpoints:
+            response["checkpoints"] = checkpoints
+        if full_refresh:
+            response["full_refresh"] = True
+        return response
 
     except Exception as e:
         logger.error(f"Error: {str(e)}")
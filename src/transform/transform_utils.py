@@ -6,95 +6,373 @@ import json
 import os
 from datetime import datetime, timezone
 
-import awswrangler as wr
-import boto3
 import pandas as pd
-from currency_codes import get_currency_by_code
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.utils.aws_clients import get_client
+from src.utils.compression import compression_for_key, get_compression
+from src.utils.concurrency import DEFAULT_MAX_WORKERS, map_concurrently
+from src.utils.currency_names import name_currencies
+from src.utils.date_dimension import build_calendar, calendar_dates
+from src.utils.fingerprint import fingerprint
+from src.utils.latest_object import (
+    find_latest_key,
+    list_keys_after,
+    read_latest_pointer,
+    write_latest_pointer,
+)
+from src.utils.pg_arrow import dataframe_to_parquet, read_parquet
+
+# The ingested tables each warehouse table is built from.
+TRANSFORM_DEPENDENCIES = {
+    "fact_sales_order": ["sales_order"],
+    "dim_design": ["design"],
+    "dim_currency": ["currency"],
+    "dim_location": ["address"],
+    "dim_date": ["sales_order"],
+    "dim_staff": ["staff", "department"],
+    "dim_counterparty": ["counterparty", "address"],
+}
+
+# The transformed tables each warehouse table is built from, which must be
+# transformed before it.
+TRANSFORMED_DEPENDENCIES = {
+    "dim_date": ["fact_sales_order"],
+}
+
+# The ingested tables whose new objects can be transformed on their own, as
+# the warehouse tables built from them only ever have rows added.
+INCREMENTAL_SOURCE_TABLES = ["sales_order"]
+
+# Ingestion may store more tables than these, but only these are transformed.
+INGESTED_TABLE_NAMES = list(
+    dict.fromkeys(
+        source for sources in TRANSFORM_DEPENDENCIES.values() for source in sources
+    )
+)
 
 
-def get_table_data_from_ingest_bucket(table_name, bucket_name):
+def read_ndjson_rows(lines):
     """
-    Connects to the ingestion s3 bucket and retrieves the most recent data for the given table.
+    Reads newline-delimited json one line at a time.
+
+    # Arguments:
+        lines: an iterable of the lines of the object, each holding one json object, such as the iter_lines method of the body returned by the s3 get_object method.
+
+    # Yields:
+        A dictionary for each row, whose keys are column names from the ingested table.
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def get_table_data_from_ingest_bucket(table_name, bucket_name, key=None):
+    """
+    Connects to the ingestion s3 bucket and retrieves the most recent data for the given table, or the data in the given object. Objects stored as newline-delimited json are parsed one line at a time, though every row is still returned together, and compressed objects are decompressed as they are read.
 
     # Arguments:
         table_name: the name of the table in the bucket to retrieve data from.
         bucket_name: the name of the s3 bucket, which should be the ingestion bucket.
+        key: an optional key of the object to read, such as one named in a pipeline manifest. Defaults to the most recent object for the table.
 
     # Returns:
-        A list of dictionaries for a given table. The dictionaries' keys are column names from the ingested table and values are the most recent entries for that table.
+        A list of dictionaries for a given table. The dictionaries' keys are column names from the ingested table and values are the most recent entries for that table. Objects stored as parquet are returned as a dataframe with the same columns instead, keeping the types they were stored with.
 
     # Raises:
         RuntimeError: An error occurred during data retrieval.
     """
     try:
-        client = boto3.client("s3")
-        listing_response = client.list_objects_v2(Bucket=bucket_name, Prefix=table_name)
-        object_key = listing_response["Contents"][-1]["Key"]
+        client = get_client("s3")
+        object_key = key or find_latest_key(client, bucket_name, table_name)
         retrieval_response = client.get_object(Bucket=bucket_name, Key=object_key)
-        body = retrieval_response["Body"].read().decode("utf-8")
-        return json.loads(body)
+        body = retrieval_response["Body"]
+        lines = body.iter_lines()
+
+        if object_key.endswith(".parquet"):
+            return read_parquet(body.read())
+
+        compression = compression_for_key(object_key)
+        if compression is not None:
+            _, open_stream, suffix, _ = get_compression(compression)
+            object_key = object_key.removesuffix(suffix)
+            body = lines = open_stream(body)
+
+        if object_key.endswith(".ndjson"):
+            return list(read_ndjson_rows(lines))
+        return json.loads(body.read().decode("utf-8"))
 
     except Exception as e:
         raise RuntimeError(f"Retrieval of data from ingest bucket failed: {e}")
 
 
-def get_all_table_data_from_ingest_bucket():
+def get_all_table_data_from_ingest_bucket(
+    table_names=None, keys=None, max_workers=DEFAULT_MAX_WORKERS
+):
     """
-    Retrieves the most recent data for each table stored in the ingestion s3 bucket.
+    Retrieves the most recent data for each table stored in the ingestion s3 bucket. The tables are retrieved concurrently, so the time taken approaches that of the slowest table.
+
+    # Arguments:
+        table_names: an optional list of the tables to retrieve. Defaults to all the ingested tables that the transforms use.
+        keys: an optional dictionary mapping table names to the keys of the objects to read for them, such as those named in a pipeline manifest. Tables without a key are read from their most recent object.
+        max_workers: an integer representing the maximum number of tables retrieved at the same time.
 
     # Returns:
         A dictionary whose keys are table names and whose values are lists of dictionaries, each dictionary representing a table row.
+
+    # Raises:
+        RuntimeError: An error occurred during data retrieval.
+    """
+    if table_names is None:
+        table_names = INGESTED_TABLE_NAMES
+    keys = keys or {}
+    bucket_name = os.environ["INGESTION_BUCKET_NAME"]
+
+    return map_concurrently(
+        lambda table_name: get_table_data_from_ingest_bucket(
+            table_name, bucket_name, keys.get(table_name)
+        ),
+        table_names,
+        max_workers=max_workers,
+    )
+
+
+def get_new_table_data_from_ingest_bucket(
+    table_name, bucket_name, after_key=None, max_workers=DEFAULT_MAX_WORKERS
+):
     """
-    table_names = [
-        "sales_order",
-        "design",
-        "address",
-        "counterparty",
-        "staff",
-        "currency",
-        "department",
+    Retrieves the data in every object ingested for the given table since the given object, so that only new data is transformed. The objects are retrieved concurrently and combined in the order they were ingested. This is only correct when the objects hold the rows changed since the previous object, as incremental ingestion stores them.
+
+    # Arguments:
+        table_name: the name of the table in the bucket to retrieve data from.
+        bucket_name: the name of the s3 bucket, which should be the ingestion bucket.
+        after_key: an optional key of the last object already transformed, such as one stored as a checkpoint. Without one only the most recent object is retrieved, rather than the table's whole history.
+        max_workers: an integer representing the maximum number of objects retrieved at the same time.
+
+    # Returns:
+        A tuple of a dataframe holding the rows of the new objects, which is empty when there are none, and the key of the most recent object retrieved, or None when there are none.
+
+    # Raises:
+        RuntimeError: An error occurred during data retrieval.
+    """
+    try:
+        client = get_client("s3")
+        if after_key is None:
+            keys = [find_latest_key(client, bucket_name, table_name)]
+        else:
+            keys = list_keys_after(client, bucket_name, table_name, after_key)
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of data from ingest bucket failed: {e}")
+
+    if not keys:
+        return pd.DataFrame(), None
+
+    objects = map_concurrently(
+        lambda key: pd.DataFrame(
+            get_table_data_from_ingest_bucket(table_name, bucket_name, key)
+        ),
+        keys,
+        max_workers=max_workers,
+    )
+
+    return pd.concat(objects.values(), ignore_index=True), keys[-1]
+
+
+def select_transforms(changed_tables):
+    """
+    Works out which warehouse tables need transforming when only some ingested tables have changed.
+
+    # Arguments:
+        changed_tables: an iterable of the names of ingested tables that have new data.
+
+    # Returns:
+        A list of warehouse table names, in the order they should be transformed.
+    """
+    changed_tables = set(changed_tables)
+    return [
+        table_name
+        for table_name, sources in TRANSFORM_DEPENDENCIES.items()
+        if changed_tables.intersection(sources)
     ]
-    ingested_data = {}
-    for table_name in table_names:
-        ingested_data[table_name] = get_table_data_from_ingest_bucket(
-            table_name, os.environ["INGESTION_BUCKET_NAME"]
+
+
+def get_ingested_fingerprints(table_names, manifest=None):
+    """
+    Retrieves the fingerprints of the ingested data for the given tables, which the ingestion stage records alongside each upload.
+
+    # Arguments:
+        table_names: a list of the ingested tables whose fingerprints are wanted.
+        manifest: an optional pipeline manifest from the ingestion stage. Fingerprints in the manifest are used for the tables it names, and the rest are read from the ingestion bucket.
+
+    # Returns:
+        A dictionary mapping each table name to its fingerprint, or to None where no fingerprint has been recorded.
+
+    # Raises:
+        RuntimeError: An error occurred during fingerprint retrieval.
+    """
+    manifest = manifest or {}
+
+    try:
+        client = get_client("s3")
+        fingerprints = {}
+        for table_name in table_names:
+            if table_name in manifest:
+                fingerprints[table_name] = manifest[table_name].get("fingerprint")
+            else:
+                pointer = read_latest_pointer(
+                    client, os.environ["INGESTION_BUCKET_NAME"], table_name
+                )
+                fingerprints[table_name] = (pointer or {}).get("fingerprint")
+        return fingerprints
+
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of fingerprints failed: {e}")
+
+
+def get_transformed_pointers(table_names, bucket_name):
+    """
+    Retrieves the pointers to the most recent transformed object for each of the given warehouse tables, which hold the fingerprints recorded when it was uploaded.
+
+    # Arguments:
+        table_names: a list of the warehouse tables whose pointers are wanted.
+        bucket_name: the name of the s3 bucket, which should be the processed bucket.
+
+    # Returns:
+        A dictionary mapping each table name to its pointer dictionary, or to an empty dictionary where nothing has been uploaded for the table yet.
+
+    # Raises:
+        RuntimeError: An error occurred during pointer retrieval.
+    """
+    try:
+        client = get_client("s3")
+        return {
+            table_name: read_latest_pointer(client, bucket_name, table_name) or {}
+            for table_name in table_names
+        }
+
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of transformed pointers failed: {e}")
+
+
+def fingerprint_dataframe(dataframe):
+    """
+    Computes a fingerprint of a dataframe from its column names, column types and the hash of every row, so that identical transformed data always has the same fingerprint.
+
+    # Arguments:
+        dataframe: a dataframe with the transformed data.
+
+    # Returns:
+        A string representing the fingerprint.
+    """
+    header = ",".join(f"{column}:{dtype}" for column, dtype in dataframe.dtypes.items())
+    rows = pd.util.hash_pandas_object(dataframe, index=True).values.tobytes()
+    return fingerprint(header.encode("utf-8") + rows)
+
+
+def arrow_to_dates(values):
+    """
+    Converts an Arrow array of dates, held either as "YYYY-MM-DD" strings, as ISO 8601 timestamp strings, or as date or timestamp values, into date objects.
+
+    # Arguments:
+        values: a pyarrow Array.
+
+    # Returns:
+        A numpy array of datetime.date objects, or None where the array has no value.
+    """
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        values = pc.utf8_slice_codeunits(values, 0, 10)
+
+    return values.cast(pa.date32()).to_pandas(date_as_object=True).to_numpy()
+
+
+def to_dates(column):
+    """
+    Converts a column of dates into date objects in one vectorised pass.
+
+    # Arguments:
+        column: a pandas Series holding "YYYY-MM-DD" strings, ISO 8601 timestamp strings, or date or datetime values.
+
+    # Returns:
+        A numpy array of datetime.date objects, or None where the column has no value.
+    """
+    return arrow_to_dates(pa.array(column))
+
+
+def split_timestamps(column):
+    """
+    Splits a column of timestamps into their dates and times in one vectorised pass. Timestamps are held either as ISO 8601 strings, as in data ingested as json, or as datetime values, as in data ingested as parquet.
+
+    # Arguments:
+        column: a pandas Series.
+
+    # Returns:
+        A tuple of two numpy arrays: the datetime.date objects of the timestamps, and their times as "HH:MM:SS.ffffff" strings, whose microseconds are left out when they are zero, as in the strings produced by isoformat.
+    """
+    values = pa.array(column)
+    if pa.types.is_timestamp(values.type):
+        microseconds = pc.cast(values, pa.timestamp("us", values.type.tz), safe=False)
+        times = pc.replace_substring_regex(
+            pc.strftime(microseconds, format="%H:%M:%S"),
+            pattern=r"\.000000$",
+            replacement="",
         )
+    else:
+        times = pc.utf8_slice_codeunits(values, 11)
 
-    return ingested_data
+    return arrow_to_dates(values), times.to_pandas().to_numpy()
+
+
+def make_sales_record_ids(fact_df):
+    """
+    Derives a surrogate key for each row of fact_sales_order by hashing its sales_order_id and the date and time it was last updated, which identify a version of a sales order in the warehouse. A version is given the same key by every run, whichever ingested object it was read from.
+
+    # Arguments:
+        fact_df: a dataframe with the sales_order_id, last_updated_date and last_updated_time columns of fact_sales_order.
+
+    # Returns:
+        A numpy array of non-negative 64-bit integers.
+    """
+    versions = pc.binary_join_element_wise(
+        pc.cast(pa.array(fact_df["sales_order_id"]), pa.string()),
+        pc.cast(pa.array(fact_df["last_updated_date"], pa.date32()), pa.string()),
+        pa.array(fact_df["last_updated_time"], pa.string()),
+        "|",
+    )
+    hashes = pd.util.hash_array(
+        versions.to_numpy(zero_copy_only=False), categorize=False
+    )
+
+    # Halving keeps the keys within the range of a signed bigint.
+    return (hashes // 2).astype("int64")
 
 
 def transform_fact_sales_order(sales_order_data):
     """
-    Transforms data from the sales_order table into the format required for fact_sales_order.
+    Transforms data from the sales_order table into the format required for fact_sales_order. Each version of a sales order is given a sales_record_id that stays the same across runs.
 
     # Arguments:
-        sales_order_data: a list of dictionaries representing the contents of the sales_order table.
+        sales_order_data: a list of dictionaries or a dataframe representing the contents of the sales_order table.
 
     # Returns:
         A dataframe in the required format.
     """
     df = pd.DataFrame(sales_order_data)
 
-    df[["created_date", "created_time"]] = df["created_at"].str.split("T", expand=True)
-    df[["last_updated_date", "last_updated_time"]] = df["last_updated"].str.split(
-        "T", expand=True
+    df["created_date"], df["created_time"] = split_timestamps(df["created_at"])
+    df["last_updated_date"], df["last_updated_time"] = split_timestamps(
+        df["last_updated"]
     )
-
-    df["created_date"] = pd.to_datetime(df["created_date"], format="%Y-%m-%d").dt.date
-    df["last_updated_date"] = pd.to_datetime(
-        df["last_updated_date"], format="%Y-%m-%d"
-    ).dt.date
-    df["agreed_payment_date"] = pd.to_datetime(
-        df["agreed_payment_date"], format="%Y-%m-%d"
-    ).dt.date
-    df["agreed_delivery_date"] = pd.to_datetime(
-        df["agreed_delivery_date"], format="%Y-%m-%d"
-    ).dt.date
+    df["agreed_payment_date"] = to_dates(df["agreed_payment_date"])
+    df["agreed_delivery_date"] = to_dates(df["agreed_delivery_date"])
 
     del df["created_at"]
     del df["last_updated"]
 
-    df.insert(0, "sales_record_id", df.index)
+    df.insert(0, "sales_record_id", make_sales_record_ids(df))
+    # The same version of a sales order can be read from more than one
+    # ingested object, such as overlapping snapshots, and is only kept once.
+    df = df.drop_duplicates("sales_record_id", ignore_index=True)
 
     df = df.rename(columns={"staff_id": "sales_staff_id"})
 
@@ -137,12 +415,13 @@ def transform_dim_design(design_data):
     return df
 
 
-def transform_dim_currency(currency_data):
+def transform_dim_currency(currency_data, unknown="raise"):
     """
     Transforms data from the currency table into the format required for dim_currency.
 
     # Arguments:
         cuurency_data: a list of dictionaries representing the contents of the currency table.
+        unknown: a string representing what to do with currency codes that name no currency, one of "raise", "null" or "code". Defaults to "raise".
 
     # Returns:
         A dataframe in the required format.
@@ -151,9 +430,7 @@ def transform_dim_currency(currency_data):
     del df["created_at"]
     del df["last_updated"]
 
-    df["currency_name"] = (
-        df["currency_code"].apply(get_currency_by_code).apply(lambda x: x.name)
-    )
+    df["currency_name"] = name_currencies(df["currency_code"], unknown=unknown)
 
     return df
 
@@ -177,12 +454,14 @@ def transform_dim_location(location_data):
     return df
 
 
-def transform_dim_date(transformed_fact_sales_data):
+def transform_dim_date(transformed_fact_sales_data, loaded_dates=None, calendar=None):
     """
     Transforms data from the sales_order table into the format required for dim_date.
 
     # Arguments:
         transformed_fact_sales_data: a dataframe returned from the transform_fact_sales_order function.
+        loaded_dates: an optional set of datetime.date objects already in the warehouse, which are left out.
+        calendar: an optional tuple of the first and last dates of a calendar range, as "YYYY-MM-DD" strings, whose dates are included whether or not there are sales on them.
 
     # Returns:
         A dataframe in the required format.
@@ -196,16 +475,13 @@ def transform_dim_date(transformed_fact_sales_data):
         ignore_index=True
     )
 
-    df = all_dates.to_frame(name="date_id")
-    df["year"] = pd.to_datetime(df["date_id"]).dt.year
-    df["month"] = pd.to_datetime(df["date_id"]).dt.month
-    df["day"] = pd.to_datetime(df["date_id"]).dt.day
-    df["day_of_week"] = pd.to_datetime(df["date_id"]).dt.day_of_week
-    df["day_name"] = pd.to_datetime(df["date_id"]).dt.day_name()
-    df["month_name"] = pd.to_datetime(df["date_id"]).dt.month_name()
-    df["quarter"] = pd.to_datetime(df["date_id"]).dt.quarter
+    if calendar is not None:
+        all_dates = pd.concat([pd.Series(calendar_dates(*calendar)), all_dates])
+        all_dates = all_dates.drop_duplicates(ignore_index=True)
+    if loaded_dates:
+        all_dates = all_dates[~all_dates.isin(loaded_dates)]
 
-    return df
+    return build_calendar(all_dates)
 
 
 def transform_dim_staff(staff_data, department_data):
@@ -287,14 +563,15 @@ def transform_dim_counterparty(counterparty_data, address_data):
     return df
 
 
-def upload_to_s3(dataframe, bucket_name, table_name):
+def upload_to_s3(dataframe, bucket_name, table_name, details=None):
     """
-    This function takes a dataframe and uploads it in parquet format to a given bucket with a key that includes table name and datestamp.
+    This function takes a dataframe and uploads it in parquet format to a given bucket with a key that includes table name and datestamp. The key is then recorded as the latest object for the table.
 
     # Arguments:
         dataframe: a dataframe with the transformed data, suitable for storage as parquet.
         bucket_name: a string representing the name of the s3 bucket to upload the parquet file to.
         table_name: a string representing the table in the warehouse that the data corresponds to.
+        details: an optional dictionary of further information to record with the latest object, such as its fingerprints.
 
     # Returns:
         A message containing the location of the uploaded data.
@@ -308,12 +585,12 @@ def upload_to_s3(dataframe, bucket_name, table_name):
 
     key = f"{table_name}/{date_path}/{table_name}-{timestamp}.parquet"
 
-    s3_url = f"s3://{bucket_name}/{key}"
     try:
-        wr.s3.to_parquet(
-            df=dataframe,
-            path=s3_url,
+        client = get_client("s3")
+        client.put_object(
+            Bucket=bucket_name, Key=key, Body=dataframe_to_parquet(dataframe)
         )
+        write_latest_pointer(client, bucket_name, table_name, key, details)
 
         message = f"s3://{bucket_name}/{key}"
         print(message)
@@ -321,3 +598,28 @@ def upload_to_s3(dataframe, bucket_name, table_name):
 
     except Exception as e:
         raise RuntimeError(f"Database query failed: {e}")
+
+
+def record_unchanged_output(table_name, bucket_name, pointer, details):
+    """
+    This function updates the fingerprints recorded with a table's most recent transformed object when a new transformation produced identical data, without uploading the data again.
+
+    # Arguments:
+        table_name: a string representing the table in the warehouse.
+        bucket_name: a string representing the name of the processed s3 bucket.
+        pointer: the dictionary returned by get_transformed_pointers for the table.
+        details: a dictionary of the fingerprints to record.
+
+    # Returns:
+        None.
+
+    # Raises:
+        RuntimeError: An error occurred while updating the pointer.
+    """
+    try:
+        write_latest_pointer(
+            get_client("s3"), bucket_name, table_name, pointer["key"], details
+        )
+
+    except Exception as e:
+        raise RuntimeError(f"Recording of unchanged output failed: {e}")
@@ -0,0 +1,68 @@
+"""
+Contains the utility functions that hand out shared boto3 clients.
+
+Creating a client takes tens of milliseconds and gives it its own connection pool, so each client is created once, on first use, and reused across calls and warm Lambda invocations. boto3 clients can be shared between threads, but creating them through the default session cannot, so creation happens under a lock.
+"""
+
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Enough connections for the concurrent multipart and table uploads, retries
+# with backoff for throttling, and keep-alive so pooled connections survive
+# between invocations.
+CLIENT_CONFIG = Config(
+    max_pool_connections=32,
+    retries={"max_attempts": 5, "mode": "standard"},
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=60,
+)
+
+# Maps each service name and region to its client.
+CLIENTS = {}
+client_lock = threading.Lock()
+
+
+def get_client(service_name, region_name=None):
+    """
+    This function returns the shared client for an AWS service, creating it the first time it is asked for.
+
+    # Arguments:
+        service_name: a string representing the AWS service, such as "s3".
+        region_name: an optional string representing the region of the client. Defaults to the region configured in the environment.
+
+    # Returns:
+        A boto3 client.
+    """
+    key = (service_name, region_name)
+    client = CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with client_lock:
+        if key not in CLIENTS:
+            CLIENTS[key] = boto3.client(
+                service_name, region_name=region_name, config=CLIENT_CONFIG
+            )
+        return CLIENTS[key]
+
+
+def set_client(service_name, client, region_name=None):
+    """
+    This function replaces the shared client for an AWS service, such as with a client created inside a moto mock for tests.
+
+    # Arguments:
+        service_name: a string representing the AWS service, such as "s3".
+        client: the boto3 client to hand out from now on, or None to create a new one on next use.
+        region_name: an optional string representing the region the client is for.
+
+    # Returns:
+        None.
+    """
+    with client_lock:
+        if client is None:
+            CLIENTS.pop((service_name, region_name), None)
+        else:
+            CLIENTS[(service_name, region_name)] = client
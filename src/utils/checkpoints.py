@@ -0,0 +1,72 @@
+"""
+Contains the utility functions that keep track of how far incremental transformation has got through the objects ingested for a table.
+
+The checkpoint of each table is stored in the processed bucket at _checkpoints/<table_name>.json. The transform stage reads the objects ingested after it, and passes the key of the last one on with its manifest. The load stage only moves the checkpoint forward once those rows are in the warehouse.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from src.utils.aws_clients import get_client
+
+CHECKPOINT_PREFIX = "_checkpoints"
+
+
+def get_checkpoint(table_name, bucket_name):
+    """
+    This function retrieves the checkpoint of an incremental transformation, which names the last ingested object of a table whose transformed rows have been loaded into the warehouse.
+
+    # Arguments:
+        table_name: the name of the ingested table whose checkpoint is wanted.
+        bucket_name: the name of the s3 bucket, which should be the processed bucket.
+
+    # Returns:
+        A string representing the key of the last object loaded, or None if no checkpoint has been stored for the table yet.
+
+    # Raises:
+        RuntimeError: An error occurred during checkpoint retrieval.
+    """
+    client = get_client("s3")
+
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{CHECKPOINT_PREFIX}/{table_name}.json"
+        )
+    except client.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        raise RuntimeError(f"Retrieval of checkpoint failed: {e}")
+
+    return json.loads(response["Body"].read().decode("utf-8"))["key"]
+
+
+def save_checkpoint(table_name, bucket_name, key):
+    """
+    This function stores the checkpoint of an incremental transformation, so that the next incremental transformation only retrieves objects ingested after it. It is only moved forward once the transformed rows have been loaded, so rows whose load failed are transformed again.
+
+    # Arguments:
+        table_name: the name of the ingested table the checkpoint belongs to.
+        bucket_name: the name of the s3 bucket, which should be the processed bucket.
+        key: the key of the last ingested object whose rows have been loaded.
+
+    # Returns:
+        None.
+
+    # Raises:
+        RuntimeError: An error occurred while storing the checkpoint.
+    """
+    state = {
+        "table_name": table_name,
+        "key": key,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    try:
+        get_client("s3").put_object(
+            Bucket=bucket_name,
+            Key=f"{CHECKPOINT_PREFIX}/{table_name}.json",
+            Body=json.dumps(state),
+            ContentType="application/json",
+        )
+    except Exception as e:
+        raise RuntimeError(f"Storing of checkpoint failed: {e}")
@@ -0,0 +1,127 @@
+"""
+Contains the utility functions that compress objects before they are uploaded to s3 and decompress them when they are read back.
+
+Compressed objects carry the suffix of their compression in their key, such as .json.gz, and the matching ContentEncoding, so readers can tell how to decode them from the key alone. gzip is always available; zstd needs the zstandard package.
+"""
+
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compress_gzip(chunks):
+    """
+    This function compresses a stream of data with gzip, one chunk at a time.
+
+    # Arguments:
+        chunks: an iterable of bytes objects.
+
+    # Yields:
+        Bytes objects which together make up the gzip compressed data.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def open_gzip(stream):
+    """
+    This function wraps a readable stream of gzip compressed data in a stream of the decompressed data.
+
+    # Arguments:
+        stream: a readable binary file-like object, such as the body returned by the s3 get_object method.
+
+    # Returns:
+        A readable binary file-like object that can also be iterated over line by line.
+    """
+    return gzip.GzipFile(fileobj=stream, mode="rb")
+
+
+def compress_zstd(chunks):
+    """
+    This function compresses a stream of data with zstd, one chunk at a time.
+
+    # Arguments:
+        chunks: an iterable of bytes objects.
+
+    # Yields:
+        Bytes objects which together make up the zstd compressed data.
+    """
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def open_zstd(stream):
+    """
+    This function wraps a readable stream of zstd compressed data in a stream of the decompressed data.
+
+    # Arguments:
+        stream: a readable binary file-like object, such as the body returned by the s3 get_object method.
+
+    # Returns:
+        A readable binary file-like object that can also be iterated over line by line.
+    """
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream))
+
+
+# The compressor, stream opener, key suffix and ContentEncoding for each compression.
+COMPRESSIONS = {"gzip": (compress_gzip, open_gzip, ".gz", "gzip")}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (compress_zstd, open_zstd, ".zst", "zstd")
+
+
+def get_compression(name):
+    """
+    This function returns the details of the compression with the given name.
+
+    # Arguments:
+        name: a string, either "gzip" or "zstd".
+
+    # Returns:
+        A tuple of the compressing function, the stream opening function, the key suffix and the ContentEncoding value.
+
+    # Raises:
+        ValueError: The compression does not exist or is not installed.
+    """
+    if name not in COMPRESSIONS:
+        raise ValueError(f"Compression {name} is not available")
+
+    return COMPRESSIONS[name]
+
+
+def compression_for_key(key):
+    """
+    This function works out how an object was compressed from the suffix of its key.
+
+    # Arguments:
+        key: a string representing the key of an s3 object.
+
+    # Returns:
+        A string representing the name of the compression, or None if the object is not compressed.
+
+    # Raises:
+        ValueError: The object was compressed with a compression that is not installed.
+    """
+    if key.endswith(".zst") and "zstd" not in COMPRESSIONS:
+        raise ValueError(f"Object {key} is zstd compressed but zstandard is missing")
+
+    for name, (_, _, suffix, _) in COMPRESSIONS.items():
+        if key.endswith(suffix):
+            return name
+
+    return None
@@ -0,0 +1,94 @@
+"""
+Contains the utility functions that run independent, network-bound calls concurrently, such as reading several tables from s3, and tasks that depend on one another as soon as their dependencies allow.
+"""
+
+import graphlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def map_concurrently(function, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    This function calls a function once for each item, in up to max_workers threads at a time, so the total time approaches that of the slowest call rather than the sum.
+
+    # Arguments:
+        function: a function taking a single item.
+        items: an iterable of items, such as table names, which are used as dictionary keys.
+        max_workers: an integer representing the maximum number of calls running at the same time.
+
+    # Returns:
+        A dictionary mapping each item to the value the function returned for it, in the order of the items.
+
+    # Raises:
+        Exception: The error raised by the first item whose call failed, once every call has finished.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return {item: function(item) for item in items}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = {item: executor.submit(function, item) for item in items}
+
+    return {item: future.result() for item, future in futures.items()}
+
+
+def run_graph(tasks, dependencies=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    This function runs tasks that may depend on the results of other tasks, each as soon as the tasks it depends on have finished, in up to max_workers threads at a time, so the total time approaches that of the longest chain of dependent tasks rather than the sum.
+
+    # Arguments:
+        tasks: a dictionary mapping each task name to a function taking a dictionary of the results of the tasks it depends on, by task name.
+        dependencies: an optional dictionary mapping task names to lists of the names of the tasks they depend on. Tasks missing from it depend on no other task.
+        max_workers: an integer representing the maximum number of tasks running at the same time.
+
+    # Returns:
+        A dictionary mapping each task name to the value its function returned, in the order of the tasks.
+
+    # Raises:
+        ValueError: A task depends on a task that does not exist, or the dependencies form a cycle. No task is run.
+        Exception: The error raised by the first task that failed, once the tasks already running have finished. Tasks that had not started by then are not run.
+    """
+    dependencies = {name: list((dependencies or {}).get(name, [])) for name in tasks}
+    for name, needs in dependencies.items():
+        unknown = [need for need in needs if need not in tasks]
+        if unknown:
+            raise ValueError(f"Task {name} depends on unknown tasks {unknown}")
+
+    sorter = graphlib.TopologicalSorter(dependencies)
+    try:
+        sorter.prepare()
+    except graphlib.CycleError as e:
+        raise ValueError(f"Task dependencies form a cycle: {e.args[1]}")
+
+    results = {}
+    error = None
+
+    def run(name):
+        return tasks[name]({need: results[need] for need in dependencies[name]})
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(tasks)))
+    ) as executor:
+        running = {}
+        while sorter.is_active():
+            if error is None:
+                for name in sorter.get_ready():
+                    running[executor.submit(run, name)] = name
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                sorter.done(name)
+
+    if error is not None:
+        raise error
+
+    return {name: results[name] for name in tasks}
@@ -0,0 +1,180 @@
+"""
+Contains a pool that hands out reusable connections to a Postgres database, so connections survive between calls and across warm Lambda invocations.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from src.utils.db_connection import close_conn, create_conn, load_environment
+
+DEFAULT_MAX_IDLE = 8
+# invalid_authorization_specification and invalid_password.
+AUTH_FAILURE_CODES = ("28000", "28P01")
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of pg8000 connections. Connections are health-checked before being handed out and are replaced when broken or when the database credentials in the environment change. When the database rejects the credentials, refresh_credentials is called, if set, to update them before trying once more.
+    """
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, refresh_credentials=None):
+        """
+        # Arguments:
+            max_idle: an integer representing the maximum number of unused connections kept open.
+            refresh_credentials: an optional function that puts fresh database credentials into the environment.
+        """
+        self.max_idle = max_idle
+        self.refresh_credentials = refresh_credentials
+        self._idle = []
+        self._credentials = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Hands out a healthy connection, reusing an idle one where possible and opening a new one otherwise.
+
+        # Returns:
+            A pg8000 database Connection object.
+        """
+        load_environment()
+        credentials = current_credentials()
+
+        while True:
+            with self._lock:
+                if credentials != self._credentials:
+                    self._close_idle()
+                    self._credentials = credentials
+                conn = self._idle.pop() if self._idle else None
+
+            if conn is None:
+                return self._connect(credentials)
+            if is_healthy(conn):
+                return conn
+            discard_conn(conn)
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool so it can be reused, or closes it if the pool already holds enough idle connections.
+
+        # Arguments:
+            conn: a pg8000 Connection object previously handed out by acquire.
+
+        # Returns:
+            None.
+        """
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        discard_conn(conn)
+
+    def close_all(self):
+        """
+        Closes every idle connection held by the pool.
+
+        # Returns:
+            None.
+        """
+        with self._lock:
+            self._close_idle()
+
+    def _connect(self, credentials):
+        try:
+            return create_conn()
+        except Exception as e:
+            if self.refresh_credentials is None or not is_auth_failure(e):
+                raise
+
+        # Only the first thread to be rejected refreshes the credentials.
+        with self._refresh_lock:
+            if current_credentials() == credentials:
+                self.refresh_credentials()
+        return create_conn()
+
+    def _close_idle(self):
+        while self._idle:
+            discard_conn(self._idle.pop())
+
+
+def current_credentials():
+    """
+    This function reads the database credentials from environment variables.
+
+    # Returns:
+        A tuple of the user, database name, password and host.
+    """
+    return (
+        os.environ["DBUSER"],
+        os.environ["DBNAME"],
+        os.environ["DBPASSWORD"],
+        os.environ["HOST"],
+    )
+
+
+def is_auth_failure(error):
+    """
+    This function checks whether an error was raised because the database rejected the credentials.
+
+    # Arguments:
+        error: an exception raised while connecting to the database.
+
+    # Returns:
+        True if the error carries one of Postgres' invalid authorization SQLSTATE codes, otherwise False.
+    """
+    details = error.args[0] if error.args else None
+    return isinstance(details, dict) and details.get("C") in AUTH_FAILURE_CODES
+
+
+def is_healthy(conn):
+    """
+    This function checks that a connection can still run queries.
+
+    # Arguments:
+        conn: a pg8000 Connection object.
+
+    # Returns:
+        True if the connection answered a trivial query, otherwise False.
+    """
+    try:
+        conn.run("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
+def discard_conn(conn):
+    """
+    This function closes a connection, ignoring any error raised because the connection is already broken.
+
+    # Arguments:
+        conn: a pg8000 Connection object.
+
+    # Returns:
+        None.
+    """
+    try:
+        close_conn(conn)
+    except Exception:
+        pass
+
+
+pool = ConnectionPool()
+
+
+@contextmanager
+def pooled_conn():
+    """
+    This function lends out a connection from the module-level pool for the duration of a with block. The connection goes back to the pool afterwards, unless the block raised, in which case it is closed so that no half-finished transaction is reused.
+
+    # Yields:
+        A pg8000 database Connection object.
+    """
+    conn = pool.acquire()
+    try:
+        yield conn
+    except BaseException:
+        discard_conn(conn)
+        raise
+    pool.release(conn)
@@ -0,0 +1,110 @@
+"""
+Contains the utility functions that fetch database credentials from AWS Secrets Manager through the Lambda extension and make them available to database connections.
+
+Secrets are cached at module level, so warm Lambda invocations reuse them for up to their ttl instead of calling the extension every time. When the database rejects the cached credentials, for example after the secret was rotated, the connection pool fetches the secret again and retries once.
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+
+from src.utils.connection_pool import pool
+
+SECRETS_EXTENSION_URL = "http://localhost:2773/secretsmanager/get?secretId={}"
+DEFAULT_SECRET_TTL = 300
+DEFAULT_SECRET_TIMEOUT = 2
+
+# Maps each secret id to the time it expires and its value.
+SECRET_CACHE = {}
+secret_lock = threading.Lock()
+
+
+def fetch_secret(secret_id, timeout=DEFAULT_SECRET_TIMEOUT):
+    """
+    This function fetches a secret from the AWS Parameters and Secrets Lambda extension.
+
+    # Arguments:
+        secret_id: a string representing the name or arn of the secret.
+        timeout: a number representing how many seconds to wait for the extension before giving up.
+
+    # Returns:
+        A dictionary holding the parsed SecretString of the secret.
+
+    # Raises:
+        RuntimeError: An error occurred while fetching or parsing the secret.
+    """
+    try:
+        response = requests.get(
+            SECRETS_EXTENSION_URL.format(secret_id),
+            headers={
+                "X-Aws-Parameters-Secrets-Token": os.environ.get("AWS_SESSION_TOKEN")
+            },
+            timeout=timeout,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"status code {response.status_code}")
+        return json.loads(json.loads(response.text)["SecretString"])
+    except Exception as e:
+        raise RuntimeError(f"Fetching secret failed: {e}")
+
+
+def get_secret(
+    secret_id, ttl=DEFAULT_SECRET_TTL, timeout=DEFAULT_SECRET_TIMEOUT, refresh=False
+):
+    """
+    This function returns a secret, reusing the value fetched by an earlier call for ttl seconds.
+
+    # Arguments:
+        secret_id: a string representing the name or arn of the secret.
+        ttl: a number representing how many seconds a fetched secret is reused for.
+        timeout: a number representing how many seconds to wait for the extension before giving up.
+        refresh: a boolean, when True the secret is fetched again even if a cached value has not expired.
+
+    # Returns:
+        A dictionary holding the parsed SecretString of the secret.
+
+    # Raises:
+        RuntimeError: An error occurred while fetching or parsing the secret.
+    """
+    with secret_lock:
+        cached = SECRET_CACHE.get(secret_id)
+        if not refresh and cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        secret = fetch_secret(secret_id, timeout)
+        SECRET_CACHE[secret_id] = (time.monotonic() + ttl, secret)
+        return secret
+
+
+def use_db_credentials(
+    secret_id, ttl=DEFAULT_SECRET_TTL, timeout=DEFAULT_SECRET_TIMEOUT, refresh=False
+):
+    """
+    This function puts the database credentials held in a secret into the environment variables read by create_conn, and lets the connection pool fetch the secret again when the database rejects them.
+
+    # Arguments:
+        secret_id: a string representing the name or arn of a secret with user, database, password, port and host keys.
+        ttl: a number representing how many seconds a fetched secret is reused for.
+        timeout: a number representing how many seconds to wait for the extension before giving up.
+        refresh: a boolean, when True the secret is fetched again even if a cached value has not expired.
+
+    # Returns:
+        None.
+
+    # Raises:
+        RuntimeError: An error occurred while fetching or parsing the secret.
+    """
+    secret = get_secret(secret_id, ttl, timeout, refresh)
+
+    os.environ["DBUSER"] = secret["user"]
+    os.environ["DBNAME"] = secret["database"]
+    os.environ["DBPASSWORD"] = secret["password"]
+    os.environ["PORT"] = secret["port"]
+    os.environ["HOST"] = secret["host"]
+
+    pool.refresh_credentials = lambda: use_db_credentials(
+        secret_id, ttl, timeout, refresh=True
+    )
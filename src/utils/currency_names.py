@@ -0,0 +1,87 @@
+"""
+Contains the utility functions that look up the names of currencies from their ISO 4217 codes.
+
+The currency_codes package scans its whole list of currencies on every lookup, so the list is read once, on first use, into a dictionary mapping each code to its name. A column of codes is then named with a single vectorised map, and only codes missing from the dictionary fall back to a slower, cached lookup.
+"""
+
+import functools
+
+# What to do with a code that names no currency: raise an error, leave the
+# name null, or use the code itself as the name.
+UNKNOWN_CURRENCY_POLICIES = ("raise", "null", "code")
+
+
+@functools.cache
+def currency_names():
+    """
+    This function builds the mapping from currency codes to currency names. The currency_codes package is only imported, and its list only read, the first time the mapping is asked for.
+
+    # Returns:
+        A dictionary mapping each upper case currency code to the name of its currency.
+    """
+    from currency_codes import get_all_currencies
+
+    names = {}
+    for currency in get_all_currencies():
+        # Some historic currencies have no code. Where a code appears more than
+        # once the first entry wins, as it does in get_currency_by_code.
+        if currency.code:
+            names.setdefault(currency.code, currency.name)
+
+    return names
+
+
+@functools.lru_cache(maxsize=256)
+def lookup_currency_name(code):
+    """
+    This function looks up the name of a currency whose code is not written exactly as in the mapping, such as in lower case or with surrounding spaces.
+
+    # Arguments:
+        code: the currency code as it appears in the data.
+
+    # Returns:
+        A string representing the name of the currency, or None if the code names no currency.
+    """
+    if not isinstance(code, str):
+        return None
+
+    return currency_names().get(code.strip().upper())
+
+
+def name_currencies(codes, unknown="raise"):
+    """
+    This function looks up the name of the currency of each code in a column.
+
+    # Arguments:
+        codes: a pandas Series of currency codes. Null codes are given null names.
+        unknown: a string representing what to do with codes that name no currency, one of "raise", "null" or "code". Defaults to "raise".
+
+    # Returns:
+        A pandas Series named currency_name with the same index as the codes, holding None where there is no name.
+
+    # Raises:
+        ValueError: The policy for unknown codes is not one of those listed.
+        RuntimeError: Some codes name no currency and the policy is "raise".
+    """
+    if unknown not in UNKNOWN_CURRENCY_POLICIES:
+        raise ValueError(
+            f"Unknown currency policy must be one of {UNKNOWN_CURRENCY_POLICIES}, "
+            f"not {unknown!r}"
+        )
+
+    names = codes.map(currency_names()).rename("currency_name")
+
+    missing = names.isna() & codes.notna()
+    if missing.any():
+        names[missing] = codes[missing].map(lookup_currency_name)
+
+        unknown_codes = codes[names.isna() & codes.notna()]
+        if len(unknown_codes) and unknown == "raise":
+            raise RuntimeError(
+                "Lookup of currency names failed: unknown codes "
+                f"{', '.join(sorted(map(str, unknown_codes.unique())))}"
+            )
+        if unknown == "code":
+            names = names.fillna(codes)
+
+    return names.astype(object).where(names.notna(), None)
@@ -0,0 +1,96 @@
+"""
+Contains the utility functions that build rows of the dim_date table and keep track of the dates already loaded into the warehouse.
+
+The dates loaded into dim_date are recorded in the processed bucket at _loaded/dim_date_dates.json by the load stage, so the transform stage can emit only dates the warehouse does not hold yet. A fixed calendar range can also be generated once, after which dim_date only changes when a sale falls outside it.
+"""
+
+import functools
+import json
+from datetime import date
+
+import pandas as pd
+
+LOADED_DATES_KEY = "_loaded/dim_date_dates.json"
+
+
+def build_calendar(dates):
+    """
+    This function builds dim_date rows for the given dates. The dates are converted once and every attribute is derived from the conversion in a vectorised pass.
+
+    # Arguments:
+        dates: an iterable of datetime.date objects, which should not repeat.
+
+    # Returns:
+        A dataframe with the date_id, year, month, day, day_of_week, day_name, month_name and quarter of each date, in the order the dates were given.
+    """
+    date_ids = pd.Series(list(dates), dtype=object, name="date_id")
+    timestamps = pd.to_datetime(date_ids).dt
+
+    df = date_ids.to_frame()
+    df["year"] = timestamps.year
+    df["month"] = timestamps.month
+    df["day"] = timestamps.day
+    df["day_of_week"] = timestamps.day_of_week
+    df["day_name"] = timestamps.day_name()
+    df["month_name"] = timestamps.month_name()
+    df["quarter"] = timestamps.quarter
+
+    return df
+
+
+@functools.cache
+def calendar_dates(start, end):
+    """
+    This function lists every date in a calendar range. The result is kept, so a warm invocation does not generate the same range again.
+
+    # Arguments:
+        start: a string representing the first date of the range, as "YYYY-MM-DD".
+        end: a string representing the last date of the range, as "YYYY-MM-DD".
+
+    # Returns:
+        A tuple of datetime.date objects.
+    """
+    return tuple(pd.date_range(start, end, freq="D").date)
+
+
+def read_loaded_dates(client, bucket_name):
+    """
+    This function reads the dates recorded as loaded into the warehouse's dim_date table.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the processed s3 bucket.
+
+    # Returns:
+        A set of datetime.date objects, which is empty if no dates have been recorded yet.
+    """
+    try:
+        response = client.get_object(Bucket=bucket_name, Key=LOADED_DATES_KEY)
+    except client.exceptions.NoSuchKey:
+        return set()
+
+    state = json.loads(response["Body"].read().decode("utf-8"))
+    return {date.fromisoformat(date_id) for date_id in state["dates"]}
+
+
+def record_loaded_dates(client, bucket_name, dates):
+    """
+    This function adds dates to those recorded as loaded into the warehouse's dim_date table.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the processed s3 bucket.
+        dates: an iterable of datetime.date objects that have just been loaded.
+
+    # Returns:
+        None.
+    """
+    loaded_dates = read_loaded_dates(client, bucket_name).union(dates)
+    state = {"dates": sorted(date_id.isoformat() for date_id in loaded_dates)}
+
+    client.put_object(
+        Bucket=bucket_name,
+        Key=LOADED_DATES_KEY,
+        Body=json.dumps(state),
+        ContentType="application/json",
+    )
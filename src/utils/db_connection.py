@@ -3,11 +3,23 @@ Contains the utility functions for opening and closing connections to a Postgres
 """
 
 import os
+from functools import cache
 
 import dotenv
 from pg8000.native import Connection
 
 
+@cache
+def load_environment():
+    """
+    This function loads variables from a .env file into the environment. It only reads the file the first time it is called.
+
+    # Returns:
+        None.
+    """
+    dotenv.load_dotenv()
+
+
 def create_conn():
     """
     This function creates a connection to a PostgreSQL database using credentials from environment variables.
@@ -15,7 +27,7 @@ def create_conn():
     # Returns:
         A pg8000 database Connection object.
     """
-    dotenv.load_dotenv()
+    load_environment()
 
     user = os.environ["DBUSER"]
     database = os.environ["DBNAME"]
@@ -2,25 +2,25 @@
 Contains the utility function that handles conversion of Python objects to JSON-compatible types.
 """
 
-from datetime import datetime
+from datetime import date, time
 from decimal import Decimal
 
 
 def default_serialiser(obj):
     """
-    This function is a custom serialiser function that converts datetime objects into a ISO 8601 string and Decimal objects into floats.
+    This function is a custom serialiser function that converts datetime, date and time objects into a ISO 8601 string and Decimal objects into floats.
 
     # Arguments:
-        obj: A datetime or Decimal object.
+        obj: A datetime, date, time or Decimal object.
 
     # Returns:
-        An ISO 8601 formatted string, if obj is type datetime.
+        An ISO 8601 formatted string, if obj is type datetime, date or time.
         A float, if obj is type Decimal.
 
     # Raises:
         TypeError: If the object type is not supported for serialisation.
     """
-    if isinstance(obj, datetime):
+    if isinstance(obj, (date, time)):
         return obj.isoformat()
     if isinstance(obj, Decimal):
         return float(obj)
@@ -0,0 +1,66 @@
+"""
+Contains the utility functions that fingerprint table data, so each stage of the pipeline can tell whether a table has changed since it last processed it.
+"""
+
+import hashlib
+
+
+def fingerprint(data):
+    """
+    This function computes a fingerprint of serialised data. Identical data always has the same fingerprint, and any change to it gives a different one.
+
+    # Arguments:
+        data: a string or bytes object, such as the json a table was converted to.
+
+    # Returns:
+        A string representing the SHA-256 digest of the data in hexadecimal.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint_chunks(chunks, digest):
+    """
+    This function passes a stream of data through unchanged while adding it to a digest, so data can be fingerprinted without being held in memory. Once the stream is exhausted, digest.hexdigest() is the same as the fingerprint of all the data.
+
+    # Arguments:
+        chunks: an iterable of bytes objects.
+        digest: a hash object returned by new_digest, which is updated in place.
+
+    # Yields:
+        The chunks, unchanged.
+    """
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def new_digest():
+    """
+    This function returns an empty hash object of the kind fingerprint uses, for use with fingerprint_chunks.
+
+    # Returns:
+        A hashlib hash object.
+    """
+    return hashlib.sha256()
+
+
+def combine_fingerprints(fingerprints):
+    """
+    This function combines the fingerprints of several named pieces of data into one, which changes whenever any of them does.
+
+    # Arguments:
+        fingerprints: a dictionary mapping names to fingerprints.
+
+    # Returns:
+        A string representing the combined fingerprint, or None if any of the fingerprints is missing.
+    """
+    if any(value is None for value in fingerprints.values()):
+        return None
+
+    combined = "\n".join(
+        f"{name}:{fingerprints[name]}" for name in sorted(fingerprints)
+    )
+    return fingerprint(combined)
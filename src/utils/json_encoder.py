@@ -0,0 +1,73 @@
+"""
+Contains the utility functions that serialise rows of table data into json.
+
+Two encoders are available: orjson, which serialises datetime, date and time values natively and is used when it is installed, and the standard library json module, which calls back into default_serialiser for every such value. The JSON_ENCODER environment variable can name the encoder to use.
+
+Both give the same json for strings, integers, dates and times, and for floats written without an exponent. Floats written with an exponent differ, such as 1e-07 from the standard library and 1e-7 from orjson, and the exact forms vary between orjson versions. Ingestion fingerprints are hashes of this json, so switching encoders, or upgrading orjson, makes tables holding such floats look changed and uploads them once more.
+"""
+
+import json
+import os
+
+from src.utils.default_serialiser import default_serialiser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_with_stdlib(data):
+    """
+    This function serialises data into compact json with the standard library json module, using default_serialiser for the values it does not support.
+
+    # Arguments:
+        data: a json-serialisable object, such as a list of dictionaries representing table rows.
+
+    # Returns:
+        A bytes object holding the json, encoded as UTF-8.
+    """
+    return json.dumps(
+        data, default=default_serialiser, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_with_orjson(data):
+    """
+    This function serialises data into compact json with orjson. Datetime, date and time values are serialised natively, and only Decimal values call back into default_serialiser.
+
+    # Arguments:
+        data: a json-serialisable object, such as a list of dictionaries representing table rows.
+
+    # Returns:
+        A bytes object holding the json, encoded as UTF-8.
+    """
+    return orjson.dumps(data, default=default_serialiser)
+
+
+JSON_ENCODERS = {"stdlib": encode_with_stdlib}
+if orjson is not None:
+    JSON_ENCODERS["orjson"] = encode_with_orjson
+
+
+def get_json_encoder(name=None):
+    """
+    This function returns the encoder with the given name, or the one named by the JSON_ENCODER environment variable. Without either, the fastest encoder installed is returned.
+
+    # Arguments:
+        name: an optional string, either "orjson" or "stdlib".
+
+    # Returns:
+        A function that takes a json-serialisable object and returns its json as bytes.
+
+    # Raises:
+        ValueError: The named encoder does not exist or is not installed.
+    """
+    name = name or os.environ.get("JSON_ENCODER")
+    if name is None:
+        return JSON_ENCODERS.get("orjson", encode_with_stdlib)
+
+    if name not in JSON_ENCODERS:
+        raise ValueError(f"JSON encoder {name} is not available")
+
+    return JSON_ENCODERS[name]
@@ -0,0 +1,142 @@
+"""
+Contains the utility functions that keep track of the most recent object uploaded for each table in an s3 bucket.
+
+Each upload is followed by a small pointer object at _latest/<table_name>.json naming the uploaded key, so consumers can find the latest object with a single read instead of listing the whole table prefix.
+"""
+
+import json
+from datetime import datetime, timezone
+
+LATEST_PREFIX = "_latest"
+
+
+def write_latest_pointer(client, bucket_name, table_name, key, details=None):
+    """
+    This function records the given key as the most recent object for a table.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the s3 bucket holding the object.
+        table_name: a string representing the table the object belongs to.
+        key: a string representing the key of the most recent object for the table.
+        details: an optional dictionary of further information to store in the pointer.
+
+    # Returns:
+        None.
+    """
+    pointer = {
+        "table_name": table_name,
+        "key": key,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        **(details or {}),
+    }
+    client.put_object(
+        Bucket=bucket_name,
+        Key=f"{LATEST_PREFIX}/{table_name}.json",
+        Body=json.dumps(pointer),
+        ContentType="application/json",
+    )
+
+
+def read_latest_pointer(client, bucket_name, table_name):
+    """
+    This function reads the pointer to the most recent object for a table.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the s3 bucket holding the pointer.
+        table_name: a string representing the table whose pointer we want.
+
+    # Returns:
+        A dictionary with at least a "key" entry, or None if no pointer has been written for the table.
+    """
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{LATEST_PREFIX}/{table_name}.json"
+        )
+    except client.exceptions.NoSuchKey:
+        return None
+
+    return json.loads(response["Body"].read().decode("utf-8"))
+
+
+def list_latest_key(client, bucket_name, table_name):
+    """
+    This function finds the most recent object for a table by listing every page of the table's prefix. Keys are timestamped, so the greatest key is the most recent. Only keys continuing with "/" or "-" after the table name count, so that e.g. dim_date does not match dim_date_x.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the s3 bucket to list.
+        table_name: a string representing the table whose objects we want.
+
+    # Returns:
+        A string representing the key of the most recent object for the table.
+
+    # Raises:
+        RuntimeError: No object was found for the table.
+    """
+    latest_key = None
+
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=table_name):
+        for item in page.get("Contents", []):
+            key = item["Key"]
+            if key[len(table_name) : len(table_name) + 1] not in ("/", "-"):
+                continue
+            if latest_key is None or key > latest_key:
+                latest_key = key
+
+    if latest_key is None:
+        raise RuntimeError(f"No objects found for table {table_name}")
+
+    return latest_key
+
+
+def list_keys_after(client, bucket_name, table_name, after_key=None):
+    """
+    This function lists the objects for a table that are more recent than a given object. Keys are timestamped, so s3 can start listing straight after the given key, and the time taken depends on the number of newer objects rather than on every object for the table.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the s3 bucket to list.
+        table_name: a string representing the table whose objects we want.
+        after_key: an optional string representing the key of the object to list after. Defaults to listing every object for the table.
+
+    # Returns:
+        A list of strings representing the keys of the newer objects, from the oldest to the most recent.
+    """
+    options = {"Bucket": bucket_name, "Prefix": table_name}
+    if after_key is not None:
+        options["StartAfter"] = after_key
+
+    keys = []
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(**options):
+        for item in page.get("Contents", []):
+            key = item["Key"]
+            if key[len(table_name) : len(table_name) + 1] in ("/", "-"):
+                keys.append(key)
+
+    return sorted(keys)
+
+
+def find_latest_key(client, bucket_name, table_name):
+    """
+    This function returns the key of the most recent object for a table, reading its pointer where there is one and listing the table's prefix otherwise.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        bucket_name: a string representing the name of the s3 bucket holding the objects.
+        table_name: a string representing the table whose objects we want.
+
+    # Returns:
+        A string representing the key of the most recent object for the table.
+
+    # Raises:
+        RuntimeError: No object was found for the table.
+    """
+    pointer = read_latest_pointer(client, bucket_name, table_name)
+    if pointer is not None:
+        return pointer["key"]
+
+    return list_latest_key(client, bucket_name, table_name)
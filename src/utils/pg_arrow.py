@@ -0,0 +1,175 @@
+"""
+Contains the utility functions that turn rows fetched with pg8000 into typed Arrow record batches and Parquet, using the column types Postgres reports for a query, and that move dataframes in and out of Parquet held in memory.
+"""
+
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Postgres type OIDs, as found in the type_oid of pg8000's Connection.columns.
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1042: pa.string(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1083: pa.time64("us"),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+NUMERIC_OID = 1700
+# pg8000 returns json and jsonb values already parsed, so they are written back
+# out as json text rather than as Python reprs.
+JSON_OIDS = {114, 3802}
+JSON_METADATA = {"postgres_type": "json"}
+# The largest precisions Arrow's decimal types can hold.
+DECIMAL128_MAX_PRECISION = 38
+DECIMAL256_MAX_PRECISION = 76
+
+# The pandas nullable types used for Arrow columns by read_parquet(nullable=True),
+# so that columns with missing values keep their type instead of becoming floats.
+PANDAS_NULLABLE_TYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.uint8(): pd.UInt8Dtype(),
+    pa.uint16(): pd.UInt16Dtype(),
+    pa.uint32(): pd.UInt32Dtype(),
+    pa.uint64(): pd.UInt64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+    pa.string(): pd.StringDtype(),
+    pa.large_string(): pd.StringDtype(),
+}
+
+
+def arrow_type_for_column(column):
+    """
+    This function works out the Arrow type for a column of a query result. Numeric columns keep their declared precision and scale, in a 256-bit decimal when they are too precise for a 128-bit one. Numeric columns declared without a precision, or with one too large for any Arrow decimal, can hold any number and are stored as strings, as are columns of types without an Arrow equivalent.
+
+    # Arguments:
+        column: a dictionary describing the column, as found in pg8000's Connection.columns.
+
+    # Returns:
+        A pyarrow DataType.
+    """
+    if column["type_oid"] == NUMERIC_OID:
+        modifier = column["type_modifier"]
+        if modifier < 4:
+            return pa.string()
+        precision = (modifier - 4) >> 16
+        scale = (modifier - 4) & 0xFFFF
+        if precision <= DECIMAL128_MAX_PRECISION:
+            return pa.decimal128(precision, scale)
+        if precision <= DECIMAL256_MAX_PRECISION:
+            return pa.decimal256(precision, scale)
+        return pa.string()
+
+    return PG_ARROW_TYPES.get(column["type_oid"], pa.string())
+
+
+def arrow_schema(columns):
+    """
+    This function builds the Arrow schema for a query result. json and jsonb columns are stored as strings, and marked as json in their field metadata.
+
+    # Arguments:
+        columns: a list of dictionaries describing the columns, as found in pg8000's Connection.columns.
+
+    # Returns:
+        A pyarrow Schema with one nullable field per column.
+    """
+    return pa.schema(
+        [
+            pa.field(
+                column["name"],
+                arrow_type_for_column(column),
+                metadata=JSON_METADATA if column["type_oid"] in JSON_OIDS else None,
+            )
+            for column in columns
+        ]
+    )
+
+
+def rows_to_record_batch(rows, schema):
+    """
+    This function converts rows fetched with pg8000 into a record batch, one column at a time, without building a dictionary for each row. Values of json columns are written as json text, and values of other types without an Arrow equivalent as their string form.
+
+    # Arguments:
+        rows: a list of lists, each holding the values of one row in column order.
+        schema: a pyarrow Schema returned by arrow_schema for the query the rows came from.
+
+    # Returns:
+        A pyarrow RecordBatch.
+    """
+    values_by_column = list(zip(*rows)) or [() for _ in schema]
+
+    arrays = []
+    for field, values in zip(schema, values_by_column):
+        if field.metadata and field.metadata.get(b"postgres_type") == b"json":
+            values = [value if value is None else json.dumps(value) for value in values]
+        elif pa.types.is_string(field.type):
+            values = [value if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(record_batches, schema, compression="snappy"):
+    """
+    This function writes record batches into a Parquet file held in memory, one row group per batch.
+
+    # Arguments:
+        record_batches: an iterable of pyarrow RecordBatch objects sharing the given schema.
+        schema: the pyarrow Schema of the batches, which is used even if there are no batches.
+        compression: a string representing the compression codec used inside the Parquet file, such as "snappy", "gzip" or "zstd".
+
+    # Returns:
+        A bytes object holding the Parquet file.
+    """
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, schema, compression=compression) as writer:
+        for record_batch in record_batches:
+            writer.write_batch(record_batch)
+
+    return buffer.getvalue()
+
+
+def dataframe_to_parquet(dataframe, compression="snappy"):
+    """
+    This function writes a dataframe into a Parquet file held in memory, without its index.
+
+    # Arguments:
+        dataframe: a pandas DataFrame.
+        compression: a string representing the compression codec used inside the Parquet file, such as "snappy", "gzip" or "zstd".
+
+    # Returns:
+        A bytes object holding the Parquet file.
+    """
+    buffer = io.BytesIO()
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    pq.write_table(table, buffer, compression=compression)
+
+    return buffer.getvalue()
+
+
+def read_parquet(data, nullable=False):
+    """
+    This function reads a Parquet file held in memory into a dataframe, keeping the types stored in the file.
+
+    # Arguments:
+        data: a bytes object holding the Parquet file.
+        nullable: a boolean, when True integer, boolean and string columns use the pandas nullable types.
+
+    # Returns:
+        A pandas DataFrame.
+    """
+    types_mapper = PANDAS_NULLABLE_TYPES.get if nullable else None
+    return pq.read_table(pa.BufferReader(data)).to_pandas(types_mapper=types_mapper)
@@ -0,0 +1,134 @@
+"""
+Contains the utility function that uploads a stream of bytes to s3 without holding the whole object in memory.
+
+Data smaller than one part is uploaded with a single put_object. Anything larger is sent as a multipart upload whose parts are uploaded concurrently while the rest of the stream is still being produced, so at most a few parts are held in memory at once. A multipart upload that fails is aborted so no parts are left behind.
+
+When the caller only decides whether to keep the object once the whole stream has been read, the stream is first spooled to a temporary file, which stays in memory up to one part and spills to disk beyond that. Nothing is sent to s3 until the decision is made, so an object that is not kept costs no requests.
+"""
+
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# s3 rejects parts smaller than 5 MiB, other than the last part of an upload.
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def upload_stream(
+    client,
+    chunks,
+    bucket_name,
+    key,
+    part_size=DEFAULT_PART_SIZE,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    should_complete=None,
+    **put_args,
+):
+    """
+    This function uploads an iterable of byte chunks to s3 as one object, using a multipart upload with concurrent part uploads once the data outgrows a single part.
+
+    # Arguments:
+        client: a boto3 s3 client.
+        chunks: an iterable of bytes objects which together make up the object.
+        bucket_name: a string representing the name of the s3 bucket to upload to.
+        key: a string representing the key to upload to.
+        part_size: an integer representing the size in bytes of each part of a multipart upload, at least 5 MiB.
+        max_concurrency: an integer representing the maximum number of parts uploaded at the same time.
+        should_complete: an optional function called once the stream is exhausted and before anything is uploaded. When it returns False, nothing is sent to s3.
+        put_args: further arguments for the object, such as ContentType or ContentEncoding.
+
+    # Returns:
+        True if the object was created, False if should_complete prevented it.
+
+    # Raises:
+        ValueError: The part size is smaller than s3 allows.
+    """
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"Part size must be at least {MIN_PART_SIZE} bytes")
+
+    if should_complete is not None:
+        with tempfile.SpooledTemporaryFile(max_size=part_size) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            if not should_complete():
+                return False
+
+            spool.seek(0)
+            return upload_stream(
+                client,
+                iter(lambda: spool.read(part_size), b""),
+                bucket_name,
+                key,
+                part_size=part_size,
+                max_concurrency=max_concurrency,
+                **put_args,
+            )
+
+    buffer = bytearray()
+    upload_id = None
+    executor = None
+    pending = set()
+    futures = []
+
+    def upload_part(part_number, body):
+        response = client.upload_part(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def submit_part(body):
+        nonlocal pending
+        if len(pending) >= max_concurrency:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        future = executor.submit(upload_part, len(futures) + 1, body)
+        futures.append(future)
+        pending.add(future)
+
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= part_size:
+                if upload_id is None:
+                    upload_id = client.create_multipart_upload(
+                        Bucket=bucket_name, Key=key, **put_args
+                    )["UploadId"]
+                    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+                submit_part(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+
+        if upload_id is None:
+            client.put_object(
+                Bucket=bucket_name, Key=key, Body=bytes(buffer), **put_args
+            )
+            return True
+
+        if buffer:
+            submit_part(bytes(buffer))
+        parts = [future.result() for future in futures]
+
+        client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        return True
+
+    except BaseException:
+        if upload_id is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            client.abort_multipart_upload(
+                Bucket=bucket_name, Key=key, UploadId=upload_id
+            )
+        raise
+
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
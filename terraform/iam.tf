@@ -28,6 +28,34 @@ data "aws_iam_policy_document" "ingestion_s3_document" {
 
     ]
   }
+  # A multipart upload that fails part way is aborted, so its parts are not kept.
+  statement {
+    actions = ["s3:AbortMultipartUpload"]
+    resources = [
+      "${aws_s3_bucket.ingestion-bucket.arn}/*"
+    ]
+  }
+  # Incremental ingestion reads back the watermark stored by the previous run.
+  statement {
+    actions = ["s3:GetObject"]
+    resources = [
+      "${aws_s3_bucket.ingestion-bucket.arn}/_watermarks/*"
+    ]
+  }
+  # The fingerprint of each table's previous upload is kept in its pointer.
+  statement {
+    actions = ["s3:GetObject"]
+    resources = [
+      "${aws_s3_bucket.ingestion-bucket.arn}/_latest/*"
+    ]
+  }
+  # Without ListBucket a missing object is reported as 403 rather than NoSuchKey.
+  statement {
+    actions = ["s3:ListBucket"]
+    resources = [
+      "${aws_s3_bucket.ingestion-bucket.arn}"
+    ]
+  }
   statement {
     actions = ["s3:GetObject"]
     resources = ["${aws_s3_bucket.code-bucket.arn}/*"
@@ -125,6 +153,34 @@ data "aws_iam_policy_document" "transform_s3_document" {
       "${aws_s3_bucket.ingestion-bucket.arn}"
     ]
   }
+  # The pointers to the previous transformed objects hold their fingerprints.
+  statement {
+    actions = ["s3:GetObject"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}/_latest/*"
+    ]
+  }
+  # Incremental transformation continues from the checkpoint of the previous run.
+  statement {
+    actions = ["s3:GetObject"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}/_checkpoints/*"
+    ]
+  }
+  # dim_date leaves out the dates the load stage has recorded as loaded.
+  statement {
+    actions = ["s3:GetObject"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}/_loaded/dim_date_dates.json"
+    ]
+  }
+  # Without ListBucket a missing object is reported as 403 rather than NoSuchKey.
+  statement {
+    actions = ["s3:ListBucket"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}"
+    ]
+  }
 }
 
 data "aws_iam_policy_document" "transform_cw_document" {
@@ -274,6 +330,21 @@ data "aws_iam_policy_document" "load_s3_document" {
       "${aws_s3_bucket.processed-bucket.arn}"
     ]
   }
+  # The fingerprint of each table, and the dates in dim_date, are recorded once
+  # they have been loaded.
+  statement {
+    actions = ["s3:PutObject"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}/_loaded/*"
+    ]
+  }
+  # The incremental transformation moves on from the rows once they are loaded.
+  statement {
+    actions = ["s3:PutObject"]
+    resources = [
+      "${aws_s3_bucket.processed-bucket.arn}/_checkpoints/*"
+    ]
+  }
   statement {
     actions   = ["secretsmanager:GetSecretValue"]
     resources = ["arn:aws:secretsmanager:eu-west-2:389125938424:secret:datawarehouse-zhlI93"]
@@ -1,3 +1,9 @@
+locals {
+  # Incremental ingestion stores only the rows changed since the previous run,
+  # and the transform stage must then combine every object since its checkpoint.
+  incremental_ingestion = "false"
+}
+
 resource "aws_lambda_function" "ingestion_lambda" {
 
   count         = var.deploy_lambda_bool ? 1 : 0
@@ -10,10 +16,19 @@ resource "aws_lambda_function" "ingestion_lambda" {
   timeout       = 30
   runtime       = "python3.13"
 
+  # Snapshots are spooled to /tmp until their fingerprint is known, so this
+  # bounds the largest table that can be ingested, after compression.
+  ephemeral_storage {
+    size = 2048
+  }
+
   environment {
     variables = {
       INGESTION_BUCKET_NAME = aws_s3_bucket.ingestion-bucket.bucket
       STEP_MACHINE_ARN      = aws_sfn_state_machine.totesys_state_machine.arn
+      INCREMENTAL_INGESTION = local.incremental_ingestion
+      INGESTION_FORMAT      = "json"
+      INGESTION_COMPRESSION = "gzip"
     }
   }
 }
@@ -36,6 +51,8 @@ resource "aws_lambda_function" "transform_lambda" {
     variables = {
       TRANSFORM_BUCKET_NAME = aws_s3_bucket.processed-bucket.bucket
       INGESTION_BUCKET_NAME = aws_s3_bucket.ingestion-bucket.bucket
+      INCREMENTAL_INGESTION = local.incremental_ingestion
+      INCREMENTAL_TRANSFORM = local.incremental_ingestion
     }
   }
 }
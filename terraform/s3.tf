@@ -22,6 +22,20 @@ resource "aws_s3_bucket_object_lock_configuration" "ingestion_bucket_lock" {
   }
 }
 
+# Parts of multipart uploads that could not be aborted, such as when the lambda
+# times out, are removed after a day.
+resource "aws_s3_bucket_lifecycle_configuration" "ingestion_lifecycle" {
+  bucket = aws_s3_bucket.ingestion-bucket.id
+  rule {
+    id     = "abort-incomplete-multipart-uploads"
+    status = "Enabled"
+    filter {}
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
+
 resource "aws_s3_bucket" "processed-bucket" {
   bucket_prefix       = "bucket-two-processed"
   object_lock_enabled = true
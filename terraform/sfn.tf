@@ -5,15 +5,25 @@ resource "aws_sfn_state_machine" "totesys_state_machine" {
   definition = <<EOF
 {
   "Comment": "The state machine for the totesys project",
-  "StartAt": "Lambda Ingest",
+  "StartAt": "Check Manifest",
   "States": {
+    "Check Manifest": {
+      "Type": "Choice",
+      "Choices": [
+        {
+          "Condition": "{% $exists($states.input.manifest) %}",
+          "Next": "Lambda Transform"
+        }
+      ],
+      "Default": "Lambda Ingest"
+    },
     "Lambda Ingest": {
       "Type": "Task",
       "Resource": "arn:aws:states:::lambda:invoke",
       "Output": "{% $states.result.Payload %}",
       "Arguments": {
         "FunctionName": "arn:aws:lambda:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:function:ingestion_lambda:$LATEST",
-        "Payload": "{% $states.input %}"
+        "Payload": "{% $merge([$states.input, {'state_machine': true}]) %}"
       },
       "Retry": [
         {
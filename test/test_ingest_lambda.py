@@ -8,6 +8,7 @@ import pytest
 from moto import mock_aws
 
 from src.ingestion.ingest_lambda import lambda_handler
+from src.utils.credentials import SECRET_CACHE
 
 
 @pytest.fixture(autouse=True)
@@ -15,6 +16,11 @@ def db_credentials():
     dotenv.load_dotenv()
 
 
+@pytest.fixture(autouse=True)
+def empty_secret_cache():
+    SECRET_CACHE.clear()
+
+
 @pytest.fixture
 def test_mock_credentials():
     os.environ["AWS_ACCESS_KEY_ID"] = "mock_access_key"
@@ -39,7 +45,7 @@ def step_client(test_mock_credentials):
         yield boto3.client("stepfunctions", region_name="eu-west-2")
 
 
-@patch("src.ingestion.ingest_lambda.requests")
+@patch("src.utils.credentials.requests")
 def test_successful_request_returns_status_code_200(mock_request, client, step_client):
     step_client.create_state_machine(
         name="step-machine",
@@ -65,13 +71,13 @@ def test_successful_request_returns_status_code_200(mock_request, client, step_c
     }
     mock_text = json.dumps(mock_body)
     mock_request.get().text = mock_text
-    assert lambda_handler({}, {}) == {
-            "statusCode": 200,
-            "body": json.dumps({"message": "Data successfully extracted"}),
-        }
+    response = lambda_handler({}, {})
 
+    assert response["statusCode"] == 200
+    assert response["body"] == json.dumps({"message": "Data successfully extracted"})
 
-@patch("src.ingestion.ingest_lambda.requests")
+
+@patch("src.utils.credentials.requests")
 def test_all_data_successfully_put_inside_bucket(mock_request, client, step_client):
     step_client.create_state_machine(
         name="step-machine",
@@ -99,11 +105,115 @@ def test_all_data_successfully_put_inside_bucket(mock_request, client, step_clie
     mock_request.get().text = mock_text
     lambda_handler({}, {})
     contents = client.list_objects_v2(Bucket="ingestion-bucket")
+    keys = [item["Key"] for item in contents["Contents"]]
+    table_keys = [key for key in keys if not key.startswith("_latest/")]
+
+    assert len(table_keys) == 7  # Number should match amount of table names
+
+
+@patch("src.utils.credentials.requests")
+def test_manifest_passed_to_state_machine(mock_request, client, step_client):
+    state_machine = step_client.create_state_machine(
+        name="step-machine",
+        definition="{}",
+        roleArn="arn:aws:iam::123456789012:role/DummyRole",
+    )
+
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    mock_request.get().status_code = 200
+    mock_body = {
+        "SecretString": json.dumps(
+            {
+                "user": os.environ["DBUSER"],
+                "database": os.environ["DBNAME"],
+                "password": os.environ["DBPASSWORD"],
+                "port": os.environ["PORT"],
+                "host": os.environ["HOST"],
+            }
+        )
+    }
+    mock_request.get().text = json.dumps(mock_body)
+
+    manifest = lambda_handler({}, {})["manifest"]
+
+    assert len(manifest) == 7
+    for table_name, entry in manifest.items():
+        assert entry["key"].startswith(f"{table_name}/")
+        client.head_object(Bucket="ingestion-bucket", Key=entry["key"])
+
+    executions = step_client.list_executions(
+        stateMachineArn=state_machine["stateMachineArn"]
+    )["executions"]
+    execution = step_client.describe_execution(
+        executionArn=executions[0]["executionArn"]
+    )
+    assert json.loads(execution["input"]) == {"manifest": manifest}
+
+
+@patch("src.utils.credentials.requests")
+def test_no_execution_started_from_state_machine(mock_request, client, step_client):
+    state_machine = step_client.create_state_machine(
+        name="step-machine",
+        definition="{}",
+        roleArn="arn:aws:iam::123456789012:role/DummyRole",
+    )
+
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    mock_request.get().status_code = 200
+    mock_body = {
+        "SecretString": json.dumps(
+            {
+                "user": os.environ["DBUSER"],
+                "database": os.environ["DBNAME"],
+                "password": os.environ["DBPASSWORD"],
+                "port": os.environ["PORT"],
+                "host": os.environ["HOST"],
+            }
+        )
+    }
+    mock_request.get().text = json.dumps(mock_body)
+
+    response = lambda_handler({"state_machine": True, "full_refresh": True}, {})
+
+    assert len(response["manifest"]) == 7
+    assert response["full_refresh"] is True
+    executions = step_client.list_executions(
+        stateMachineArn=state_machine["stateMachineArn"]
+    )["executions"]
+    assert executions == []
+
+
+def test_ingestion_deferred_while_execution_running(client, step_client):
+    state_machine = step_client.create_state_machine(
+        name="step-machine",
+        definition="{}",
+        roleArn="arn:aws:iam::123456789012:role/DummyRole",
+    )
+    step_client.start_execution(stateMachineArn=state_machine["stateMachineArn"])
+
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    response = lambda_handler({}, {})
 
-    assert len(contents["Contents"]) == 7  # Number should match amount of table names
+    assert response["statusCode"] == 200
+    assert response["manifest"] == {}
+    assert "Contents" not in client.list_objects_v2(Bucket="ingestion-bucket")
+    executions = step_client.list_executions(
+        stateMachineArn=state_machine["stateMachineArn"]
+    )["executions"]
+    assert len(executions) == 1
 
 
-@patch("src.ingestion.ingest_lambda.requests")
+@patch("src.utils.credentials.requests")
 
 
 def test_status_code_500_for_wrong_request(mock_request, step_client):
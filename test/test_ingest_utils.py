@@ -1,18 +1,34 @@
 import datetime
+import gzip
 import json
 from datetime import timezone
+from unittest.mock import patch
 
 import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from moto import mock_aws
 
+from src.ingestion import ingest_utils
 from src.ingestion.ingest_utils import (
+    convert_batches_to_json,
+    convert_batches_to_ndjson,
     convert_to_json,
+    discover_tables,
     extract_data,
+    extract_data_in_batches,
+    get_previous_fingerprint,
+    get_table_catalog,
+    get_watermark,
     ingest,
+    ingest_all,
+    order_tables,
+    save_watermark,
     upload_to_s3,
 )
 from src.utils.db_connection import close_conn, create_conn
+from src.utils.latest_object import read_latest_pointer
 from src.utils.normalise_datetime import normalise_datetimes
 
 
@@ -53,6 +69,19 @@ def test_extract_data_full_table(db):
     assert actual == expected
 
 
+@pytest.mark.it(
+    "extract_data only returns rows updated after the given watermark"
+)
+def test_extract_data_since_watermark(db):
+    table_name = "currency"
+
+    before = datetime.datetime(2022, 11, 3, 14, 20, 49)
+    after = datetime.datetime(2022, 11, 3, 14, 20, 50)
+
+    assert len(extract_data(table_name, since=before)) == 2
+    assert extract_data(table_name, since=after) == []
+
+
 @pytest.mark.it(
     "extract_data raises a RuntimeErroer in the event of failure"
 )
@@ -62,6 +91,121 @@ def test_extract_data_error():
         extract_data(table_name)
 
 
+@pytest.mark.it(
+    "extract_data_in_batches yields the rows of a table in batches of the given size"
+)
+def test_extract_data_in_batches(db):
+    batches = list(extract_data_in_batches("currency", batch_size=1))
+
+    assert len(batches) == 2
+    assert [len(batch) for batch in batches] == [1, 1]
+    assert normalise_datetimes(batches[0] + batches[1]) == normalise_datetimes(
+        extract_data("currency")
+    )
+
+
+@pytest.mark.it("extract_data_in_batches raises a RuntimeError in the event of failure")
+def test_extract_data_in_batches_error():
+    with pytest.raises(RuntimeError):
+        list(extract_data_in_batches("restaurants"))
+
+
+@pytest.mark.it("discover_tables lists every table in the database with its size")
+def test_discover_tables(db):
+    tables = discover_tables()
+
+    assert [table["table_name"] for table in tables] == [
+        "address",
+        "counterparty",
+        "currency",
+        "department",
+        "design",
+        "sales_order",
+        "staff",
+    ]
+    assert all(table["size"] > 0 for table in tables)
+
+
+@pytest.mark.it("discover_tables only lists the included tables that are not excluded")
+def test_discover_tables_filters(db):
+    tables = discover_tables(include=["s*", "currency"], exclude=["staff"])
+
+    assert [table["table_name"] for table in tables] == ["currency", "sales_order"]
+
+
+@pytest.mark.it("get_table_catalog reuses the discovered tables until the ttl expires")
+def test_get_table_catalog_cache(db, monkeypatch):
+    calls = []
+
+    def fake_discover_tables(schema, include, exclude):
+        calls.append(schema)
+        return [{"table_name": "currency", "size": 1}]
+
+    monkeypatch.setattr(ingest_utils, "TABLE_CATALOG_CACHE", {})
+    monkeypatch.setattr(ingest_utils, "discover_tables", fake_discover_tables)
+
+    first = get_table_catalog(ttl=60)
+    second = get_table_catalog(ttl=60)
+    assert first == second
+    assert len(calls) == 1
+
+    get_table_catalog(include=["currency"], ttl=60)
+    assert len(calls) == 2
+
+    get_table_catalog(schema="other", ttl=0)
+    get_table_catalog(schema="other", ttl=0)
+    assert len(calls) == 4
+
+
+@pytest.mark.it("order_tables puts priority tables first and the rest largest first")
+def test_order_tables():
+    tables = [
+        {"table_name": "currency", "size": 10},
+        {"table_name": "sales_order", "size": 500},
+        {"table_name": "staff", "size": 20},
+        {"table_name": "design", "size": 40},
+    ]
+
+    assert order_tables(tables) == ["sales_order", "design", "staff", "currency"]
+    assert order_tables(tables, priority=["staff", "currency"]) == [
+        "staff",
+        "currency",
+        "sales_order",
+        "design",
+    ]
+
+
+@pytest.mark.it(
+    "convert_batches_to_json produces the same json as convert_to_json for all rows"
+)
+def test_convert_batches_to_json():
+    rows = [
+        {"currency_id": 1, "currency_code": "GBP"},
+        {"currency_id": 2, "currency_code": "USD"},
+        {"currency_id": 3, "currency_code": "EUR"},
+    ]
+
+    assert b"".join(convert_batches_to_json([rows[:2], rows[2:]])) == convert_to_json(
+        rows
+    )
+    assert b"".join(convert_batches_to_json([])) == convert_to_json([])
+
+
+@pytest.mark.it("convert_batches_to_ndjson writes each row as json on its own line")
+def test_convert_batches_to_ndjson():
+    rows = [
+        {"currency_id": 1, "currency_code": "GBP"},
+        {"currency_id": 2, "currency_code": "USD"},
+        {"currency_id": 3, "currency_code": "EUR"},
+    ]
+
+    pieces = list(convert_batches_to_ndjson([rows[:2], [], rows[2:]]))
+
+    assert len(pieces) == 2
+    lines = b"".join(pieces).splitlines()
+    assert [json.loads(line) for line in lines] == rows
+
+
 @pytest.mark.it("convert_to_json converts a list of dictionaries into a .json file")
 def test_converts_to_json():
     input_data = [
@@ -125,7 +269,7 @@ def test_correct_upload(mock_client):
 
     upload_response = upload_to_s3(input_json, bucket_name, table_name)
 
-    response = mock_client.list_objects(Bucket=bucket_name)
+    response = mock_client.list_objects(Bucket=bucket_name, Prefix=table_name)
 
     actual_key = response["Contents"][0]["Key"]
 
@@ -142,6 +286,17 @@ def test_correct_upload(mock_client):
     }
 
 
+@pytest.mark.it("upload_to_s3 records the uploaded key as the latest for the table")
+def test_upload_writes_latest_pointer(mock_client):
+    bucket_name = "mock_bucket"
+    table_name = "department"
+
+    upload_response = upload_to_s3(json.dumps([]), bucket_name, table_name)
+
+    pointer = read_latest_pointer(mock_client, bucket_name, table_name)
+    assert upload_response == f"Uploaded to s3://{bucket_name}/{pointer['key']}"
+
+
 @pytest.mark.it(
     "upload_to_s3 raises a RuntimeError in the event of failure"
 )
@@ -189,7 +344,7 @@ def test_ingestion_works(mock_client):
 
     ingest(table_name, bucket_name)
 
-    response = mock_client.list_objects(Bucket=bucket_name)
+    response = mock_client.list_objects(Bucket=bucket_name, Prefix=table_name)
 
     actual_key = response["Contents"][0]["Key"]
 
@@ -217,10 +372,230 @@ def test_sales_order_ingestion(mock_client):
 
     ingest(table_name, bucket_name)
 
-    response = mock_client.list_objects(Bucket=bucket_name)
-    actual_key = response["Contents"][1]["Key"]
+    response = mock_client.list_objects(Bucket=bucket_name, Prefix=table_name)
+    actual_key = response["Contents"][0]["Key"]
     assert (
         actual_key == expected_key
         or actual_key == expected_key_2
         or actual_key == expected_key_3
     )
+
+
+@pytest.mark.it("ingest can upload a table as newline-delimited json")
+def test_ndjson_ingestion(mock_client):
+    table_name = "currency"
+    bucket_name = "mock_bucket_3"
+
+    result = ingest(table_name, bucket_name, file_format="ndjson")
+
+    assert result["key"].endswith(".ndjson")
+    response = mock_client.get_object(Bucket=bucket_name, Key=result["key"])
+    assert response["ContentType"] == "application/x-ndjson"
+    lines = response["Body"].read().splitlines()
+    assert len(lines) == result["rows"] == 2
+    assert all(json.loads(line)["currency_code"] for line in lines)
+
+
+@pytest.mark.it("ingest can compress a table before uploading it")
+def test_compressed_ingestion(mock_client):
+    table_name = "currency"
+    bucket_name = "mock_bucket_3"
+
+    result = ingest(table_name, bucket_name, compression="gzip")
+
+    assert result["key"].endswith(".json.gz")
+    response = mock_client.get_object(Bucket=bucket_name, Key=result["key"])
+    assert "gzip" in response["ContentEncoding"].split(",")
+    assert len(json.loads(gzip.decompress(response["Body"].read()))) == 2
+
+
+@pytest.mark.it("ingest can upload a table as parquet that keeps its column types")
+def test_parquet_ingestion(mock_client):
+    table_name = "sales_order"
+    bucket_name = "mock_bucket_3"
+
+    result = ingest(table_name, bucket_name, file_format="parquet")
+
+    assert result["key"].endswith(".parquet")
+    response = mock_client.get_object(Bucket=bucket_name, Key=result["key"])
+    table = pq.read_table(pa.BufferReader(response["Body"].read()))
+    assert table.num_rows == result["rows"]
+    assert str(table.schema.field("last_updated").type) == "timestamp[us]"
+    # unit_price is declared without a precision, so it can hold any number.
+    assert pa.types.is_string(table.schema.field("unit_price").type)
+
+
+@pytest.mark.it("get_watermark returns None when no watermark has been stored")
+def test_get_watermark_missing(mock_client):
+    bucket_name = "mock_bucket_4"
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    assert get_watermark("currency", bucket_name) is None
+
+
+@pytest.mark.it("save_watermark stores a watermark that get_watermark reads back")
+def test_save_and_get_watermark(mock_client):
+    bucket_name = "mock_bucket_4"
+    watermark = datetime.datetime(2022, 11, 3, 14, 20, 49, 962000)
+
+    save_watermark("currency", bucket_name, watermark)
+
+    assert get_watermark("currency", bucket_name) == watermark
+
+
+@pytest.mark.it(
+    "incremental ingest only uploads when there are rows newer than the watermark"
+)
+def test_incremental_ingestion(mock_client):
+    table_name = "currency"
+    bucket_name = "mock_bucket_5"
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    first_result = ingest(table_name, bucket_name, incremental=True)
+    assert first_result["rows"] == 2
+    assert first_result["watermark"] == "2022-11-03T14:20:49.962000"
+    assert get_watermark(table_name, bucket_name) == datetime.datetime(
+        2022, 11, 3, 14, 20, 49, 962000
+    )
+
+    second_result = ingest(table_name, bucket_name, incremental=True)
+    assert second_result == {
+        "key": None,
+        "rows": 0,
+        "fingerprint": None,
+        "watermark": None,
+    }
+
+    response = mock_client.list_objects_v2(Bucket=bucket_name, Prefix=table_name)
+    assert len(response["Contents"]) == 1
+    assert response["Contents"][0]["Key"] == first_result["key"]
+
+
+@pytest.mark.it(
+    "incremental ingest keeps the watermark of a table without last_updated values"
+)
+def test_incremental_ingestion_without_last_updated(mock_client, monkeypatch):
+    bucket_name = "mock_bucket_8"
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    monkeypatch.setattr(
+        ingest_utils,
+        "extract_data_in_batches",
+        lambda table_name, batch_size, since: iter([[{"lookup_id": 1}]]),
+    )
+
+    result = ingest("lookup", bucket_name, incremental=True)
+
+    assert result["rows"] == 1
+    assert result["watermark"] is None
+    assert get_watermark("lookup", bucket_name) is None
+
+
+@pytest.mark.it("full_refresh ingests the whole table despite a stored watermark")
+def test_incremental_ingestion_full_refresh(mock_client):
+    table_name = "currency"
+    bucket_name = "mock_bucket_5"
+
+    result = ingest(table_name, bucket_name, incremental=True, full_refresh=True)
+
+    assert result["rows"] == 2
+
+
+@pytest.mark.it("ingest skips uploading a snapshot identical to the previous one")
+def test_ingest_skips_unchanged_snapshot(mock_client):
+    table_name = "currency"
+    bucket_name = "mock_bucket_7"
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    first_result = ingest(table_name, bucket_name)
+    assert first_result["key"] is not None
+    assert (
+        get_previous_fingerprint(table_name, bucket_name) == first_result["fingerprint"]
+    )
+
+    second_result = ingest(table_name, bucket_name)
+    assert second_result["key"] is None
+    assert second_result["rows"] == 2
+    assert second_result["fingerprint"] == first_result["fingerprint"]
+
+    response = mock_client.list_objects_v2(Bucket=bucket_name, Prefix=table_name)
+    assert len(response["Contents"]) == 1
+
+    third_result = ingest(table_name, bucket_name, full_refresh=True)
+    assert third_result["key"] is not None
+
+
+@pytest.mark.it("ingest only spools snapshots that are compared with the previous one")
+@pytest.mark.parametrize(
+    "bucket_name, options, spooled",
+    [
+        ("mock_bucket_9", {}, True),
+        ("mock_bucket_10", {"full_refresh": True}, False),
+        ("mock_bucket_11", {"incremental": True}, False),
+    ],
+)
+def test_ingest_streams_without_fingerprint_check(
+    mock_client, bucket_name, options, spooled
+):
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    with patch.object(
+        ingest_utils, "upload_stream", wraps=ingest_utils.upload_stream
+    ) as upload_stream:
+        result = ingest("currency", bucket_name, **options)
+
+    assert result["key"] is not None
+    should_complete = upload_stream.call_args.kwargs["should_complete"]
+    assert (should_complete is not None) == spooled
+
+
+@pytest.mark.it(
+    "ingest_all ingests every table and keeps going when one of them fails"
+)
+def test_ingest_all_isolates_errors(mock_client):
+    bucket_name = "mock_bucket_6"
+    mock_client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+
+    results, errors = ingest_all(
+        ["currency", "restaurants", "department"], bucket_name, max_workers=3
+    )
+
+    assert set(results) == {"currency", "department"}
+    assert set(errors) == {"restaurants"}
+    assert isinstance(errors["restaurants"], RuntimeError)
+
+    response = mock_client.list_objects_v2(Bucket=bucket_name)
+    keys = [item["Key"] for item in response["Contents"]]
+    assert len([key for key in keys if not key.startswith("_latest/")]) == 2
+
+
+@pytest.mark.it("ingest_all only ingests the tables in INCREMENTAL_TABLES incrementally")
+def test_ingest_all_incremental_tables(monkeypatch):
+    calls = {}
+
+    def fake_ingest(table_name, bucket_name, incremental=False, **kwargs):
+        calls[table_name] = incremental
+        return {}
+
+    monkeypatch.setattr(ingest_utils, "ingest", fake_ingest)
+
+    ingest_all(["sales_order", "staff"], "mock_bucket", incremental=True)
+
+    assert calls == {"sales_order": True, "staff": False}
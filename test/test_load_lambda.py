@@ -10,6 +10,8 @@ import pytest
 from moto import mock_aws
 
 from src.load.load_lambda import lambda_handler
+from src.utils.checkpoints import get_checkpoint
+from src.utils.credentials import SECRET_CACHE
 from src.utils.db_connection import close_conn, create_conn
 
 
@@ -27,6 +29,11 @@ def db_credentials():
     dotenv.load_dotenv()
 
 
+@pytest.fixture(autouse=True)
+def empty_secret_cache():
+    SECRET_CACHE.clear()
+
+
 @pytest.fixture
 def client(test_mock_credentials):
     with mock_aws():
@@ -46,7 +53,7 @@ def get_rows_from_table(table_name):
     return response
 
 
-@patch("src.load.load_lambda.requests")
+@patch("src.utils.credentials.requests")
 @pytest.mark.it("function returns correct message on success")
 def test_uploads_data(mock_request, client):
     def file_uploader(client, filename):
@@ -97,7 +104,7 @@ def test_uploads_data(mock_request, client):
     }
 
 
-@patch("src.load.load_lambda.requests")
+@patch("src.utils.credentials.requests")
 @pytest.mark.it("function uploads all required data to the warehouse")
 def test_uploads_files(mock_request, client):
     def file_uploader(client, filename):
@@ -147,7 +154,7 @@ def test_uploads_files(mock_request, client):
     assert len(get_rows_from_table("dim_date")) == 954
 
 
-@patch("src.load.load_lambda.requests")
+@patch("src.utils.credentials.requests")
 @pytest.mark.it("function returns correct error message on failure")
 def test_error_message(mock_request, client):
     mock_request.get().status_code = 200
@@ -174,3 +181,80 @@ def test_error_message(mock_request, client):
 
     assert response["statusCode"] == 500
     assert json.loads(response["body"])["message"] == "Error!"
+
+
+@patch("src.utils.credentials.requests")
+@pytest.mark.it("function only loads the tables in the manifest")
+def test_loads_tables_in_manifest(mock_request, client):
+    mock_request.get().status_code = 200
+    mock_body = {
+        "SecretString": json.dumps(
+            {
+                "user": os.environ["DBUSER"],
+                "database": os.environ["DBNAME"],
+                "password": os.environ["DBPASSWORD"],
+                "port": os.environ["PORT"],
+                "host": os.environ["HOST"],
+            }
+        )
+    }
+    mock_request.get().text = json.dumps(mock_body)
+
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    key = "dim_currency/2025/01/01/dim_currency-20250101T000000Z.parquet"
+    client.upload_file(
+        Filename="data/test_data/dim_currency-20250609T105450Z.parquet",
+        Bucket="processed-bucket",
+        Key=key,
+    )
+
+    response = lambda_handler({"manifest": {"dim_currency": {"key": key}}}, {})
+
+    assert response["statusCode"] == 200
+    assert len(get_rows_from_table("dim_currency")) >= 3
+
+
+@patch("src.utils.credentials.requests")
+@pytest.mark.it("function only stores the checkpoints once the tables are loaded")
+def test_stores_checkpoints_after_load(mock_request, client):
+    mock_request.get().status_code = 200
+    mock_body = {
+        "SecretString": json.dumps(
+            {
+                "user": os.environ["DBUSER"],
+                "database": os.environ["DBNAME"],
+                "password": os.environ["DBPASSWORD"],
+                "port": os.environ["PORT"],
+                "host": os.environ["HOST"],
+            }
+        )
+    }
+    mock_request.get().text = json.dumps(mock_body)
+
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    key = "dim_currency/2025/01/01/dim_currency-20250101T000000Z.parquet"
+    client.upload_file(
+        Filename="data/test_data/dim_currency-20250609T105450Z.parquet",
+        Bucket="processed-bucket",
+        Key=key,
+    )
+    event = {
+        "manifest": {"dim_currency": {"key": key, "fingerprint": "a"}},
+        "checkpoints": {"sales_order": "sales_order/a.json"},
+    }
+
+    with patch(
+        "src.load.load_lambda.load_all_into_warehouse",
+        side_effect=RuntimeError("warehouse unavailable"),
+    ):
+        assert lambda_handler(event, {})["statusCode"] == 500
+    assert get_checkpoint("sales_order", "processed-bucket") is None
+
+    assert lambda_handler(event, {})["statusCode"] == 200
+    assert get_checkpoint("sales_order", "processed-bucket") == "sales_order/a.json"
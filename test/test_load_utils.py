@@ -9,6 +9,9 @@ from moto import mock_aws
 
 from src.load.load_utils import (
     access_files_from_processed_bucket,
+    find_object_to_load,
+    get_loaded_fingerprint,
+    load_all_into_warehouse,
     load_dim_counterparty_into_warehouse,
     load_dim_currency_into_warehouse,
     load_dim_dates_into_warehouse,
@@ -16,8 +19,11 @@ from src.load.load_utils import (
     load_dim_location_into_warehouse,
     load_dim_staff_into_warehouse,
     load_fact_sales_order_into_warehouse,
+    read_table_to_load,
+    save_loaded_fingerprint,
 )
 from src.utils.db_connection import close_conn, create_conn
+from src.utils.latest_object import write_latest_pointer
 
 
 @pytest.fixture(autouse=True)
@@ -73,6 +79,64 @@ class TestAccesingFileFromProcessedBucket:
             access_files_from_processed_bucket("dim_currency", bucket_name)
 
 
+class TestLoadedFingerprints:
+
+    def test_find_object_to_load_prefers_the_manifest_entry(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        write_latest_pointer(
+            client, bucket_name, "dim_currency", "latest.parquet", {"fingerprint": "a"}
+        )
+
+        assert find_object_to_load("dim_currency", bucket_name) == (
+            "latest.parquet",
+            "a",
+        )
+        assert find_object_to_load(
+            "dim_currency", bucket_name, {"key": "named.parquet", "fingerprint": "b"}
+        ) == ("named.parquet", "b")
+
+    def test_saved_fingerprint_is_read_back(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+
+        assert get_loaded_fingerprint("dim_currency", bucket_name) is None
+
+        save_loaded_fingerprint("dim_currency", bucket_name, "a")
+
+        assert get_loaded_fingerprint("dim_currency", bucket_name) == "a"
+
+    def test_read_table_to_load_skips_loaded_data(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        key = "dim_currency/2025/01/01/dim_currency-20250101T000000Z.parquet"
+        client.upload_file(
+            "./data/test_data/dim_currency-20250609T105450Z.parquet", bucket_name, key
+        )
+        entry = {"key": key, "fingerprint": "a"}
+
+        fingerprint, df = read_table_to_load("dim_currency", bucket_name, entry)
+        assert fingerprint == "a"
+        assert len(df) > 0
+
+        save_loaded_fingerprint("dim_currency", bucket_name, "a")
+        assert read_table_to_load("dim_currency", bucket_name, entry) == ("a", None)
+
+        _, df = read_table_to_load(
+            "dim_currency", bucket_name, entry, full_refresh=True
+        )
+        assert df is not None
+
+
 class TestLoadDataFramesIntoWarehouse:
 
     def test_dim_dates_uploads_data_to_warehouse(self, client):
@@ -159,6 +223,45 @@ class TestLoadDataFramesIntoWarehouse:
 
         assert len(get_rows_from_table("dim_location")) == 30
 
+    def test_dim_location_stores_missing_values_as_null(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        key = f"dim_location/2025/01/01/dim_location-{datetime.datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")}"
+        client.upload_file(
+            "data/test_data/dim_location-20250609T105450Z.parquet", bucket_name, key
+        )
+
+        df = access_files_from_processed_bucket("dim_location", bucket_name)
+
+        load_dim_location_into_warehouse(df)
+
+        rows = get_rows_from_table("dim_location WHERE address_line_2 IS NULL")
+        assert len(rows) == df["address_line_2"].isna().sum()
+
+    def test_dim_location_keeps_empty_strings(self, client):
+        df = pd.DataFrame(
+            [
+                {
+                    "location_id": 9001,
+                    "address_line_1": "",
+                    "address_line_2": None,
+                    "district": "",
+                    "city": "Leeds",
+                    "postal_code": "LS1",
+                    "country": "UK",
+                    "phone": "0113",
+                }
+            ]
+        )
+
+        load_dim_location_into_warehouse(df)
+
+        rows = get_rows_from_table("dim_location WHERE location_id = 9001")
+        assert rows == [[9001, "", None, "", "Leeds", "LS1", "UK", "0113"]]
+
     def test_dim_location_raises_runtime_error_on_exception(self, client):
         bucket_name = "mock_bucket"
         client.create_bucket(
@@ -293,6 +396,26 @@ class TestLoadDataFramesIntoWarehouse:
 
         load_fact_sales_order_into_warehouse(df)
 
+        rows = get_rows_from_table("fact_sales_order")
+        assert len(rows) == 14581
+        assert {row[0] for row in rows} == set(df["sales_record_id"])
+
+    def test_fact_sales_order_skips_rows_already_in_warehouse(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        key = f"fact_sales_order/2025/01/01/fact_sales_order-{datetime.datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")}"
+        client.upload_file(
+            "data/test_data/fact_sales_order-20250609T105449Z.parquet", bucket_name, key
+        )
+
+        df = access_files_from_processed_bucket("fact_sales_order", bucket_name)
+
+        load_fact_sales_order_into_warehouse(df)
+        load_fact_sales_order_into_warehouse(df)
+
         assert len(get_rows_from_table("fact_sales_order")) == 14581
 
     def test_fact_sales_order_raises_runtime_error_on_exception(self, client):
@@ -342,3 +465,60 @@ class TestLoadDataFramesIntoWarehouse:
         load_fact_sales_order_into_warehouse(df_2)
 
         assert len(get_rows_from_table("fact_sales_order")) == 14581
+
+
+class TestLoadAllIntoWarehouse:
+
+    def test_reports_rows_and_timings_for_each_table(self):
+        dataframes = {
+            "dim_currency": pd.read_parquet(
+                "data/test_data/dim_currency-20250609T105450Z.parquet"
+            ),
+            "dim_design": pd.read_parquet(
+                "data/test_data/dim_design-20250609T105450Z.parquet"
+            ),
+        }
+
+        report = load_all_into_warehouse(dataframes)
+
+        assert list(report) == ["dim_currency", "dim_design"]
+        for table_report in report.values():
+            assert isinstance(table_report["rows"], int)
+            assert table_report["seconds"] >= 0
+
+    def test_rolls_back_every_table_on_failure(self):
+        new_currency = pd.DataFrame(
+            [{"currency_id": 98, "currency_code": "JPY", "currency_name": "Yen"}]
+        )
+        wrong_data = pd.read_parquet(
+            "data/test_data/dim_counterparty-20250609T133849Z.parquet"
+        )
+
+        with pytest.raises(RuntimeError):
+            load_all_into_warehouse(
+                {"dim_currency": new_currency, "dim_date": wrong_data}
+            )
+
+        assert get_rows_from_table("dim_currency WHERE currency_id = 98") == []
+
+    def test_savepoints_roll_back_only_the_failing_table(self):
+        new_currency = pd.DataFrame(
+            [
+                {
+                    "currency_id": 99,
+                    "currency_code": "CHF",
+                    "currency_name": "Swiss franc",
+                }
+            ]
+        )
+        wrong_data = pd.read_parquet(
+            "data/test_data/dim_counterparty-20250609T133849Z.parquet"
+        )
+
+        report = load_all_into_warehouse(
+            {"dim_currency": new_currency, "dim_date": wrong_data}, savepoints=True
+        )
+
+        assert report["dim_currency"]["rows"] == 1
+        assert "error" in report["dim_date"]
+        assert len(get_rows_from_table("dim_currency WHERE currency_id = 99")) == 1
@@ -1,11 +1,15 @@
+import io
 import json
 import os
 
 import boto3
+import pandas as pd
 import pytest
 from moto import mock_aws
 
 from src.transform.transform_lambda import lambda_handler
+from src.utils.checkpoints import get_checkpoint, save_checkpoint
+from src.utils.date_dimension import record_loaded_dates
 
 
 @pytest.fixture
@@ -56,10 +60,11 @@ def test_uploads_data(client):
     for key in keys:
         file_uploader(client, key)
 
-    assert lambda_handler({}, {}) == {
-        "statusCode": 200,
-        "body": json.dumps({"message": "Data successfully transformed"}),
-    }
+    response = lambda_handler({}, {})
+
+    assert response["statusCode"] == 200
+    assert response["body"] == json.dumps({"message": "Data successfully transformed"})
+    assert len(response["manifest"]) == 7
 
 
 @pytest.mark.it("function uploads all required files in parquet to the right bucket")
@@ -110,9 +115,262 @@ def test_uploads_files(client):
     )
 
     for file in files_in_bucket:
+        if file["Key"].startswith("_latest/"):
+            continue
         assert file["Key"].endswith(".parquet")
         assert file["Key"].startswith(table_name)
 
+    for name in table_name:
+        assert f"_latest/{name}.json" in [file["Key"] for file in files_in_bucket]
+
+
+@pytest.mark.it(
+    "function only transforms the tables affected by the objects in the manifest"
+)
+def test_transforms_tables_in_manifest(client):
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    for key in ["currency-20250605T134850Z.json", "address-20250605T134757Z.json"]:
+        with open(f"data/test_data/{key}", "r") as f:
+            client.put_object(Body=f.read(), Bucket="ingestion-bucket", Key=key)
+
+    event = {"manifest": {"currency": {"key": "currency-20250605T134850Z.json"}}}
+    response = lambda_handler(event, {})
+
+    assert response["statusCode"] == 200
+    assert list(response["manifest"]) == ["dim_currency"]
+
+    files_in_bucket = client.list_objects_v2(Bucket="processed-bucket")["Contents"]
+    keys = [file["Key"] for file in files_in_bucket]
+    assert response["manifest"]["dim_currency"]["key"] in keys
+    assert all(key.startswith(("dim_currency", "_latest/")) for key in keys)
+
+
+@pytest.mark.it("function skips tables whose ingested data has not changed")
+def test_skips_unchanged_tables(client):
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    key = "currency-20250605T134850Z.json"
+    with open(f"data/test_data/{key}", "r") as f:
+        client.put_object(Body=f.read(), Bucket="ingestion-bucket", Key=key)
+
+    event = {"manifest": {"currency": {"key": key, "fingerprint": "a"}}}
+    manifest = lambda_handler(event, {})["manifest"]
+    assert list(manifest) == ["dim_currency"]
+    objects = client.list_objects_v2(Bucket="processed-bucket")["KeyCount"]
+
+    assert lambda_handler(event, {})["manifest"] == {
+        "dim_currency": {
+            "key": manifest["dim_currency"]["key"],
+            "fingerprint": manifest["dim_currency"]["fingerprint"],
+        }
+    }
+    assert client.list_objects_v2(Bucket="processed-bucket")["KeyCount"] == objects
+
+    event["full_refresh"] = True
+    assert list(lambda_handler(event, {})["manifest"]) == ["dim_currency"]
+
+
+@pytest.mark.it("function only emits dates that are not yet in the warehouse")
+def test_emits_only_new_dates(client):
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    with open("data/test_data/sales_order-20250604T102926Z.json", "r") as f:
+        sales_orders = json.load(f)
+    new_sale = {
+        **sales_orders[0],
+        "sales_order_id": 99999,
+        "created_at": "2030-01-01T10:00:00",
+        "last_updated": "2030-01-01T10:00:00",
+        "agreed_delivery_date": "2030-01-02",
+        "agreed_payment_date": "2030-01-02",
+    }
+    client.put_object(
+        Body=json.dumps(sales_orders), Bucket="ingestion-bucket", Key="first.json"
+    )
+    client.put_object(
+        Body=json.dumps(sales_orders + [new_sale]),
+        Bucket="ingestion-bucket",
+        Key="second.json",
+    )
+
+    response = lambda_handler({"manifest": {"sales_order": {"key": "first.json"}}}, {})
+    dim_date = pd.read_parquet(
+        io.BytesIO(
+            client.get_object(
+                Bucket="processed-bucket", Key=response["manifest"]["dim_date"]["key"]
+            )["Body"].read()
+        )
+    )
+    record_loaded_dates(client, "processed-bucket", dim_date["date_id"])
+
+    response = lambda_handler({"manifest": {"sales_order": {"key": "second.json"}}}, {})
+    assert response["statusCode"] == 200
+    assert response["manifest"]["dim_date"]["rows"] == 2
+
+
+@pytest.mark.it("function only transforms sales orders ingested since its checkpoint")
+def test_incremental_fact_sales_order(client, monkeypatch):
+    monkeypatch.setenv("INCREMENTAL_TRANSFORM", "true")
+    monkeypatch.setenv("INCREMENTAL_INGESTION", "true")
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    with open("data/test_data/sales_order-20250604T102926Z.json", "r") as f:
+        sales_orders = json.load(f)
+    new_sale = {
+        **sales_orders[0],
+        "sales_order_id": 99999,
+        "created_at": "2030-01-01T10:00:00",
+        "last_updated": "2030-01-01T10:00:00",
+    }
+
+    def read_fact(response):
+        return pd.read_parquet(
+            io.BytesIO(
+                client.get_object(
+                    Bucket="processed-bucket",
+                    Key=response["manifest"]["fact_sales_order"]["key"],
+                )["Body"].read()
+            )
+        )
+
+    # Without a checkpoint only the latest object is read, not the history.
+    client.put_object(
+        Body=json.dumps(sales_orders[:2]),
+        Bucket="ingestion-bucket",
+        Key="sales_order/2025/06/04/sales_order-20250604T102926Z.json",
+    )
+    client.put_object(
+        Body=json.dumps(sales_orders),
+        Bucket="ingestion-bucket",
+        Key="sales_order/2025/06/05/sales_order-20250605T102926Z.json",
+    )
+    event = {"manifest": {"sales_order": {"key": "not-read.json"}}}
+    response = lambda_handler(event, {})
+    first = read_fact(response)
+    assert len(first) == len(sales_orders)
+    # The checkpoint is stored by the load stage once the rows are loaded.
+    assert get_checkpoint("sales_order", "processed-bucket") is None
+    save_checkpoint(
+        "sales_order", "processed-bucket", response["checkpoints"]["sales_order"]
+    )
+
+    client.put_object(
+        Body=json.dumps([new_sale]),
+        Bucket="ingestion-bucket",
+        Key="sales_order/2025/06/06/sales_order-20250606T102926Z.json",
+    )
+    response = lambda_handler(event, {})
+    second = read_fact(response)
+    assert second["sales_order_id"].tolist() == [99999]
+    assert not set(second["sales_record_id"]).intersection(first["sales_record_id"])
+    save_checkpoint(
+        "sales_order", "processed-bucket", response["checkpoints"]["sales_order"]
+    )
+
+    manifest = lambda_handler(event, {})["manifest"]
+    assert {table_name: entry["key"] for table_name, entry in manifest.items()} == {
+        table_name: entry["key"] for table_name, entry in response["manifest"].items()
+    }
+
+
+@pytest.mark.it("function transforms again the sales orders whose load failed")
+def test_incremental_retries_unloaded_objects(client, monkeypatch):
+    monkeypatch.setenv("INCREMENTAL_TRANSFORM", "true")
+    monkeypatch.setenv("INCREMENTAL_INGESTION", "true")
+    client.create_bucket(
+        Bucket="processed-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    client.create_bucket(
+        Bucket="ingestion-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    with open("data/test_data/sales_order-20250604T102926Z.json", "r") as f:
+        sales_orders = json.load(f)
+    for day, sales in [(4, sales_orders[:1]), (5, sales_orders[1:2])]:
+        client.put_object(
+            Body=json.dumps(sales),
+            Bucket="ingestion-bucket",
+            Key=f"sales_order/2025/06/0{day}/sales_order-2025060{day}T102926Z.json",
+        )
+    save_checkpoint(
+        "sales_order",
+        "processed-bucket",
+        "sales_order/2025/06/04/sales_order-20250604T102926Z.json",
+    )
+    event = {"manifest": {"sales_order": {"key": "not-read.json"}}}
+    assert lambda_handler(event, {})["statusCode"] == 200
+
+    # The load of that delta failed, so the checkpoint was not moved on.
+    client.put_object(
+        Body=json.dumps(sales_orders[2:3]),
+        Bucket="ingestion-bucket",
+        Key="sales_order/2025/06/06/sales_order-20250606T102926Z.json",
+    )
+    response = lambda_handler(event, {})
+    fact = pd.read_parquet(
+        io.BytesIO(
+            client.get_object(
+                Bucket="processed-bucket",
+                Key=response["manifest"]["fact_sales_order"]["key"],
+            )["Body"].read()
+        )
+    )
+
+    assert sorted(fact["sales_order_id"]) == sorted(
+        sale["sales_order_id"] for sale in sales_orders[1:3]
+    )
+    assert response["checkpoints"] == {
+        "sales_order": "sales_order/2025/06/06/sales_order-20250606T102926Z.json"
+    }
+
+
+@pytest.mark.it("function refuses incremental settings that do not match")
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"INCREMENTAL_TRANSFORM": "true"},
+        {"INCREMENTAL_INGESTION": "true"},
+    ],
+)
+def test_incremental_transform_needs_incremental_ingestion(
+    client, monkeypatch, settings
+):
+    monkeypatch.delenv("INCREMENTAL_TRANSFORM", raising=False)
+    monkeypatch.delenv("INCREMENTAL_INGESTION", raising=False)
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+
+    response = lambda_handler({"manifest": {"sales_order": {"key": "a.json"}}}, {})
+
+    assert response["statusCode"] == 500
+    assert "INCREMENTAL_INGESTION" in json.loads(response["body"])["error"]
+
 
 @pytest.mark.it("function returns correct error message on failure")
 def test_error_message(client):
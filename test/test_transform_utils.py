@@ -1,4 +1,6 @@
 import datetime
+import gzip
+import io
 import json
 import os
 from datetime import timezone
@@ -10,8 +12,11 @@ import pytest
 from moto import mock_aws
 
 from src.transform.transform_utils import (
+    fingerprint_dataframe,
     get_all_table_data_from_ingest_bucket,
+    get_new_table_data_from_ingest_bucket,
     get_table_data_from_ingest_bucket,
+    split_timestamps,
     transform_dim_counterparty,
     transform_dim_currency,
     transform_dim_date,
@@ -72,6 +77,77 @@ class TestGetTableDataFromIngestBucket:
         for column_name in column_names:
             assert column_name in response[0]
 
+    def test_reads_newline_delimited_json(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        rows = [
+            {"currency_id": 1, "currency_code": "GBP"},
+            {"currency_id": 2, "currency_code": "USD"},
+        ]
+        key = "currency/2025/01/01/currency-20250101T000000Z.ndjson"
+        client.put_object(
+            Body="".join(json.dumps(row) + "\n" for row in rows),
+            Bucket=bucket_name,
+            Key=key,
+        )
+
+        assert get_table_data_from_ingest_bucket("currency", bucket_name) == rows
+
+    @pytest.mark.parametrize("suffix", [".json.gz", ".ndjson.gz"])
+    def test_reads_compressed_objects(self, client, suffix):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        rows = [
+            {"currency_id": 1, "currency_code": "GBP"},
+            {"currency_id": 2, "currency_code": "USD"},
+        ]
+        if suffix.startswith(".ndjson"):
+            body = "".join(json.dumps(row) + "\n" for row in rows)
+        else:
+            body = json.dumps(rows)
+        client.put_object(
+            Body=gzip.compress(body.encode("utf-8")),
+            Bucket=bucket_name,
+            Key=f"currency/2025/01/01/currency-20250101T000000Z{suffix}",
+            ContentEncoding="gzip",
+        )
+
+        assert get_table_data_from_ingest_bucket("currency", bucket_name) == rows
+
+    def test_reads_parquet_objects_as_dataframes(self, client):
+        bucket_name = "mock_bucket"
+        client.create_bucket(
+            Bucket=bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        with open("data/test_data/sales_order-20250604T102926Z.json", "r") as file:
+            data_sales_order = json.load(file)
+        df = pd.DataFrame(data_sales_order)
+        for column in ["created_at", "last_updated"]:
+            df[column] = pd.to_datetime(df[column], format="ISO8601")
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        client.put_object(
+            Body=buffer.getvalue(),
+            Bucket=bucket_name,
+            Key="sales_order/2025/01/01/sales_order-20250101T000000Z.parquet",
+        )
+
+        response = get_table_data_from_ingest_bucket("sales_order", bucket_name)
+
+        assert isinstance(response, pd.DataFrame)
+        assert pd.api.types.is_datetime64_any_dtype(response["created_at"])
+        pd.testing.assert_frame_equal(
+            transform_fact_sales_order(response),
+            transform_fact_sales_order(data_sales_order),
+        )
+
     def test_raises_exception_on_failure_to_retrieve_data(self, client):
         bucket_name = "mock_bucket"
         client.create_bucket(
@@ -108,6 +184,60 @@ class TestGetAllTableDataFromIngestBucket:
             assert table_name in response
 
 
+class TestGetNewTableDataFromIngestBucket:
+    @pytest.mark.it(
+        "get_new_table_data_from_ingest_bucket combines the objects after the given key"
+    )
+    def test_reads_objects_after_key(self, client):
+        client.create_bucket(
+            Bucket="mock_bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        for day in [1, 2, 3]:
+            client.put_object(
+                Body=json.dumps([{"sales_order_id": day}]),
+                Bucket="mock_bucket",
+                Key=f"sales_order/2025/01/0{day}/sales_order-2025010{day}T000000Z.json",
+            )
+
+        df, last_key = get_new_table_data_from_ingest_bucket(
+            "sales_order",
+            "mock_bucket",
+            "sales_order/2025/01/01/sales_order-20250101T000000Z.json",
+        )
+
+        assert df["sales_order_id"].tolist() == [2, 3]
+        assert last_key == "sales_order/2025/01/03/sales_order-20250103T000000Z.json"
+
+        df, last_key = get_new_table_data_from_ingest_bucket(
+            "sales_order", "mock_bucket", last_key
+        )
+        assert df.empty
+        assert last_key is None
+
+    @pytest.mark.it(
+        "get_new_table_data_from_ingest_bucket only reads the latest object without a key"
+    )
+    def test_reads_latest_object_without_key(self, client):
+        client.create_bucket(
+            Bucket="mock_bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        for day in [1, 2]:
+            client.put_object(
+                Body=json.dumps([{"sales_order_id": day}]),
+                Bucket="mock_bucket",
+                Key=f"sales_order/2025/01/0{day}/sales_order-2025010{day}T000000Z.json",
+            )
+
+        df, last_key = get_new_table_data_from_ingest_bucket(
+            "sales_order", "mock_bucket"
+        )
+
+        assert df["sales_order_id"].tolist() == [2]
+        assert last_key == "sales_order/2025/01/02/sales_order-20250102T000000Z.json"
+
+
 class TestTransformTables:
 
     @pytest.mark.it(
@@ -153,6 +283,25 @@ class TestTransformTables:
         assert isinstance(actual["agreed_payment_date"][0], datetime.date)
         assert isinstance(actual["agreed_delivery_date"][0], datetime.date)
 
+    @pytest.mark.it(
+        "split_timestamps gives the same dates and times for strings and datetimes"
+    )
+    def test_split_timestamps(self):
+        timestamps = [
+            datetime.datetime(2022, 11, 3, 14, 20, 52, 186000),
+            datetime.datetime(2023, 1, 1, 9, 5, 0),
+        ]
+        strings = pd.Series([timestamp.isoformat() for timestamp in timestamps])
+
+        for column in [strings, pd.Series(pd.to_datetime(timestamps))]:
+            dates, times = split_timestamps(column)
+
+            assert dates.tolist() == [
+                datetime.date(2022, 11, 3),
+                datetime.date(2023, 1, 1),
+            ]
+            assert times.tolist() == ["14:20:52.186000", "09:05:00"]
+
     @pytest.mark.it(
         "transform_dim_design returns a dataframe with columns as specified in the warehouse design"
     )
@@ -171,6 +320,34 @@ class TestTransformTables:
             "file_name",
         ]
 
+    @pytest.mark.it(
+        "transform_fact_sales_order gives each version of a sales order the same sales_record_id in every run"
+    )
+    def test_fact_sales_order_stable_ids(self):
+        with open("data/test_data/sales_order-20250604T102926Z.json", "r") as file:
+            data_sales_order = json.load(file)
+
+        expected = transform_fact_sales_order(data_sales_order).set_index(
+            "sales_order_id"
+        )["sales_record_id"]
+
+        as_parquet = pd.DataFrame(data_sales_order[::-1])
+        for column in ["created_at", "last_updated"]:
+            as_parquet[column] = pd.to_datetime(as_parquet[column], format="ISO8601")
+        actual = transform_fact_sales_order(
+            pd.concat([as_parquet, as_parquet])
+        ).set_index("sales_order_id")["sales_record_id"]
+
+        assert expected.is_unique
+        assert (expected >= 0).all()
+        pd.testing.assert_series_equal(actual.sort_index(), expected.sort_index())
+
+        updated = dict(data_sales_order[0], last_updated="2030-01-01T00:00:00")
+        assert (
+            transform_fact_sales_order([updated])["sales_record_id"][0]
+            not in expected.values
+        )
+
     @pytest.mark.it(
         "transform_dim_currency returns a dataframe with columns as specified in the warehouse design"
     )
@@ -230,6 +407,33 @@ class TestTransformTables:
             "quarter",
         ]
 
+    @pytest.mark.it(
+        "transform_dim_date leaves out loaded dates and adds the calendar range"
+    )
+    def test_dim_dates_loaded_and_calendar(self):
+        with open("data/test_data/sales_order-20250604T102926Z.json", "r") as file:
+            data_sales_order = json.load(file)
+        transformed_data = transform_fact_sales_order(data_sales_order)
+        all_dates = transform_dim_date(transformed_data)
+
+        loaded_dates = set(all_dates["date_id"][:10])
+        actual = transform_dim_date(transformed_data, loaded_dates=loaded_dates)
+        assert len(actual) == len(all_dates) - 10
+        assert not actual["date_id"].isin(loaded_dates).any()
+
+        actual = transform_dim_date(
+            transformed_data,
+            loaded_dates=set(all_dates["date_id"]),
+            calendar=("1999-12-30", "2000-01-02"),
+        )
+        assert actual["date_id"].tolist() == [
+            datetime.date(1999, 12, 30),
+            datetime.date(1999, 12, 31),
+            datetime.date(2000, 1, 1),
+            datetime.date(2000, 1, 2),
+        ]
+        assert actual["quarter"].tolist() == [4, 4, 1, 1]
+
     @pytest.mark.it(
         "transform_dim_staff returns a dataframe with columns as specified in the warehouse design"
     )
@@ -274,6 +478,25 @@ class TestTransformTables:
         ]
 
 
+class TestFingerprintDataframe:
+
+    @pytest.mark.it("fingerprint_dataframe only changes when the data changes")
+    def test_fingerprint_dataframe(self):
+        with open("data/test_data/currency-20250605T134850Z.json", "r") as file:
+            data_currency = json.load(file)
+
+        df = transform_dim_currency(data_currency)
+        fingerprint = fingerprint_dataframe(df)
+
+        assert fingerprint_dataframe(transform_dim_currency(data_currency)) == (
+            fingerprint
+        )
+
+        changed = df.copy()
+        changed.loc[0, "currency_name"] = "Changed"
+        assert fingerprint_dataframe(changed) != fingerprint
+
+
 class TestUploadToS3:
 
     @pytest.mark.it(
@@ -1,13 +1,60 @@
+import io
+import json
 import os
-from datetime import datetime
+import threading
+from datetime import date, datetime, time, timezone
 from decimal import Decimal
+from time import sleep
 from unittest.mock import Mock, patch
 
+import boto3
+import pandas as pd
 import pytest
+from moto import mock_aws
+from pg8000.exceptions import DatabaseError
 
+from src.utils.aws_clients import CLIENTS, get_client, set_client
+from src.utils.checkpoints import get_checkpoint, save_checkpoint
+from src.utils.compression import (
+    COMPRESSIONS,
+    compression_for_key,
+    get_compression,
+)
+from src.utils.concurrency import map_concurrently, run_graph
+from src.utils.connection_pool import ConnectionPool, pooled_conn
+from src.utils.credentials import (
+    SECRET_CACHE,
+    fetch_secret,
+    get_secret,
+    use_db_credentials,
+)
+from src.utils.currency_names import name_currencies
+from src.utils.date_dimension import (
+    build_calendar,
+    calendar_dates,
+    read_loaded_dates,
+    record_loaded_dates,
+)
 from src.utils.db_connection import create_conn
 from src.utils.default_serialiser import default_serialiser
+from src.utils.fingerprint import combine_fingerprints, fingerprint
+from src.utils.json_encoder import JSON_ENCODERS, get_json_encoder
+from src.utils.latest_object import (
+    find_latest_key,
+    list_keys_after,
+    list_latest_key,
+    read_latest_pointer,
+    write_latest_pointer,
+)
 from src.utils.normalise_datetime import normalise_datetimes
+from src.utils.pg_arrow import (
+    arrow_schema,
+    dataframe_to_parquet,
+    read_parquet,
+    rows_to_record_batch,
+    write_parquet,
+)
+from src.utils.streaming_upload import MIN_PART_SIZE, upload_stream
 
 
 class TestDefaultSerialiser:
@@ -30,6 +77,242 @@ class TestDefaultSerialiser:
         serialisedoutput = 150.09
         assert default_serialiser(decimal_input) == serialisedoutput
 
+    @pytest.mark.it("serialise date and time objects into ISO 8601 strings")
+    def test_serialises_date_and_time(self):
+        assert default_serialiser(date(2025, 6, 3)) == "2025-06-03"
+        assert default_serialiser(time(13, 59, 59, 500)) == "13:59:59.000500"
+
+
+class TestJsonEncoder:
+    rows = [
+        {
+            "sales_order_id": 2,
+            "created_at": datetime(2022, 11, 3, 14, 20, 52, 186000),
+            "last_updated": datetime(2022, 11, 3, 14, 20, 52, tzinfo=timezone.utc),
+            "agreed_payment_date": date(2022, 11, 7),
+            "agreed_delivery_time": time(9, 30),
+            "unit_price": Decimal("3.94"),
+            "design_name": "Café",
+            "units_sold": None,
+        }
+    ]
+
+    @pytest.mark.it("All encoders give identical json for supported types")
+    def test_encoders_give_identical_output(self):
+        outputs = {encoder(self.rows) for encoder in JSON_ENCODERS.values()}
+
+        assert len(outputs) == 1
+        assert json.loads(outputs.pop()) == [
+            {
+                "sales_order_id": 2,
+                "created_at": "2022-11-03T14:20:52.186000",
+                "last_updated": "2022-11-03T14:20:52+00:00",
+                "agreed_payment_date": "2022-11-07",
+                "agreed_delivery_time": "09:30:00",
+                "unit_price": 3.94,
+                "design_name": "Café",
+                "units_sold": None,
+            }
+        ]
+
+    @pytest.mark.it("Encoders write floats with an exponent differently")
+    def test_encoders_differ_for_exponent_floats(self):
+        if "orjson" not in JSON_ENCODERS:
+            pytest.skip("orjson is not installed")
+
+        assert JSON_ENCODERS["stdlib"]([1e-7]) == b"[1e-07]"
+        assert JSON_ENCODERS["orjson"]([1e-7]) == b"[1e-7]"
+        assert JSON_ENCODERS["stdlib"]([0.5, 1e15]) == JSON_ENCODERS["orjson"](
+            [0.5, 1e15]
+        )
+
+    @pytest.mark.it("Returns the encoder named by the JSON_ENCODER variable")
+    def test_get_json_encoder_from_environment(self):
+        with patch.dict(os.environ, {"JSON_ENCODER": "stdlib"}):
+            assert get_json_encoder() is JSON_ENCODERS["stdlib"]
+
+    @pytest.mark.it("Raises ValueError for an unknown encoder")
+    def test_get_json_encoder_unknown(self):
+        with pytest.raises(ValueError):
+            get_json_encoder("simplejson")
+
+
+class TestFingerprint:
+    @pytest.mark.it("Gives the same fingerprint for strings and their encoded bytes")
+    def test_fingerprint_str_and_bytes(self):
+        assert fingerprint('[{"currency_id": 1}]') == fingerprint(
+            b'[{"currency_id": 1}]'
+        )
+        assert fingerprint("[]") != fingerprint("[ ]")
+
+    @pytest.mark.it("Combines fingerprints regardless of order, unless one is missing")
+    def test_combine_fingerprints(self):
+        combined = combine_fingerprints({"staff": "a", "department": "b"})
+
+        assert combined == combine_fingerprints({"department": "b", "staff": "a"})
+        assert combined != combine_fingerprints({"staff": "a", "department": "c"})
+        assert combine_fingerprints({"staff": "a", "department": None}) is None
+
+
+class TestCheckpoints:
+    @pytest.fixture
+    def client(self):
+        with patch.dict(
+            os.environ,
+            {
+                "AWS_ACCESS_KEY_ID": "mock_access_key",
+                "AWS_SECRET_ACCESS_KEY": "aws_secret_key",
+                "AWS_DEFAULT_REGION": "eu-west-2",
+            },
+        ):
+            with mock_aws():
+                client = boto3.client("s3")
+                client.create_bucket(
+                    Bucket="mock_bucket",
+                    CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+                )
+                yield client
+
+    @pytest.mark.it("get_checkpoint reads back the key stored by save_checkpoint")
+    def test_checkpoint_round_trip(self, client):
+        assert get_checkpoint("sales_order", "mock_bucket") is None
+
+        save_checkpoint("sales_order", "mock_bucket", "sales_order/a.json")
+
+        assert get_checkpoint("sales_order", "mock_bucket") == "sales_order/a.json"
+
+
+class TestCompression:
+    @pytest.mark.it("Compressed data is read back line by line unchanged")
+    @pytest.mark.parametrize("name", sorted(COMPRESSIONS))
+    def test_round_trip(self, name):
+        data = b"".join(
+            b'{"address_id": %d, "city": "Leeds"}\n' % i for i in range(1000)
+        )
+        compress, open_stream, _, _ = get_compression(name)
+
+        compressed = b"".join(
+            compress(data[i : i + 100] for i in range(0, len(data), 100))
+        )
+
+        assert len(compressed) < len(data) / 5
+        assert b"".join(open_stream(io.BytesIO(compressed))) == data
+        assert len(list(open_stream(io.BytesIO(compressed)))) == 1000
+
+    @pytest.mark.it("Works out the compression of an object from its key")
+    def test_compression_for_key(self):
+        assert compression_for_key("address/address-20250101T000000Z.json.gz") == "gzip"
+        assert compression_for_key("address/address-20250101T000000Z.ndjson") is None
+
+    @pytest.mark.it("Raises ValueError for an unknown compression")
+    def test_unknown_compression(self):
+        with pytest.raises(ValueError):
+            get_compression("brotli")
+
+
+class TestPgArrow:
+    columns = [
+        {"name": "sales_order_id", "type_oid": 23, "type_modifier": -1},
+        {"name": "created_at", "type_oid": 1114, "type_modifier": -1},
+        {"name": "unit_price", "type_oid": 1700, "type_modifier": (10 << 16) + 2 + 4},
+        {"name": "agreed_payment_date", "type_oid": 1043, "type_modifier": -1},
+        {"name": "details", "type_oid": 3802, "type_modifier": -1},
+    ]
+
+    @pytest.mark.it("Builds an Arrow schema from the Postgres column types")
+    def test_arrow_schema(self):
+        schema = arrow_schema(self.columns)
+
+        assert [str(field.type) for field in schema] == [
+            "int32",
+            "timestamp[us]",
+            "decimal128(10, 2)",
+            "string",
+            "string",
+        ]
+
+    @pytest.mark.it("Round trips rows through Parquet keeping their types")
+    def test_parquet_round_trip(self):
+        schema = arrow_schema(self.columns)
+        rows = [
+            [
+                1,
+                datetime(2022, 11, 3, 14, 20, 52, 186000),
+                Decimal("3.94"),
+                "2022-11-08",
+                {"a": [1, "b"]},
+            ],
+            [2, None, None, None, "b"],
+        ]
+
+        data = write_parquet([rows_to_record_batch(rows, schema)], schema)
+        df = read_parquet(data)
+
+        assert df["sales_order_id"].tolist() == [1, 2]
+        assert df.loc[0, "created_at"] == datetime(2022, 11, 3, 14, 20, 52, 186000)
+        assert df.loc[0, "unit_price"] == Decimal("3.94")
+        assert json.loads(df.loc[0, "details"]) == {"a": [1, "b"]}
+        assert json.loads(df.loc[1, "details"]) == "b"
+        assert df.loc[1, "unit_price"] is None
+
+    @pytest.mark.it("Keeps numeric values too large for a 128-bit decimal")
+    def test_parquet_large_numerics(self):
+        columns = [
+            {"name": "unbounded", "type_oid": 1700, "type_modifier": -1},
+            {"name": "wide", "type_oid": 1700, "type_modifier": (50 << 16) + 2 + 4},
+            {"name": "widest", "type_oid": 1700, "type_modifier": (100 << 16) + 4},
+        ]
+        schema = arrow_schema(columns)
+        unbounded = Decimal("123456789012345678901234567890.123456789")
+        wide = Decimal("123456789012345678901234567890123456789012345678.90")
+        widest = Decimal("9" * 100)
+
+        data = write_parquet(
+            [rows_to_record_batch([[unbounded, wide, widest]], schema)], schema
+        )
+        df = read_parquet(data)
+
+        assert [str(field.type) for field in schema] == [
+            "string",
+            "decimal256(50, 2)",
+            "string",
+        ]
+        assert Decimal(df.loc[0, "unbounded"]) == unbounded
+        assert df.loc[0, "wide"] == wide
+        assert Decimal(df.loc[0, "widest"]) == widest
+
+    @pytest.mark.it("Writes an empty Parquet file when there are no rows")
+    def test_parquet_empty(self):
+        schema = arrow_schema(self.columns)
+
+        data = write_parquet([rows_to_record_batch([], schema)], schema)
+
+        assert read_parquet(data).columns.tolist() == [
+            column["name"] for column in self.columns
+        ]
+
+    @pytest.mark.it(
+        "Round trips a dataframe, keeping integer columns with missing values"
+    )
+    def test_dataframe_round_trip(self):
+        df = pd.DataFrame(
+            {
+                "id": [1, 2],
+                "staff_id": pd.array([7, None], dtype="Int64"),
+                "name": ["a", None],
+            },
+            index=[5, 6],
+        )
+
+        data = dataframe_to_parquet(df)
+        result = read_parquet(data, nullable=True)
+
+        assert result.index.tolist() == [0, 1]
+        assert str(result["id"].dtype) == "Int64"
+        assert result["staff_id"].tolist() == [7, pd.NA]
+        assert result["name"].tolist() == ["a", pd.NA]
+        assert read_parquet(data)["staff_id"].isna().tolist() == [False, True]
+
 
 class TestNormaliseDatetimes:
     @pytest.mark.it("Converts datetime values in list of dicts to formatted strings")
@@ -68,3 +351,571 @@ class TestDBConnection:
             database="test_db", user="test-user", password="test_pass", host="localhost"
         )
         assert result == mock_conn_first
+
+
+@patch.dict(
+    os.environ,
+    {
+        "DBUSER": "test-user",
+        "DBNAME": "test_db",
+        "DBPASSWORD": "test_pass",
+        "HOST": "localhost",
+    },
+)
+@patch("src.utils.connection_pool.create_conn")
+class TestConnectionPool:
+    @pytest.mark.it("Reuses a released connection instead of opening a new one")
+    def test_reuses_connection(self, mock_create_conn):
+        pool = ConnectionPool()
+        conn = pool.acquire()
+        pool.release(conn)
+
+        assert pool.acquire() is conn
+        mock_create_conn.assert_called_once()
+
+    @pytest.mark.it("Replaces a connection that fails the health check")
+    def test_replaces_broken_connection(self, mock_create_conn):
+        broken_conn = Mock()
+        broken_conn.run.side_effect = Exception("connection lost")
+        new_conn = Mock()
+        mock_create_conn.side_effect = [broken_conn, new_conn]
+        pool = ConnectionPool()
+        pool.release(pool.acquire())
+
+        assert pool.acquire() is new_conn
+        broken_conn.close.assert_called_once()
+
+    @pytest.mark.it("Opens a new connection when the credentials change")
+    def test_new_connection_for_new_credentials(self, mock_create_conn):
+        first_conn = Mock()
+        second_conn = Mock()
+        mock_create_conn.side_effect = [first_conn, second_conn]
+        pool = ConnectionPool()
+        pool.release(pool.acquire())
+
+        with patch.dict(os.environ, {"DBNAME": "other_db"}):
+            assert pool.acquire() is second_conn
+        first_conn.close.assert_called_once()
+
+    @pytest.mark.it("Closes connections beyond the idle limit")
+    def test_idle_limit(self, mock_create_conn):
+        mock_create_conn.side_effect = lambda: Mock()
+        pool = ConnectionPool(max_idle=1)
+        first_conn = pool.acquire()
+        second_conn = pool.acquire()
+        pool.release(first_conn)
+        pool.release(second_conn)
+
+        first_conn.close.assert_not_called()
+        second_conn.close.assert_called_once()
+
+    @pytest.mark.it("pooled_conn closes the connection when the block raises")
+    def test_pooled_conn_discards_on_error(self, mock_create_conn):
+        with patch("src.utils.connection_pool.pool", ConnectionPool()) as pool:
+            with pytest.raises(RuntimeError):
+                with pooled_conn() as conn:
+                    raise RuntimeError("query failed")
+
+            conn.close.assert_called_once()
+            assert pool._idle == []
+
+    @pytest.mark.it("Refreshes the credentials once when the database rejects them")
+    def test_refreshes_credentials_on_auth_failure(self, mock_create_conn):
+        conn = Mock()
+        mock_create_conn.side_effect = [DatabaseError({"C": "28P01"}), conn]
+        refresh_credentials = Mock()
+        pool = ConnectionPool(refresh_credentials=refresh_credentials)
+
+        assert pool.acquire() is conn
+        refresh_credentials.assert_called_once()
+
+    @pytest.mark.it("Does not refresh the credentials for other connection errors")
+    def test_other_errors_not_refreshed(self, mock_create_conn):
+        mock_create_conn.side_effect = DatabaseError({"C": "3D000"})
+        refresh_credentials = Mock()
+        pool = ConnectionPool(refresh_credentials=refresh_credentials)
+
+        with pytest.raises(DatabaseError):
+            pool.acquire()
+        refresh_credentials.assert_not_called()
+
+
+@patch.dict(os.environ, {"AWS_SESSION_TOKEN": "token"})
+@patch("src.utils.credentials.requests")
+class TestCredentials:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        with patch.dict(SECRET_CACHE, clear=True):
+            yield
+
+    def respond_with(self, mock_requests, secret, status_code=200):
+        mock_requests.get.return_value.status_code = status_code
+        mock_requests.get.return_value.text = json.dumps(
+            {"SecretString": json.dumps(secret)}
+        )
+
+    @pytest.mark.it(
+        "fetch_secret calls the extension with the session token and a timeout"
+    )
+    def test_fetch_secret(self, mock_requests):
+        self.respond_with(mock_requests, {"user": "test_user"})
+
+        assert fetch_secret("my_secret", timeout=1) == {"user": "test_user"}
+        mock_requests.get.assert_called_once_with(
+            "http://localhost:2773/secretsmanager/get?secretId=my_secret",
+            headers={"X-Aws-Parameters-Secrets-Token": "token"},
+            timeout=1,
+        )
+
+    @pytest.mark.it("fetch_secret raises a RuntimeError when the extension fails")
+    def test_fetch_secret_error(self, mock_requests):
+        self.respond_with(mock_requests, {}, status_code=400)
+
+        with pytest.raises(RuntimeError):
+            fetch_secret("my_secret")
+
+    @pytest.mark.it("get_secret reuses a fetched secret until its ttl expires")
+    def test_get_secret_cache(self, mock_requests):
+        self.respond_with(mock_requests, {"user": "test_user"})
+
+        get_secret("my_secret", ttl=60)
+        get_secret("my_secret", ttl=60)
+        assert mock_requests.get.call_count == 1
+
+        get_secret("my_secret", ttl=60, refresh=True)
+        assert mock_requests.get.call_count == 2
+
+        get_secret("other_secret", ttl=0)
+        get_secret("other_secret", ttl=0)
+        assert mock_requests.get.call_count == 4
+
+    @pytest.mark.it("use_db_credentials sets the database environment variables")
+    def test_use_db_credentials(self, mock_requests):
+        secret = {
+            "user": "test_user",
+            "database": "test_db",
+            "password": "test_pass",
+            "port": "5432",
+            "host": "localhost",
+        }
+        self.respond_with(mock_requests, secret)
+
+        with patch.dict(os.environ), patch(
+            "src.utils.credentials.pool", ConnectionPool()
+        ) as pool:
+            use_db_credentials("my_secret")
+            assert os.environ["DBUSER"] == "test_user"
+            assert os.environ["DBPASSWORD"] == "test_pass"
+
+            self.respond_with(mock_requests, {**secret, "password": "new_pass"})
+            pool.refresh_credentials()
+            assert os.environ["DBPASSWORD"] == "new_pass"
+            assert mock_requests.get.call_count == 2
+
+
+class TestAwsClients:
+    @pytest.fixture(autouse=True)
+    def empty_clients(self):
+        with patch.dict(CLIENTS, clear=True):
+            yield
+
+    @pytest.mark.it("get_client creates each client once and reuses it")
+    def test_reuses_client(self):
+        with mock_aws():
+            client = get_client("s3")
+
+            assert get_client("s3") is client
+            assert get_client("s3", region_name="us-east-1") is not client
+            assert client.meta.config.max_pool_connections == 32
+            assert client.meta.config.retries["mode"] == "standard"
+
+    @pytest.mark.it("set_client injects the client handed out by get_client")
+    def test_set_client(self):
+        client = Mock()
+        set_client("s3", client)
+        assert get_client("s3") is client
+
+        set_client("s3", None)
+        with mock_aws():
+            assert get_client("s3") is not client
+
+
+class TestMapConcurrently:
+    @pytest.mark.it("Returns the results in the order of the items")
+    def test_results_in_order(self):
+        def slow_square(n):
+            sleep(0.05 * (3 - n))
+            return n * n
+
+        result = map_concurrently(slow_square, [0, 1, 2], max_workers=3)
+
+        assert list(result.items()) == [(0, 0), (1, 1), (2, 4)]
+
+    @pytest.mark.it("Runs the calls at the same time")
+    def test_calls_overlap(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def wait_for_others(n):
+            barrier.wait()
+            return n
+
+        assert map_concurrently(wait_for_others, ["a", "b", "c"], max_workers=3) == {
+            "a": "a",
+            "b": "b",
+            "c": "c",
+        }
+
+    @pytest.mark.it("Raises the error of the first item that failed")
+    def test_raises_first_error(self):
+        def fail_on_odd(n):
+            if n % 2:
+                raise RuntimeError(f"failed {n}")
+            return n
+
+        with pytest.raises(RuntimeError, match="failed 1"):
+            map_concurrently(fail_on_odd, [0, 1, 2, 3])
+
+
+class TestRunGraph:
+    @pytest.mark.it("Passes each task the results of the tasks it depends on")
+    def test_dependencies(self):
+        tasks = {
+            "total": lambda done: done["a"] + done["b"],
+            "a": lambda done: 1,
+            "b": lambda done: 2,
+        }
+
+        result = run_graph(tasks, {"total": ["a", "b"]})
+
+        assert list(result.items()) == [("total", 3), ("a", 1), ("b", 2)]
+
+    @pytest.mark.it("Runs independent tasks at the same time")
+    def test_independent_tasks_overlap(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_for_other(done):
+            barrier.wait()
+            return True
+
+        result = run_graph(
+            {"a": wait_for_other, "b": wait_for_other, "c": lambda done: done},
+            {"c": ["a", "b"]},
+            max_workers=2,
+        )
+
+        assert result["c"] == {"a": True, "b": True}
+
+    @pytest.mark.it("Does not run the tasks depending on a task that failed")
+    def test_error_stops_dependents(self):
+        ran = []
+
+        def fail(done):
+            raise RuntimeError("failed a")
+
+        with pytest.raises(RuntimeError, match="failed a"):
+            run_graph(
+                {"a": fail, "b": lambda done: ran.append("b")},
+                {"b": ["a"]},
+            )
+
+        assert ran == []
+
+    @pytest.mark.it("Raises ValueError for a cycle or an unknown dependency")
+    def test_invalid_dependencies(self):
+        tasks = {"a": lambda done: 1, "b": lambda done: 2}
+
+        with pytest.raises(ValueError, match="cycle"):
+            run_graph(tasks, {"a": ["b"], "b": ["a"]})
+        with pytest.raises(ValueError, match="unknown"):
+            run_graph(tasks, {"a": ["c"]})
+
+
+class TestCurrencyNames:
+    @pytest.mark.it("name_currencies names each code as currency_codes does")
+    def test_matches_currency_codes(self):
+        from currency_codes import get_currency_by_code
+
+        codes = pd.Series(["GBP", "USD", "EUR", "GBP"])
+
+        actual = name_currencies(codes)
+
+        assert actual.name == "currency_name"
+        assert actual.tolist() == [get_currency_by_code(code).name for code in codes]
+
+    @pytest.mark.it("name_currencies names codes in lower case or with spaces")
+    def test_fallback(self):
+        actual = name_currencies(pd.Series(["gbp", " USD "]))
+
+        assert actual.tolist() == ["Pound Sterling", "US Dollar"]
+
+    @pytest.mark.it("name_currencies raises listing the codes that name no currency")
+    def test_unknown_raises(self):
+        with pytest.raises(RuntimeError, match="unknown codes XXY, ZZZ"):
+            name_currencies(pd.Series(["GBP", "ZZZ", "XXY", "ZZZ"]))
+
+    @pytest.mark.it("name_currencies follows the policy for unknown codes")
+    def test_unknown_policies(self):
+        codes = pd.Series(["GBP", "ZZZ", None])
+
+        assert name_currencies(codes, unknown="null").tolist() == [
+            "Pound Sterling",
+            None,
+            None,
+        ]
+        assert name_currencies(codes, unknown="code").tolist() == [
+            "Pound Sterling",
+            "ZZZ",
+            None,
+        ]
+        with pytest.raises(ValueError):
+            name_currencies(codes, unknown="ignore")
+
+
+class TestDateDimension:
+    @pytest.mark.it("build_calendar derives every attribute of each date")
+    def test_build_calendar(self):
+        df = build_calendar([date(2024, 2, 29), date(2023, 12, 31)])
+
+        assert df.to_dict("records") == [
+            {
+                "date_id": date(2024, 2, 29),
+                "year": 2024,
+                "month": 2,
+                "day": 29,
+                "day_of_week": 3,
+                "day_name": "Thursday",
+                "month_name": "February",
+                "quarter": 1,
+            },
+            {
+                "date_id": date(2023, 12, 31),
+                "year": 2023,
+                "month": 12,
+                "day": 31,
+                "day_of_week": 6,
+                "day_name": "Sunday",
+                "month_name": "December",
+                "quarter": 4,
+            },
+        ]
+
+    @pytest.mark.it("calendar_dates lists every date in the range, inclusive")
+    def test_calendar_dates(self):
+        dates = calendar_dates("2024-01-01", "2024-12-31")
+
+        assert len(dates) == 366
+        assert dates[0] == date(2024, 1, 1)
+        assert dates[-1] == date(2024, 12, 31)
+
+    @pytest.mark.it("Recorded loaded dates are added to those already recorded")
+    def test_loaded_dates(self):
+        with mock_aws():
+            client = boto3.client("s3")
+            client.create_bucket(
+                Bucket="test_bucket",
+                CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+            )
+
+            assert read_loaded_dates(client, "test_bucket") == set()
+
+            record_loaded_dates(client, "test_bucket", [date(2024, 1, 2)])
+            record_loaded_dates(client, "test_bucket", [date(2024, 1, 1)])
+
+            assert read_loaded_dates(client, "test_bucket") == {
+                date(2024, 1, 1),
+                date(2024, 1, 2),
+            }
+
+
+class TestLatestObject:
+    @pytest.fixture
+    def client(self):
+        with patch.dict(
+            os.environ,
+            {
+                "AWS_ACCESS_KEY_ID": "mock_access_key",
+                "AWS_SECRET_ACCESS_KEY": "aws_secret_key",
+                "AWS_DEFAULT_REGION": "eu-west-2",
+            },
+        ):
+            with mock_aws():
+                client = boto3.client("s3")
+                client.create_bucket(
+                    Bucket="mock_bucket",
+                    CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+                )
+                yield client
+
+    @pytest.mark.it("Reads back the pointer written for a table")
+    def test_pointer_round_trip(self, client):
+        write_latest_pointer(
+            client, "mock_bucket", "currency", "currency/a.json", {"rows": 2}
+        )
+
+        pointer = read_latest_pointer(client, "mock_bucket", "currency")
+
+        assert pointer["key"] == "currency/a.json"
+        assert pointer["rows"] == 2
+        assert read_latest_pointer(client, "mock_bucket", "design") is None
+
+    @pytest.mark.it("Prefers the pointer over listing the bucket")
+    def test_find_uses_pointer(self, client):
+        client.put_object(Bucket="mock_bucket", Key="currency/b.json", Body="[]")
+        write_latest_pointer(client, "mock_bucket", "currency", "currency/a.json")
+
+        assert find_latest_key(client, "mock_bucket", "currency") == "currency/a.json"
+
+    @pytest.mark.it("Falls back to the greatest key when there is no pointer")
+    def test_find_falls_back_to_listing(self, client):
+        for key in ["currency/2025/01/02/x.json", "currency/2025/01/01/x.json"]:
+            client.put_object(Bucket="mock_bucket", Key=key, Body="[]")
+
+        assert (
+            find_latest_key(client, "mock_bucket", "currency")
+            == "currency/2025/01/02/x.json"
+        )
+
+    @pytest.mark.it("Lists past the first page of results")
+    def test_listing_is_paginated(self, client):
+        for number in range(1001):
+            client.put_object(
+                Bucket="mock_bucket", Key=f"dim_date/{number:04}.parquet", Body=""
+            )
+
+        assert (
+            list_latest_key(client, "mock_bucket", "dim_date")
+            == "dim_date/1000.parquet"
+        )
+
+    @pytest.mark.it("Lists only the keys after the given key, oldest first")
+    def test_list_keys_after(self, client):
+        keys = [f"sales_order/2025/01/0{day}/x.json" for day in [3, 1, 2]]
+        for key in keys + ["sales_order_x/2025/01/04/x.json"]:
+            client.put_object(Bucket="mock_bucket", Key=key, Body="[]")
+
+        assert list_keys_after(client, "mock_bucket", "sales_order", keys[1]) == [
+            keys[2],
+            keys[0],
+        ]
+        assert list_keys_after(client, "mock_bucket", "sales_order") == sorted(keys)
+        assert list_keys_after(client, "mock_bucket", "sales_order", keys[0]) == []
+
+    @pytest.mark.it("Ignores tables whose names start with the given table name")
+    def test_listing_ignores_prefix_collisions(self, client):
+        client.put_object(Bucket="mock_bucket", Key="dim_date/1.parquet", Body="")
+        client.put_object(Bucket="mock_bucket", Key="dim_date_x/2.parquet", Body="")
+
+        assert (
+            list_latest_key(client, "mock_bucket", "dim_date") == "dim_date/1.parquet"
+        )
+
+    @pytest.mark.it("Raises a RuntimeError when a table has no objects")
+    def test_listing_raises_when_empty(self, client):
+        with pytest.raises(RuntimeError):
+            list_latest_key(client, "mock_bucket", "currency")
+
+
+class TestStreamingUpload:
+    @pytest.fixture
+    def client(self):
+        with patch.dict(
+            os.environ,
+            {
+                "AWS_ACCESS_KEY_ID": "mock_access_key",
+                "AWS_SECRET_ACCESS_KEY": "aws_secret_key",
+                "AWS_DEFAULT_REGION": "eu-west-2",
+            },
+        ):
+            with mock_aws():
+                client = boto3.client("s3")
+                client.create_bucket(
+                    Bucket="mock_bucket",
+                    CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+                )
+                yield client
+
+    @staticmethod
+    def chunks(total_size, chunk_size=1024 * 1024):
+        for start in range(0, total_size, chunk_size):
+            yield bytes([start // chunk_size]) * min(chunk_size, total_size - start)
+
+    @pytest.mark.it("Uploads a small stream as a single object")
+    def test_small_stream(self, client):
+        assert upload_stream(
+            client, [b"[", b"{}", b"]"], "mock_bucket", "a.json", ContentType="x/y"
+        )
+
+        response = client.get_object(Bucket="mock_bucket", Key="a.json")
+        assert response["Body"].read() == b"[{}]"
+        assert response["ContentType"] == "x/y"
+
+    @pytest.mark.it("Uploads a large stream in parts")
+    def test_multipart_stream(self, client):
+        total_size = 2 * MIN_PART_SIZE + 1000
+
+        assert upload_stream(
+            client,
+            self.chunks(total_size),
+            "mock_bucket",
+            "big.json",
+            part_size=MIN_PART_SIZE,
+            max_concurrency=2,
+        )
+
+        response = client.get_object(Bucket="mock_bucket", Key="big.json")
+        assert response["Body"].read() == b"".join(self.chunks(total_size))
+        assert response["ETag"].endswith('-3"')
+
+    @pytest.mark.it("Aborts the multipart upload when the stream fails")
+    def test_aborts_on_failure(self, client):
+        def failing_chunks():
+            yield from self.chunks(MIN_PART_SIZE + 1000)
+            raise RuntimeError("extraction failed")
+
+        with pytest.raises(RuntimeError):
+            upload_stream(client, failing_chunks(), "mock_bucket", "big.json")
+
+        assert "Uploads" not in client.list_multipart_uploads(Bucket="mock_bucket")
+        assert "Contents" not in client.list_objects_v2(Bucket="mock_bucket")
+
+    @pytest.mark.it("Sends nothing to s3 when should_complete returns False")
+    @pytest.mark.parametrize("total_size", [1000, MIN_PART_SIZE + 1000])
+    def test_should_complete(self, client, total_size):
+        def should_complete():
+            assert "Uploads" not in client.list_multipart_uploads(Bucket="mock_bucket")
+            return False
+
+        with patch.object(client, "upload_part", wraps=client.upload_part) as part:
+            assert not upload_stream(
+                client,
+                self.chunks(total_size),
+                "mock_bucket",
+                "big.json",
+                should_complete=should_complete,
+            )
+
+        part.assert_not_called()
+        assert "Uploads" not in client.list_multipart_uploads(Bucket="mock_bucket")
+        assert "Contents" not in client.list_objects_v2(Bucket="mock_bucket")
+
+    @pytest.mark.it("Uploads a spooled stream in parts when should_complete allows it")
+    def test_should_complete_multipart(self, client):
+        total_size = 2 * MIN_PART_SIZE + 1000
+
+        assert upload_stream(
+            client,
+            self.chunks(total_size),
+            "mock_bucket",
+            "big.json",
+            part_size=MIN_PART_SIZE,
+            should_complete=lambda: True,
+        )
+
+        response = client.get_object(Bucket="mock_bucket", Key="big.json")
+        assert response["Body"].read() == b"".join(self.chunks(total_size))
+        assert response["ETag"].endswith('-3"')
+
+    @pytest.mark.it("Raises ValueError for parts smaller than s3 allows")
+    def test_part_size_too_small(self, client):
+        with pytest.raises(ValueError):
+            upload_stream(client, [b""], "mock_bucket", "a.json", part_size=1024)